@@ -0,0 +1,124 @@
+import datetime
+
+# Orders in these states don't count towards sales
+EXCLUDED_STATUSES = ['Cancelled', 'Declined']
+MAX_RANGE_DAYS = 366
+
+
+def num_expr(expr, default=0):
+    """Server-side float(); prices/quantities may be stored as strings."""
+    return {'$convert': {'input': expr, 'to': 'double', 'onError': default, 'onNull': default}}
+
+
+def parse_range(start, end):
+    """
+    Parse YYYY-MM-DD query values into [start, end) datetimes (end is inclusive
+    as a day). Returns (None, None) when no range was given.
+    """
+    if not start and not end:
+        return None, None
+    today = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    try:
+        end_day = datetime.datetime.strptime(end, '%Y-%m-%d') if end else today
+        start_day = datetime.datetime.strptime(start, '%Y-%m-%d') if start else end_day - datetime.timedelta(days=6)
+    except ValueError:
+        raise ValueError('Dates must be in YYYY-MM-DD format')
+    if start_day > end_day:
+        raise ValueError('start must not be after end')
+    if (end_day - start_day).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'Date range is limited to {MAX_RANGE_DAYS} days')
+    return start_day, end_day + datetime.timedelta(days=1)
+
+
+def chart_window(start, end):
+    """The days shown in the daily chart: the range if given, else the last 7 days."""
+    if start is not None:
+        return start, end
+    chart_end = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + datetime.timedelta(days=1)
+    return chart_end - datetime.timedelta(days=7), chart_end
+
+
+def daily_points(chart_start, chart_end, by_day):
+    """One chart point per day; `by_day` maps 'YYYY-MM-DD' to {revenue, orders}."""
+    points = []
+    day = chart_start
+    while day < chart_end:
+        bucket = by_day.get(day.strftime('%Y-%m-%d'), {})
+        points.append({
+            'name': day.strftime('%a'),
+            'date': day.strftime('%Y-%m-%d'),
+            'revenue': round(float(bucket.get('revenue', 0)), 2),
+            'orders': bucket.get('orders', 0)
+        })
+        day += datetime.timedelta(days=1)
+    return points
+
+
+def sales_report(db, start=None, end=None):
+    """
+    Build the admin analytics report with a single $facet aggregation.
+    With no range, the chart covers the last 7 days and the metrics all
+    orders; with a range, everything is limited to [start, end).
+    """
+    chart_start, chart_end = chart_window(start, end)
+
+    match = {'order_status': {'$nin': EXCLUDED_STATUSES}}
+    if start is not None:
+        match['created_at'] = {'$gte': start, '$lt': end}
+
+    revenue = {'$sum': num_expr('$total_price')}
+    pipeline = [
+        {'$match': match},
+        {'$facet': {
+            'daily': [
+                {'$match': {'created_at': {'$gte': chart_start, '$lt': chart_end}}},
+                {'$group': {
+                    '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
+                    'revenue': revenue,
+                    'orders': {'$sum': 1}
+                }}
+            ],
+            'categories': [
+                {'$unwind': '$products'},
+                {'$group': {
+                    '_id': {'$ifNull': ['$products.category', 'Others']},
+                    'value': {'$sum': {'$multiply': [num_expr('$products.price'), num_expr('$products.quantity', 1)]}}
+                }}
+            ],
+            'totals': [
+                {'$group': {'_id': None, 'revenue': revenue, 'count': {'$sum': 1}}}
+            ],
+            'customers': [
+                {'$group': {'_id': {'$toString': '$user_id'}, 'n': {'$sum': 1}}},
+                {'$group': {
+                    '_id': None,
+                    'customers': {'$sum': 1},
+                    'repeat': {'$sum': {'$cond': [{'$gt': ['$n', 1]}, 1, 0]}}
+                }}
+            ]
+        }}
+    ]
+    result = next(db.orders.aggregate(pipeline), {})
+
+    daily_data = daily_points(chart_start, chart_end, {d['_id']: d for d in result.get('daily', [])})
+
+    category_data = [
+        {'name': c['_id'], 'value': int(round(c['value']))} for c in result.get('categories', [])
+    ]
+
+    totals = (result.get('totals') or [{}])[0]
+    total_revenue = totals.get('revenue', 0)
+    order_count = totals.get('count', 0)
+    customers = (result.get('customers') or [{}])[0]
+    repeat_rate = (customers['repeat'] / customers['customers'] * 100) if customers.get('customers') else 0
+
+    return {
+        'dailyData': daily_data,
+        'categoryData': category_data,
+        'metrics': {
+            'totalRevenue': round(total_revenue, 2),
+            'avgOrderValue': round(total_revenue / order_count, 2) if order_count else 0,
+            'orderCount': order_count,
+            'repeatRate': round(repeat_rate, 1)
+        }
+    }
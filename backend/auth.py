@@ -0,0 +1,161 @@
+"""
+Bearer-token authentication for the API.
+
+load_user() runs before every request: it verifies the HS256 token issued by
+verify-otp / admin/login and sets `g.user` (None for anonymous callers).
+Decoded claims are cached by token hash until the token expires, and user
+profiles for a few minutes, so a protected route normally costs no Mongo read.
+
+Views opt in with @login_required or @admin_required; customer views then
+check can_access() so a user only reaches their own data. AUTH_REQUIRED=false
+turns the checks off (e.g. while the admin dashboard is updated to send
+the token).
+
+Anyone can sign an admin token with the stock JWT_SECRET, so while it is
+left at the default, admin tokens are rejected.
+"""
+import hashlib
+import time
+from functools import wraps
+import jwt
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import g, jsonify, request
+from config import Config
+from extensions import get_db
+from ttl_cache import TTLCache
+
+# sha256(token) -> claims, or an error string for tokens that failed to verify
+token_cache = TTLCache(maxsize=Config.AUTH_CACHE_SIZE, ttl=60)
+# user_id -> public profile
+user_cache = TTLCache(maxsize=Config.AUTH_CACHE_SIZE, ttl=Config.AUTH_USER_TTL)
+
+ADMIN_USER = {'_id': 'admin', 'role': 'admin'}
+# The placeholder config.py ships with
+DEFAULT_JWT_SECRET = 'your_jwt_secret_key'
+
+
+def admin_tokens_allowed():
+    return not (Config.AUTH_REQUIRED and Config.JWT_SECRET == DEFAULT_JWT_SECRET)
+
+
+def _bearer_token():
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[7:].strip() or None
+    return None
+
+
+def verify_token(token):
+    """Claims for a valid token, or an error message string."""
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    cached = token_cache.get(key)
+    if cached is not None:
+        if isinstance(cached, dict) and cached.get('exp', 0) <= time.time():
+            token_cache.pop(key)
+            return 'Token expired'
+        return cached
+
+    try:
+        claims = jwt.decode(token, Config.JWT_SECRET, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        return 'Token expired'
+    except jwt.InvalidTokenError:
+        token_cache.set(key, 'Invalid token')
+        return 'Invalid token'
+
+    ttl = claims['exp'] - time.time() if 'exp' in claims else Config.AUTH_USER_TTL
+    token_cache.set(key, claims, ttl=max(0, ttl))
+    return claims
+
+
+def _load_profile(user_id):
+    try:
+        oid = ObjectId(str(user_id))
+    except InvalidId:
+        return None
+    user = get_db().users.find_one({'_id': oid}, {'phone': 1, 'name': 1, 'email': 1})
+    if not user:
+        return None
+    user['_id'] = str(user['_id'])
+    user['role'] = 'customer'
+    return user
+
+
+def get_profile(user_id):
+    """Cached profile for a customer id (None if the user no longer exists)."""
+    return user_cache.get_or_load(str(user_id), lambda: _load_profile(user_id),
+                                  cacheable=lambda u: u is not None)
+
+
+def forget_user(user_id):
+    """Drop a cached profile after the user document changes."""
+    user_cache.pop(str(user_id))
+
+
+def load_user():
+    """before_request hook: set g.user / g.auth_error from the Authorization header."""
+    g.user = None
+    g.auth_error = None
+    token = _bearer_token()
+    if not token:
+        return
+    claims = verify_token(token)
+    if isinstance(claims, str):
+        g.auth_error = claims
+        return
+    if claims.get('role') == 'admin':
+        if not admin_tokens_allowed():
+            g.auth_error = 'Admin login is disabled until JWT_SECRET is set'
+            return
+        g.user = ADMIN_USER
+    elif claims.get('user_id'):
+        g.user = get_profile(claims['user_id'])
+        if g.user is None:
+            g.auth_error = 'User not found'
+
+
+def _unauthorized():
+    return jsonify({'message': g.get('auth_error') or 'Login required'}), 401
+
+
+def login_required(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if Config.AUTH_REQUIRED and not g.get('user'):
+            return _unauthorized()
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def can_access(user_id):
+    """Whether the caller may read or change the data of customer `user_id`."""
+    if not Config.AUTH_REQUIRED:
+        return True
+    user = g.get('user')
+    if not user:
+        return False
+    return user.get('role') == 'admin' or str(user['_id']) == str(user_id)
+
+
+def require_admin():
+    """The error response for a non-admin caller, or None (usable as a blueprint before_request)."""
+    # CORS preflights never carry the token
+    if not Config.AUTH_REQUIRED or request.method == 'OPTIONS':
+        return None
+    user = g.get('user')
+    if not user:
+        return _unauthorized()
+    if user.get('role') != 'admin':
+        return jsonify({'message': 'Admin access required'}), 403
+    return None
+
+
+def admin_required(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        denied = require_admin()
+        if denied:
+            return denied
+        return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,123 @@
+"""
+Local stand-ins for Shiprocket, Razorpay and the SMS providers.
+
+Each service runs on its own ThreadingHTTPServer on 127.0.0.1 and waits
+`latency_ms` (± `jitter_ms`) before answering, so the benchmark sees
+realistic third-party wait time without calling anyone. Answers have the
+shape the app reads, but none of the real semantics.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import jwt
+
+COURIERS = (('Delhivery Surface', 3.9), ('Xpressbees', 4.1), ('Ekart Logistics', 3.6), ('DTDC', 2.8))
+
+
+def _shiprocket(method, path, query, body):
+    if path.endswith('/auth/login'):
+        # The client reads `exp` (unverified) to know when to log in again
+        token = jwt.encode({'exp': int(time.time()) + 10 * 24 * 3600}, 'fake', algorithm='HS256')
+        return 200, {'token': token}
+    if path.endswith('/courier/serviceability'):
+        pin = int(query.get('delivery_postcode', ['0'])[0] or 0)
+        couriers = [
+            {'courier_name': name, 'rating': rating, 'etd': f'{2 + (pin + i) % 4} Days',
+             'rate': 45 + (pin * (i + 3)) % 50}
+            for i, (name, rating) in enumerate(COURIERS)
+        ]
+        return 200, {'status': 200, 'data': {'available_courier_companies': couriers}}
+    if path.endswith('/orders/create/adhoc'):
+        n = random.randint(10 ** 8, 10 ** 9)
+        return 200, {'order_id': n, 'shipment_id': n + 1, 'status': 'NEW', 'awb_code': ''}
+    return 404, {'message': f'fake shiprocket: no route {method} {path}'}
+
+
+def _razorpay(method, path, query, body):
+    if method == 'POST' and path.rstrip('/').endswith('/v1/orders'):
+        return 200, {'id': f'order_bench{random.randint(10 ** 8, 10 ** 9)}', 'entity': 'order',
+                     'amount': body.get('amount'), 'currency': body.get('currency', 'INR'),
+                     'status': 'created', 'created_at': int(time.time())}
+    return 404, {'error': {'description': f'fake razorpay: no route {method} {path}'}}
+
+
+def _sms(method, path, query, body):
+    if '/SMS/' in path:  # 2Factor send / verify
+        return 200, {'Status': 'Success', 'Details': f'bench-session-{random.randint(1, 10 ** 6)}'}
+    return 200, {'return': True, 'request_id': 'bench', 'message': ['SMS sent successfully.']}
+
+
+ROUTES = {'shiprocket': _shiprocket, 'razorpay': _razorpay, 'sms': _sms}
+
+
+class FakeService:
+    def __init__(self, name, latency_ms=0, jitter_ms=0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests = {}  # "METHOD /path" -> count
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f'fake-{name}', daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    def _handler(self):
+        service = self
+        route = ROUTES[self.name]
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real APIs
+
+            def _answer(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    body = parse_qs(raw.decode('utf-8', 'replace'))
+                service._count(self.command, url.path)
+                service._wait()
+                status, payload = route(self.command, url.path, parse_qs(url.query), body)
+                out = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            do_GET = do_POST = do_PUT = _answer
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _count(self, method, path):
+        # Collapse the 2Factor key/session/otp path segments
+        key = f"{method} {'/API/V1/.../SMS/...' if '/SMS/' in path else path}"
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def _wait(self):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def report(self):
+        return {'latency_ms': self.latency_ms, 'jitter_ms': self.jitter_ms, 'requests': dict(self.requests)}
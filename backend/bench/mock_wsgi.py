@@ -0,0 +1,49 @@
+"""
+mongomock support for the benchmark.
+
+use_mongomock() points extensions at an in-memory mongomock store. When
+gunicorn loads this module (`run.py --gunicorn --mongomock`), it also seeds
+that store from BENCH_SEED and exposes `app`. Started with --preload, the
+master seeds once and every forked worker begins with a copy of the same
+data; their writes then diverge, which the flows don't mind.
+"""
+import json
+import os
+import sys
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH))
+sys.path.insert(0, BENCH)
+
+
+def _patch_bulk():
+    # mongomock 4.3 predates the `sort` argument pymongo 4.9+ passes to bulk writes
+    from mongomock.collection import BulkOperationBuilder
+    for name in ('add_update', 'add_replace'):
+        def without_sort(self, *args, _original=getattr(BulkOperationBuilder, name), sort=None, **kwargs):
+            return _original(self, *args, **kwargs)
+        setattr(BulkOperationBuilder, name, without_sort)
+
+
+def use_mongomock():
+    import mongomock
+    from mongomock.store import ServerStore
+    import extensions
+    _patch_bulk()
+    # One store for every client, so the reset_db() after a fork still sees the data
+    store = ServerStore()
+    extensions.MongoClient = lambda *args, **kwargs: mongomock.MongoClient(*args, _store=store, **kwargs)
+
+
+if os.getenv('BENCH_SEED'):
+    import extensions
+    import seed as dataset
+
+    use_mongomock()
+    options = json.loads(os.environ['BENCH_SEED'])
+    ids_file = options.pop('ids_file')
+    ctx = dataset.seed(extensions.get_db(), replay=True, **options)
+    with open(ids_file, 'w') as f:
+        json.dump(ctx, f)
+
+    from app import app  # noqa: E402,F401
@@ -0,0 +1,448 @@
+"""
+Benchmark the API's hot flows against a seeded database.
+
+    cd backend
+    python bench/run.py                              # seed gavran_bench, run every flow
+    python bench/run.py --no-seed --flows create_order,shipping_cost
+    python bench/run.py --baseline bench/results/before.json
+
+Boots the app in-process on a threaded WSGI server, or with --gunicorn
+under gunicorn.conf.py (WEB_CONCURRENCY, GUNICORN_THREADS, ... from the
+environment), with Shiprocket, Razorpay and the SMS providers replaced by
+local fakes (bench/fakes.py).
+It then runs each flow for --requests requests at --concurrency and writes
+p50/p95/p99 latency, throughput and status codes to a JSON file.
+--baseline prints the change against an earlier result.
+
+Needs a MongoDB it may wipe (default mongodb://localhost:27017/gavran_bench;
+database names without "bench" are refused) or `--mongomock` (pip install
+mongomock), which only measures the Python side: no network, no query
+planner, and every operation scans its collection, so it is no guide to
+production latency. It still catches regressions in the app's own code.
+.env is ignored, so the run can never touch the real database.
+Compare results only between runs with the same dataset, concurrency and
+fake latencies, on the same machine.
+"""
+import argparse
+import datetime
+import json
+import logging
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests  # noqa: E402
+import fakes  # noqa: E402
+import mock_wsgi  # noqa: E402
+
+ADMIN = ('bench-admin', 'bench-password')
+
+
+# --- Flows: one request each, built from the seeded ids ---
+
+def _customer(ctx, rng):
+    """An existing customer most of the time, a first-time visitor otherwise."""
+    if rng.random() < 0.8:
+        user_id = rng.choice(ctx['users'])
+        return user_id, f'dev-{user_id}'
+    return f'new-{rng.randint(1, 10 ** 9)}', f'dev-new-{rng.randint(1, 10 ** 9)}'
+
+
+def catalog(session, base, ctx, rng):
+    return session.get(f'{base}/api/products/')
+
+
+def product(session, base, ctx, rng):
+    return session.get(f"{base}/api/products/{rng.choice(ctx['products'])['_id']}")
+
+
+def reviews(session, base, ctx, rng):
+    return session.get(f"{base}/api/products/{rng.choice(ctx['products'])['_id']}/reviews",
+                       params={'limit': 20})
+
+
+def shipping_cost(session, base, ctx, rng):
+    user_id, device_id = _customer(ctx, rng)
+    return session.post(f'{base}/api/orders/shipping-cost', json={
+        'pincode': rng.choice(ctx['pincodes']),
+        # Mostly the swept 0.5 kg prepaid parcel; heavier or COD ones ask Shiprocket
+        'weight': 0.5 if rng.random() < 0.8 else rng.choice((1.0, 1.5, 2.0)),
+        'cod': 1 if rng.random() < 0.2 else 0,
+        'order_total': rng.choice((250, 600, 1200, 1800)),
+        'user_id': user_id,
+        'device_id': device_id,
+    })
+
+
+def eligibility(session, base, ctx, rng):
+    user_id, device_id = _customer(ctx, rng)
+    return session.post(f'{base}/api/orders/eligibility', json={'user_id': user_id, 'device_id': device_id})
+
+
+def create_order(session, base, ctx, rng):
+    user_id, device_id = _customer(ctx, rng)
+    lines = [{'product_id': p['_id'], 'name': p['name'], 'price': p['price'],
+              'category': p['category'], 'quantity': rng.randint(1, 3)}
+             for p in rng.sample(ctx['products'], min(len(ctx['products']), rng.randint(1, 3)))]
+    order = {
+        'user_id': user_id,
+        'device_id': device_id,
+        'products': lines,
+        'total_price': sum(line['price'] * line['quantity'] for line in lines),
+        'address': '12 Bench Road',
+        'city': 'Pune',
+        'pincode': rng.choice(ctx['pincodes']),
+        'phone': str(rng.randint(7000000000, 9999999999)),
+        'name': 'Bench Customer',
+        'payment_method': 'COD',
+    }
+    if ctx['offers'] and rng.random() < 0.3:
+        order['promo_code'] = rng.choice(ctx['offers'])
+    return session.post(f'{base}/api/orders/', json=order)
+
+
+def razorpay_create(session, base, ctx, rng):
+    return session.post(f'{base}/api/orders/razorpay/create', json={'amount': rng.choice((299, 849, 1499))})
+
+
+def analytics(session, base, ctx, rng):
+    end = datetime.date.today() - datetime.timedelta(days=rng.randint(0, 60))
+    start = end - datetime.timedelta(days=rng.choice((6, 29, 89)))
+    return session.get(f'{base}/api/orders/analytics/report', headers=ctx['admin'],
+                       params={'start': start.isoformat(), 'end': end.isoformat()})
+
+
+def users(session, base, ctx, rng):
+    return session.get(f'{base}/api/auth/users', headers=ctx['admin'],
+                       params={'limit': 50, 'sort': rng.choice(('created_at', 'spend', 'orders'))})
+
+
+FLOWS = {
+    'catalog': catalog,
+    'product': product,
+    'reviews': reviews,
+    'shipping_cost': shipping_cost,
+    'eligibility': eligibility,
+    'create_order': create_order,
+    'razorpay_create': razorpay_create,
+    'analytics': analytics,
+    'users': users,
+}
+
+
+# --- Measuring ---
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    k = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[k - 1]
+
+
+def run_flow(name, base, ctx, requests_total, concurrency, warmup, seed):
+    fn = FLOWS[name]
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    def one(i):
+        rng = random.Random(f'{seed}:{name}:{i}')
+        started = time.perf_counter()
+        try:
+            status = fn(session(), base, ctx, rng).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        return time.perf_counter() - started, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(-warmup, 0)))
+        started = time.perf_counter()
+        results = list(pool.map(one, range(requests_total)))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    statuses = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(n for s, n in statuses.items() if not (s.isdigit() and int(s) < 400))
+    return {
+        'requests': len(results),
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'mean': round(sum(latencies) / len(latencies), 2),
+            'max': round(latencies[-1], 2),
+        },
+        'statuses': statuses,
+        'errors': errors,
+    }
+
+
+def compare(result, baseline):
+    """Print the p50/p95/p99 and throughput change per flow against a previous result."""
+    print(f"\n{'flow':<16}{'p50':>18}{'p95':>18}{'p99':>18}{'rps':>18}")
+    for name, flow in result['flows'].items():
+        old = baseline.get('flows', {}).get(name)
+        if not old:
+            print(f'{name:<16}  (not in baseline)')
+            continue
+        cells = []
+        for new_value, old_value in [(flow['latency_ms'][p], old['latency_ms'][p]) for p in ('p50', 'p95', 'p99')] + \
+                [(flow['throughput_rps'], old['throughput_rps'])]:
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            cells.append(f'{new_value:>9} ({change:+5.1f}%)')
+        print(f'{name:<16}' + ''.join(f'{c:>18}' for c in cells))
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- Setup ---
+
+def configure_env(args, services):
+    """Point the app at the bench database and the fakes. Must run before the app is imported."""
+    env = {
+        'LOAD_DOTENV': 'false',
+        'MONGO_URI': args.mongo_uri,
+        'JWT_SECRET': 'bench-secret-not-for-production-use',
+        'ADMIN_USERNAME': ADMIN[0],
+        'ADMIN_PASSWORD': ADMIN[1],
+        'SHIPROCKET_BASE_URL': services['shiprocket'].url + '/v1/external',
+        'SHIPROCKET_EMAIL': 'bench@bench.invalid',
+        'SHIPROCKET_PASSWORD': 'bench',
+        # One process: no token to share through Mongo
+        'SHIPROCKET_TOKEN_CACHE': 'none',
+        'RAZORPAY_BASE_URL': services['razorpay'].url,
+        'RAZORPAY_KEY_ID': 'rzp_test_bench',
+        'RAZORPAY_KEY_SECRET': 'bench',
+        'FAST2SMS_URL': services['sms'].url + '/dev/bulkV2',
+        'FAST2SMS_API_KEY': 'bench',
+        'TWOFACTOR_BASE_URL': services['sms'].url + '/API/V1',
+        'TWOFACTOR_API_KEY': '',
+        # The limits would turn the load into 429s
+        'RATE_LIMIT_ENABLED': 'false',
+        'AUTO_CREATE_INDEXES': 'true',
+    }
+    if args.mongomock:
+        # mongomock has no sessions, so checkout can't use transactions
+        env['INVENTORY_TRANSACTIONS'] = 'off'
+    os.environ.update(env)
+    # Everything else (JOBS_WORKER, MONGO_MAX_POOL_SIZE, SLOW_QUERY_MS, ...) comes from the caller's environment
+
+
+def check_database_name(uri, force):
+    name = uri.split('/')[-1].split('?')[0].strip() or 'gavran_magic'
+    if 'bench' not in name and not force:
+        sys.exit(f"Refusing to seed '{name}': the benchmark wipes its database. "
+                 f"Use a name containing 'bench' or pass --force.")
+
+
+def serve(app):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-server', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve_gunicorn(module, extra_args=(), env=None):
+    """Start gunicorn -c gunicorn.conf.py on a free local port. Returns (process, base url)."""
+    port = _free_port()
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+               '--access-logfile', '/dev/null', *extra_args, module]
+    process = subprocess.Popen(command, cwd=BACKEND, env=dict(os.environ, **(env or {})))
+    return process, f'http://127.0.0.1:{port}'
+
+
+def _rss_mb(pid):
+    """Resident memory of a process and its children in MB (Linux /proc), or None."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            children = [int(c) for c in f.read().split()]
+    except (OSError, StopIteration, ValueError):
+        return None
+    return round(rss / 1024 + sum(_rss_mb(c) or 0 for c in children), 1)
+
+
+def wait_ready(base, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f'{base}/readyz', timeout=5).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    sys.exit(f'App not ready after {timeout}s (see /readyz)')
+
+
+def admin_headers(base):
+    response = requests.post(f'{base}/api/auth/admin/login', json={'username': ADMIN[0], 'password': ADMIN[1]})
+    response.raise_for_status()
+    return {'Authorization': f"Bearer {response.json()['token']}"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mongo-uri', default=os.getenv('BENCH_MONGO_URI', 'mongodb://localhost:27017/gavran_bench'))
+    parser.add_argument('--mongomock', action='store_true', help='in-memory mongomock instead of a mongod')
+    parser.add_argument('--gunicorn', action='store_true',
+                        help='serve with gunicorn.conf.py (workers/threads from the environment)')
+    parser.add_argument('--force', action='store_true', help='seed a database whose name lacks "bench"')
+    parser.add_argument('--no-seed', dest='seed', action='store_false', help='reuse the data already seeded')
+    parser.add_argument('--products', type=int, default=40)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--offers', type=int, default=20)
+    parser.add_argument('--reviews', type=int, default=5000)
+    parser.add_argument('--pincodes', type=int, default=400)
+    parser.add_argument('--indexed-pincodes', type=float, default=0.8,
+                        help='share of pincodes in the local pincode index')
+    parser.add_argument('--random-seed', type=int, default=42)
+    parser.add_argument('--flows', default=','.join(FLOWS), help='comma-separated, from: ' + ', '.join(FLOWS))
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per flow')
+    parser.add_argument('--warmup', type=int, default=50, help='unmeasured requests per flow first')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--shiprocket-latency-ms', type=float, default=300)
+    parser.add_argument('--razorpay-latency-ms', type=float, default=250)
+    parser.add_argument('--sms-latency-ms', type=float, default=400)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--output', help='result file (default bench/results/<time>-<commit>.json)')
+    parser.add_argument('--baseline', help='earlier result file to compare against')
+    args = parser.parse_args()
+    if args.mongomock and not args.seed:
+        parser.error('--mongomock starts empty, so it needs seeding (drop --no-seed)')
+    unknown = set(args.flows.split(',')) - set(FLOWS)
+    if unknown:
+        parser.error(f"unknown flows: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main():
+    args = parse_args()
+    if not args.mongomock:
+        check_database_name(args.mongo_uri, args.force)
+
+    services = {
+        'shiprocket': fakes.FakeService('shiprocket', args.shiprocket_latency_ms, args.jitter_ms).start(),
+        'razorpay': fakes.FakeService('razorpay', args.razorpay_latency_ms, args.jitter_ms).start(),
+        'sms': fakes.FakeService('sms', args.sms_latency_ms, args.jitter_ms).start(),
+    }
+    configure_env(args, services)
+
+    sizes = {'products': args.products, 'users': args.users, 'orders': args.orders, 'offers': args.offers,
+             'reviews': args.reviews, 'pincodes': args.pincodes, 'indexed_pincodes': args.indexed_pincodes,
+             'random_seed': args.random_seed}
+    server = process = None
+    if args.gunicorn and args.mongomock:
+        # Each worker needs the data in its own memory: the gunicorn master seeds before forking
+        print(f'[Bench] Seeding {args.orders} orders in the gunicorn master...')
+        ids_file = tempfile.NamedTemporaryFile(suffix='.json', delete=False).name
+        process, base = serve_gunicorn('mock_wsgi:app', ['--preload', '--pythonpath', 'bench'],
+                                       # A warm-up thread in the master could hold a mongomock lock across the fork
+                                       {'BENCH_SEED': json.dumps(dict(sizes, ids_file=ids_file)), 'WARMUP': 'false'})
+        wait_ready(base, timeout=1800)
+        with open(ids_file) as f:
+            ctx = json.load(f)
+        os.unlink(ids_file)
+    else:
+        import extensions
+        import seed as dataset
+        if args.mongomock:
+            mock_wsgi.use_mongomock()
+        db = extensions.get_db()
+        if args.seed:
+            print(f'[Bench] Seeding {args.orders} orders, {args.users} users, {args.products} products...')
+            started = time.perf_counter()
+            ctx = dataset.seed(db, replay=args.mongomock, **sizes)
+            print(f'[Bench] Seeded in {time.perf_counter() - started:.1f}s')
+        else:
+            ctx = dataset.ids(db)
+        if args.gunicorn:
+            process, base = serve_gunicorn('app:app')
+        else:
+            from app import app
+            server, base = serve(app)
+        wait_ready(base)
+    ctx['admin'] = admin_headers(base)
+
+    result = {
+        'started_at': datetime.datetime.utcnow().isoformat() + 'Z',
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'machine': f'{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs',
+        'mongo': 'mongomock' if args.mongomock else args.mongo_uri.rsplit('@', 1)[-1],
+        'dataset': ctx['counts'],
+        'settings': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'mongo_uri')},
+        'server': {'gunicorn': {'workers': int(os.getenv('WEB_CONCURRENCY', 2)),
+                                'threads': int(os.getenv('GUNICORN_THREADS', 8)),
+                                'mongo_max_pool_size': int(os.getenv('MONGO_MAX_POOL_SIZE', 20))}
+                   } if args.gunicorn else {'werkzeug': 'threaded, in-process'},
+        'flows': {},
+    }
+    for name in args.flows.split(','):
+        print(f'[Bench] {name}: {args.requests} requests at concurrency {args.concurrency}...')
+        flow = run_flow(name, base, ctx, args.requests, args.concurrency, args.warmup, args.random_seed)
+        result['flows'][name] = flow
+        lat = flow['latency_ms']
+        print(f"[Bench] {name}: p50 {lat['p50']}ms  p95 {lat['p95']}ms  p99 {lat['p99']}ms  "
+              f"{flow['throughput_rps']} req/s  errors {flow['errors']}")
+    result['fakes'] = {name: service.report() for name, service in services.items()}
+
+    if process:
+        result['server']['rss_mb'] = _rss_mb(process.pid)
+        process.terminate()
+        process.wait(timeout=60)
+    else:
+        server.shutdown()
+    for service in services.values():
+        service.stop()
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'results',
+        f"{datetime.datetime.utcnow():%Y%m%d-%H%M%S}-{result['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'[Bench] Wrote {output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Synthetic dataset for the benchmark.
+
+Everything is generated from one random seed, so two runs with the same
+sizes see the same data. Orders are spread over the last year with the
+status mix of a live store. After loading, the derived collections are
+rebuilt the way manage.py does it in production: daily_sales, the user
+counters, customer_counters and offers.used_count. Under mongomock, which
+has no $convert, daily_sales and the user counters are built instead by
+replaying every order through the hooks that keep them current.
+"""
+import datetime
+import random
+from bson import ObjectId
+
+CATEGORIES = ('Masale', 'Pickles', 'Papad', 'Flours', 'Sweets', 'Others')
+CITIES = ('Pune', 'Mumbai', 'Nashik', 'Ahmednagar', 'Shrigonda', 'Kolhapur', 'Satara', 'Solapur')
+# Weights of a live store's order statuses
+STATUSES = (('Placed', 10), ('Confirmed', 10), ('Shipped', 15), ('Delivered', 55),
+            ('Cancelled', 7), ('Declined', 3))
+BATCH = 1000
+
+
+def _insert(collection, docs):
+    for i in range(0, len(docs), BATCH):
+        collection.insert_many(docs[i:i + BATCH], ordered=False)
+
+
+def _phone(rng):
+    return str(rng.randint(7000000000, 9999999999))
+
+
+def make_products(rng, n):
+    return [{
+        '_id': ObjectId(),
+        'name': f'Bench Product {i}',
+        'description': 'Synthetic product for benchmarking. ' * 4,
+        'category': CATEGORIES[i % len(CATEGORIES)],
+        'price': rng.choice((49, 99, 149, 199, 249, 349, 499)),
+        'discount': rng.choice((0, 0, 5, 10)),
+        'weight': rng.choice((0.2, 0.25, 0.5, 1.0)),
+        # Enough that create_order never runs a product out of stock
+        'stock': 10 ** 9,
+        'status': 'active',
+        'images': [f'bench-{i}-{j}.jpg' for j in range(3)],
+    } for i in range(n)]
+
+
+def make_users(rng, n, now):
+    return [{
+        '_id': ObjectId(),
+        'phone': _phone(rng),
+        'name': f'Bench User {i}',
+        'email': f'user{i}@bench.invalid',
+        'address': f'{rng.randint(1, 999)} Bench Road',
+        'city': rng.choice(CITIES),
+        'pincode': '',
+        'created_at': now - datetime.timedelta(days=rng.uniform(0, 730)),
+    } for i in range(n)]
+
+
+def make_offers(rng, n, now):
+    offers = []
+    for i in range(n):
+        # Mostly live codes, plus some expired and paused ones
+        expired = i % 5 == 4
+        offers.append({
+            '_id': ObjectId(),
+            'code': f'BENCH{i:03d}',
+            'status': 'inactive' if i % 7 == 6 else 'active',
+            'discount_type': 'percentage' if i % 2 == 0 else 'fixed',
+            'discount_value': rng.choice((5, 10, 15, 50, 100)),
+            'start_date': (now - datetime.timedelta(days=400)).strftime('%Y-%m-%d'),
+            'end_date': (now + datetime.timedelta(days=-30 if expired else 365)).strftime('%Y-%m-%d'),
+            'usage_limit': '',
+            'used_count': 0,
+            'created_at': now - datetime.timedelta(days=n - i),
+        })
+    return offers
+
+
+def make_orders(rng, n, now, products, users, pincodes):
+    statuses = [s for s, _ in STATUSES]
+    weights = [w for _, w in STATUSES]
+    codes = [f'BENCH{i:03d}' for i in range(10)]
+    orders = []
+    for _ in range(n):
+        user = rng.choice(users)
+        lines = [{
+            'product_id': str(p['_id']),
+            'name': p['name'],
+            'category': p['category'],
+            'price': p['price'],
+            'quantity': rng.randint(1, 4),
+        } for p in rng.sample(products, rng.randint(1, 3))]
+        orders.append({
+            'user_id': str(user['_id']),
+            'products': lines,
+            'total_price': sum(line['price'] * line['quantity'] for line in lines),
+            'address': user['address'],
+            'city': user['city'],
+            'pincode': str(rng.choice(pincodes)),
+            'phone': user['phone'],
+            'name': user['name'],
+            'device_id': f"dev-{user['_id']}",
+            'order_status': rng.choices(statuses, weights)[0],
+            'payment_status': 'Paid' if rng.random() < 0.6 else 'Pending',
+            'payment_method': 'Razorpay' if rng.random() < 0.6 else 'COD',
+            'created_at': now - datetime.timedelta(days=rng.uniform(0, 365)),
+            'promo_code': rng.choice(codes) if rng.random() < 0.2 else '',
+            'tracking_id': 'PENDING',
+        })
+    return orders
+
+
+def make_reviews(rng, n, products, users):
+    start = datetime.datetime.utcnow() - datetime.timedelta(days=365)
+    return [{
+        'product_id': str(rng.choice(products)['_id']),
+        'user_id': str(user['_id']),
+        'user_name': user['name'],
+        'rating': rng.choice((3, 4, 4, 5, 5, 5)),
+        'title': 'Bench review',
+        'comment': 'Tastes like home. ' * rng.randint(1, 6),
+        'photo_id': None,
+        'thumb_id': None,
+        # The frontend stores ISO strings
+        'timestamp': (start + datetime.timedelta(minutes=rng.randint(0, 365 * 24 * 60))).isoformat() + 'Z',
+    } for user in (rng.choice(users) for _ in range(n))]
+
+
+def pincode_index_doc(rng, pincodes, fraction):
+    """The pincode_index document refresh-pincodes would write for a share of `pincodes`."""
+    swept = sorted(rng.sample(pincodes, int(len(pincodes) * fraction)))
+    return {
+        '_id': 'current',
+        'pins': swept,
+        'couriers': [4] * len(swept),
+        'courier_name': ['Xpressbees'] * len(swept),
+        'etd': ['3 Days'] * len(swept),
+        'rate': [float(45 + pin % 50) for pin in swept],
+        'refreshed_at': datetime.datetime.utcnow(),
+    }
+
+
+def replay_rollups(db):
+    """Build daily_sales and the user counters the way live orders update them."""
+    from analytics import EXCLUDED_STATUSES
+    import sales_rollup
+    import user_stats
+
+    db.users.update_many({}, {'$set': {'order_count': 0, 'total_spent': 0.0}})
+    for order in db.orders.find():
+        user_stats.order_created(db, order)
+        if order.get('order_status') not in EXCLUDED_STATUSES:
+            sales_rollup.apply_order(db, order, 1)
+    now = datetime.datetime.utcnow()
+    for name in ('daily_sales', 'user_stats'):
+        db.meta.update_one({'_id': name}, {'$set': {'built_at': now}}, upsert=True)
+
+
+def seed(db, products=40, users=5000, orders=50000, offers=20, reviews=5000, pincodes=400,
+         indexed_pincodes=0.8, random_seed=42, replay=False):
+    """
+    Replace the database's contents with a synthetic store.
+    replay=True builds the rollups with replay_rollups() (for mongomock).
+    Returns the ids the benchmark flows pick from.
+    """
+    import customer_counters
+    import promo_usage
+    import sales_rollup
+    import user_stats
+    from indexes import ensure_indexes
+
+    rng = random.Random(random_seed)
+    now = datetime.datetime.utcnow()
+    for name in db.list_collection_names():
+        if not name.startswith('system.'):
+            db.drop_collection(name)
+
+    pins = rng.sample(range(400001, 446000), pincodes)
+    product_docs = make_products(rng, products)
+    user_docs = make_users(rng, users, now)
+    _insert(db.products, product_docs)
+    _insert(db.users, user_docs)
+    _insert(db.offers, make_offers(rng, offers, now))
+    for i in range(0, orders, BATCH * 10):
+        _insert(db.orders, make_orders(rng, min(BATCH * 10, orders - i), now, product_docs, user_docs, pins))
+    _insert(db.reviews, make_reviews(rng, reviews, product_docs, user_docs))
+    db.pincode_index.insert_one(pincode_index_doc(rng, pins, indexed_pincodes))
+
+    ensure_indexes(db)
+    if replay:
+        replay_rollups(db)
+    else:
+        sales_rollup.rebuild(db)
+        user_stats.rebuild(db)
+    customer_counters.rebuild(db)
+    promo_usage.reconcile(db)
+    return ids(db)
+
+
+def ids(db):
+    """What the flows need from an already seeded database."""
+    today = datetime.datetime.utcnow().strftime('%Y-%m-%d')
+    # Codes checkout accepts (active and not expired)
+    offers = [o['code'] for o in db.offers.find({'status': 'active', 'end_date': {'$gte': today}}, {'code': 1})]
+    index = db.pincode_index.find_one({'_id': 'current'}) or {}
+    return {
+        'products': [{'_id': str(p['_id']), 'name': p['name'], 'price': p['price'],
+                      'category': p.get('category')} for p in db.products.find({}, {'name': 1, 'price': 1, 'category': 1})],
+        'users': [str(u['_id']) for u in db.users.find({}, {'_id': 1}).limit(20000)],
+        'pincodes': sorted({o['pincode'] for o in db.orders.find({}, {'pincode': 1}).limit(5000)}),
+        'indexed_pincodes': [str(p) for p in index.get('pins', [])],
+        'offers': offers,
+        'counts': {name: db[name].estimated_document_count()
+                   for name in ('products', 'users', 'orders', 'offers', 'reviews')},
+    }
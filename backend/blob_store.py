@@ -0,0 +1,180 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import tempfile
+from config import Config
+from extensions import get_db
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Thumbnails fall back to the original image
+    Image = None
+
+BLOB_ID_RE = re.compile(r'^[0-9a-f]{64}$')
+THUMB_SIZE = (320, 320)
+CHUNK_SIZE = 64 * 1024
+
+# Magic bytes of the image types we accept for review photos
+_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+
+class BlobError(ValueError):
+    pass
+
+
+def sniff_content_type(data):
+    for magic, content_type in _SIGNATURES:
+        if data.startswith(magic):
+            return content_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def decode_data_url(value):
+    """Decode a `data:image/...;base64,...` string (or bare base64) into bytes."""
+    if ',' in value and value.startswith('data:'):
+        value = value.split(',', 1)[1]
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise BlobError('Photo is not valid base64 data')
+
+
+class LocalBlobStore:
+    """Content-addressed files under BLOB_DIR, sharded by the first hash bytes."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, blob_id):
+        return os.path.join(self.root, blob_id[:2], blob_id[2:4], blob_id)
+
+    def put(self, blob_id, data, content_type):
+        path = self._path(blob_id)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A unique temp file per upload: threads of one worker may write the same blob at once
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+            tmp_path = f.name
+            try:
+                f.write(data)
+            except BaseException:
+                f.close()
+                os.unlink(tmp_path)
+                raise
+        os.replace(tmp_path, path)
+
+    def open(self, blob_id):
+        """Return (file object, content type, length) or None."""
+        path = self._path(blob_id)
+        if not os.path.exists(path):
+            return None
+        f = open(path, 'rb')
+        content_type = sniff_content_type(f.read(16)) or 'application/octet-stream'
+        f.seek(0)
+        return f, content_type, os.path.getsize(path)
+
+
+class GridFSBlobStore:
+    """Content-addressed blobs in the `blobs` GridFS bucket of the app database."""
+
+    def _bucket(self):
+        import gridfs
+        return gridfs.GridFS(get_db(), collection='blobs')
+
+    def put(self, blob_id, data, content_type):
+        fs = self._bucket()
+        if fs.exists({'filename': blob_id}):
+            return
+        fs.put(data, filename=blob_id, metadata={'contentType': content_type})
+
+    def open(self, blob_id):
+        grid_out = self._bucket().find_one({'filename': blob_id})
+        if grid_out is None:
+            return None
+        content_type = (grid_out.metadata or {}).get('contentType', 'application/octet-stream')
+        return grid_out, content_type, grid_out.length
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        if Config.BLOB_BACKEND == 'local':
+            _store = LocalBlobStore(Config.BLOB_DIR)
+        else:
+            _store = GridFSBlobStore()
+    return _store
+
+
+def make_thumbnail(data):
+    """Return JPEG thumbnail bytes, or None when Pillow is unavailable or the image can't be read."""
+    if Image is None:
+        return None
+    try:
+        img = Image.open(io.BytesIO(data))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(THUMB_SIZE)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        out = io.BytesIO()
+        img.save(out, format='JPEG', quality=80, optimize=True)
+        return out.getvalue()
+    except Exception as e:
+        print(f"[Blob] Thumbnail failed: {e}")
+        return None
+
+
+def put_image(data):
+    """
+    Store an uploaded image and its thumbnail.
+    Returns {'photo_id', 'thumb_id'}; ids are sha256 hex digests of the content.
+    """
+    if len(data) > Config.REVIEW_PHOTO_MAX_BYTES:
+        raise BlobError('Photo is too large')
+    content_type = sniff_content_type(data)
+    if not content_type:
+        raise BlobError('Photo must be a JPEG, PNG, GIF or WebP image')
+
+    store = get_store()
+    photo_id = hashlib.sha256(data).hexdigest()
+    store.put(photo_id, data, content_type)
+
+    thumb_id = photo_id
+    thumb = make_thumbnail(data)
+    if thumb:
+        thumb_id = hashlib.sha256(thumb).hexdigest()
+        store.put(thumb_id, thumb, 'image/jpeg')
+
+    return {'photo_id': photo_id, 'thumb_id': thumb_id}
+
+
+def open_blob(blob_id):
+    """Return (file object, content type, length) for a stored blob, or None."""
+    if not BLOB_ID_RE.match(blob_id or ''):
+        return None
+    return get_store().open(blob_id)
+
+
+def iter_blob(fileobj):
+    """Stream a blob in chunks so large photos never sit fully in memory."""
+    try:
+        while True:
+            chunk = fileobj.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
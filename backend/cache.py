@@ -0,0 +1,56 @@
+import threading
+import time
+from extensions import get_db
+from config import Config
+
+_MISSING = object()
+
+
+class VersionedCache:
+    """
+    Process-local cache of a value derived from Mongo.
+    Writers call invalidate(), which bumps a version counter in the `meta`
+    collection; every worker compares that counter at most once per
+    `check_interval` seconds and reloads when it changed.
+    """
+
+    def __init__(self, name, loader, check_interval=None):
+        self.name = name
+        self.loader = loader
+        self.check_interval = Config.CACHE_VERSION_CHECK_SECONDS if check_interval is None else check_interval
+        self._lock = threading.Lock()
+        self._value = _MISSING
+        self._version = None
+        self._checked_at = 0.0
+
+    def _remote_version(self, db):
+        doc = db.meta.find_one({'_id': self.name}, {'version': 1})
+        return doc.get('version', 0) if doc else 0
+
+    def get(self):
+        """Return the cached value, reloading it if another writer bumped the version."""
+        now = time.monotonic()
+        with self._lock:
+            if self._value is not _MISSING and now - self._checked_at < self.check_interval:
+                return self._value
+
+            db = get_db()
+            # Read the version before the data so a concurrent write is
+            # picked up on the next check instead of being masked.
+            version = self._remote_version(db)
+            if self._value is _MISSING or version != self._version:
+                self._value = self.loader(db)
+                self._version = version
+            self._checked_at = now
+            return self._value
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidate(self):
+        """Bump the shared version and drop the local copy."""
+        get_db().meta.update_one({'_id': self.name}, {'$inc': {'version': 1}}, upsert=True)
+        with self._lock:
+            self._value = _MISSING
+            self._checked_at = 0.0
@@ -0,0 +1,96 @@
+import threading
+import time
+from cache import VersionedCache
+from config import Config
+from extensions import get_db
+from http_cache import serialize
+
+# Shown for products created before stock was tracked
+DEFAULT_STOCK = 100
+
+
+def normalize_product(p):
+    """Apply the storefront fallbacks for products created before these fields existed."""
+    p['_id'] = str(p['_id'])
+    if 'images' not in p:
+        p['images'] = [p.get('image')] if p.get('image') else []
+    if 'stock' not in p:
+        p['stock'] = DEFAULT_STOCK
+    if 'discount' not in p:
+        p['discount'] = 0
+    if 'status' not in p:
+        p['status'] = 'active'
+    return p
+
+
+def _load_catalog(db):
+    # Stock changes with every order, so it is kept out of this cache and
+    # merged in from the stock snapshot below
+    products = [normalize_product(p) for p in db.products.find({}, {'stock': 0})]
+    for p in products:
+        p.pop('stock', None)
+    return {'products': products}
+
+
+_catalog = VersionedCache('catalog', _load_catalog)
+
+# {product_id: stock}, re-read at most every CATALOG_STOCK_TTL seconds
+_stock = {'levels': None, 'loaded_at': 0.0}
+_stock_lock = threading.Lock()
+
+# The storefront view: catalog + stock levels, serialized once per change of either
+_view = {'catalog': None, 'stock': None}
+_view_lock = threading.Lock()
+
+
+def _stock_levels():
+    now = time.monotonic()
+    with _stock_lock:
+        if _stock['levels'] is None or now - _stock['loaded_at'] >= Config.CATALOG_STOCK_TTL:
+            _stock['levels'] = {str(p['_id']): p.get('stock', DEFAULT_STOCK)
+                                for p in get_db().products.find({}, {'stock': 1})}
+            _stock['loaded_at'] = now
+        return _stock['levels']
+
+
+def _build_view(cat, levels):
+    products = [dict(p, stock=levels.get(p['_id'], DEFAULT_STOCK)) for p in cat['products']]
+    body, etag = serialize(products)
+    return {
+        'catalog': cat,
+        'stock': levels,
+        'products': products,
+        'by_id': {p['_id']: p for p in products},
+        # Per-product bodies so GET /<id> gets its own etag
+        'entries': {p['_id']: serialize(p) for p in products},
+        'body': body,
+        'etag': etag
+    }
+
+
+def get_catalog():
+    """Return the cached catalog: products, by_id, the pre-serialized body and its etag."""
+    global _view
+    cat = _catalog.get()
+    levels = _stock_levels()
+    with _view_lock:
+        # Only re-serialize when a product was edited or some stock level moved
+        if _view['catalog'] is not cat or _view['stock'] != levels:
+            _view = _build_view(cat, levels)
+        return _view
+
+
+def get_product(product_id):
+    return get_catalog()['by_id'].get(str(product_id))
+
+
+def get_product_entry(product_id):
+    """Return (body, etag) for one product, or None if it does not exist."""
+    return get_catalog()['entries'].get(str(product_id))
+
+
+def invalidate():
+    """Call after editing products (stock moves are picked up within CATALOG_STOCK_TTL)."""
+    _catalog.invalidate()
+    with _stock_lock:
+        _stock['levels'] = None
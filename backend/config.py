@@ -1,12 +1,123 @@
 import os
 from dotenv import load_dotenv
 
-load_dotenv(override=True)
+# Skipped when the caller sets up the environment itself (the benchmark does,
+# so a developer's .env can't point it at the real database)
+if os.getenv('LOAD_DOTENV', 'true').lower() != 'false':
+    load_dotenv(override=True)
 
 class Config:
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/gavran_magic')
+    # Connections per worker process: keep max above gunicorn threads + the
+    # job worker and cache refresh threads
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 20))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 2))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 5 * 60 * 1000))
+    # Fail fast when Atlas is unreachable instead of holding a thread for 30s
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000))
+    # Analytics aggregations over the full history can legitimately take a while
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 30000))
+    # Admin tokens are refused while this is left at the default
     JWT_SECRET = os.getenv('JWT_SECRET', 'your_jwt_secret_key')
+    # Admin routes need an admin token; 'false' reopens them (escape hatch)
+    AUTH_REQUIRED = os.getenv('AUTH_REQUIRED', 'true').lower() != 'false'
+    AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', 10000))
+    # How long a user's cached profile is trusted (seconds)
+    AUTH_USER_TTL = float(os.getenv('AUTH_USER_TTL', 300))
     SHIPROCKET_EMAIL = os.getenv('SHIPROCKET_EMAIL')
     SHIPROCKET_PASSWORD = os.getenv('SHIPROCKET_PASSWORD')
-    SHIPROCKET_BASE_URL = "https://apiv2.shiprocket.in/v1/external"
+    SHIPROCKET_BASE_URL = os.getenv('SHIPROCKET_BASE_URL', "https://apiv2.shiprocket.in/v1/external").rstrip('/')
+    # Where parcels are picked up: the Shrigonda factory
+    PICKUP_PINCODE = os.getenv('PICKUP_PINCODE', '413701')
+    SHIPROCKET_CONNECT_TIMEOUT = float(os.getenv('SHIPROCKET_CONNECT_TIMEOUT', 5))
+    SHIPROCKET_READ_TIMEOUT = float(os.getenv('SHIPROCKET_READ_TIMEOUT', 15))
+    SHIPROCKET_POOL_SIZE = int(os.getenv('SHIPROCKET_POOL_SIZE', 10))
+    # Where the login token is shared between worker processes: 'mongo' or 'none'
+    SHIPROCKET_TOKEN_CACHE = os.getenv('SHIPROCKET_TOKEN_CACHE', 'mongo')
+    # Serviceability/rate quote cache: fresh for QUOTE_TTL seconds, then served
+    # stale (while refreshing in the background) for QUOTE_STALE_TTL more
+    SHIPROCKET_QUOTE_TTL = float(os.getenv('SHIPROCKET_QUOTE_TTL', 6 * 3600))
+    SHIPROCKET_QUOTE_STALE_TTL = float(os.getenv('SHIPROCKET_QUOTE_STALE_TTL', 24 * 3600))
+    SHIPROCKET_QUOTE_CACHE_SIZE = int(os.getenv('SHIPROCKET_QUOTE_CACHE_SIZE', 5000))
+    # Bulk ship: concurrent pushes (keep <= SHIPROCKET_POOL_SIZE) and orders per call
+    SHIPROCKET_BULK_WORKERS = int(os.getenv('SHIPROCKET_BULK_WORKERS', 8))
+    SHIPROCKET_BULK_MAX = int(os.getenv('SHIPROCKET_BULK_MAX', 500))
     DEBUG = True
+
+    # Create missing indexes from indexes.INDEXES when connecting
+    AUTO_CREATE_INDEXES = os.getenv('AUTO_CREATE_INDEXES', 'true').lower() != 'false'
+
+    # How often (seconds) a worker checks the shared version of cached data
+    CACHE_VERSION_CHECK_SECONDS = float(os.getenv('CACHE_VERSION_CHECK_SECONDS', 2))
+
+    # Review photo storage: 'gridfs' (in MongoDB) or 'local' (files under BLOB_DIR)
+    BLOB_BACKEND = os.getenv('BLOB_BACKEND', 'gridfs')
+    BLOB_DIR = os.getenv('BLOB_DIR', os.path.join(os.path.dirname(__file__), 'uploads', 'blobs'))
+    REVIEW_PHOTO_MAX_BYTES = int(os.getenv('REVIEW_PHOTO_MAX_BYTES', 5 * 1024 * 1024))
+    # Whole review request: the photo as base64 (4/3 larger) plus the text fields
+    REVIEW_UPLOAD_MAX_BYTES = REVIEW_PHOTO_MAX_BYTES * 4 // 3 + 64 * 1024
+    # Any request body (Flask answers 413 above it); Mongo documents can't exceed 16 MB anyway
+    MAX_REQUEST_BYTES = int(os.getenv('MAX_REQUEST_BYTES', 16 * 1024 * 1024))
+    # Public base URL of this API, used for absolute photo links (defaults to the request host)
+    PUBLIC_API_URL = os.getenv('PUBLIC_API_URL', '').rstrip('/')
+
+    # Stock reservation at checkout: 'auto' uses a transaction on replica sets
+    # (Atlas), 'on'/'off' force it
+    INVENTORY_TRANSACTIONS = os.getenv('INVENTORY_TRANSACTIONS', 'auto').lower()
+
+    # Background jobs (jobs.py): 'thread' runs a worker thread in each web
+    # process, 'off' leaves them to `python manage.py worker`, 'inline' runs
+    # each job as soon as it is queued (local dev)
+    JOBS_WORKER = os.getenv('JOBS_WORKER', 'thread').lower()
+    JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 5))
+    JOBS_BACKOFF_SECONDS = float(os.getenv('JOBS_BACKOFF_SECONDS', 30))
+    JOBS_LEASE_SECONDS = float(os.getenv('JOBS_LEASE_SECONDS', 300))
+    JOBS_POLL_SECONDS = float(os.getenv('JOBS_POLL_SECONDS', 2))
+
+    # Rate limits on OTP, shipping-cost and payment endpoints (rate_limit.py):
+    # 'memory' counts per worker process, 'mongo' shares counts across workers
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() != 'false'
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory').lower()
+    # OTP limits guard SMS spend and logins, so they are shared across workers
+    RATE_LIMIT_OTP_BACKEND = os.getenv('RATE_LIMIT_OTP_BACKEND', 'mongo').lower()
+    # Proxies in front of the app that append to X-Forwarded-For (Render: 1);
+    # 0 ignores the header and uses the socket address
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 1))
+
+    # Documents fetched per round trip by the streaming exports
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 500))
+
+    # Open the Mongo pool and prime the caches in the background at startup
+    WARMUP = os.getenv('WARMUP', 'true').lower() != 'false'
+
+    # Prometheus metrics at /metrics; set METRICS_TOKEN to require
+    # `Authorization: Bearer <token>` from the scraper (without one, only
+    # loopback/private addresses may scrape)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() != 'false'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+    # Slow query log (slow_queries.py): Mongo operations slower than this many
+    # ms are explained and written to SLOW_QUERY_LOG. 0 turns it off.
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 0))
+    SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', os.path.join(os.path.dirname(__file__), 'logs', 'slow_queries.log'))
+    SLOW_QUERY_LOG_BYTES = int(os.getenv('SLOW_QUERY_LOG_BYTES', 5 * 1024 * 1024))
+    SLOW_QUERY_LOG_BACKUPS = int(os.getenv('SLOW_QUERY_LOG_BACKUPS', 3))
+    # Each filter shape is explained again at most this often
+    SLOW_QUERY_EXPLAIN_SECONDS = float(os.getenv('SLOW_QUERY_EXPLAIN_SECONDS', 300))
+    # Re-run slow reads under executionStats (executes each one twice)
+    SLOW_QUERY_EXECUTION_STATS = os.getenv('SLOW_QUERY_EXECUTION_STATS', 'false').lower() == 'true'
+
+    # Third-party API roots. Only the benchmark (bench/fakes.py) changes them;
+    # an empty RAZORPAY_BASE_URL keeps the SDK's own
+    FAST2SMS_URL = os.getenv('FAST2SMS_URL', 'https://www.fast2sms.com/dev/bulkV2')
+    TWOFACTOR_BASE_URL = os.getenv('TWOFACTOR_BASE_URL', 'https://2factor.in/API/V1').rstrip('/')
+    RAZORPAY_BASE_URL = os.getenv('RAZORPAY_BASE_URL', '').rstrip('/')
+
+    # How stale (seconds) the stock levels shown in the storefront catalog may be;
+    # checkout always reserves against the live value
+    CATALOG_STOCK_TTL = float(os.getenv('CATALOG_STOCK_TTL', 5))
+
+    # Order confirmation SMS go out on Fast2SMS's paid quick route, so they
+    # are opt-in; otherwise they are only printed to the console
+    ORDER_SMS_ENABLED = os.getenv('ORDER_SMS_ENABLED', 'false').lower() == 'true'
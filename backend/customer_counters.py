@@ -0,0 +1,104 @@
+import datetime
+from pymongo import UpdateOne
+
+# customer_counters: {_id: 'user:<user_id>' | 'device:<device_id>', orders: n}
+# where n counts the customer's orders that are not 'Cancelled' (the rule the
+# first-order free delivery checks have always used).
+
+_built = False
+
+
+def _keys(user_id=None, device_id=None):
+    keys = {}
+    if user_id and user_id != 'guest':
+        keys['user'] = f"user:{user_id}"
+    if device_id:
+        keys['device'] = f"device:{device_id}"
+    return keys
+
+
+def _apply(db, order, delta):
+    keys = _keys(order.get('user_id'), order.get('device_id'))
+    if keys:
+        db.customer_counters.bulk_write(
+            [UpdateOne({'_id': k}, {'$inc': {'orders': delta}, '$set': {'updated_at': datetime.datetime.utcnow()}},
+                       upsert=True) for k in keys.values()],
+            ordered=False
+        )
+
+
+def order_created(db, order):
+    if order.get('order_status') != 'Cancelled':
+        _apply(db, order, 1)
+
+
+def order_status_changed(db, order, old_status, new_status):
+    if old_status != 'Cancelled' and new_status == 'Cancelled':
+        _apply(db, order, -1)
+    elif old_status == 'Cancelled' and new_status != 'Cancelled':
+        _apply(db, order, 1)
+
+
+def order_deleted(db, order):
+    if order.get('order_status') != 'Cancelled':
+        _apply(db, order, -1)
+
+
+def is_built(db):
+    global _built
+    if not _built:
+        # Once built it stays built, so only the misses cost a read
+        _built = db.meta.find_one({'_id': 'customer_counters'}) is not None
+    return _built
+
+
+def order_counts(db, user_id=None, device_id=None):
+    """
+    Non-cancelled order counts for a customer: {'user': n, 'device': n}, with
+    only the keys that were asked about (guests have no user count).
+    One point read once the counters are built, count_documents until then.
+    """
+    keys = _keys(str(user_id) if user_id else None, str(device_id) if device_id else None)
+    if not keys:
+        return {}
+    if is_built(db):
+        found = {d['_id']: d.get('orders', 0)
+                 for d in db.customer_counters.find({'_id': {'$in': list(keys.values())}})}
+        return {kind: found.get(key, 0) for kind, key in keys.items()}
+
+    fields = {'user': 'user_id', 'device': 'device_id'}
+    return {
+        kind: db.orders.count_documents({fields[kind]: key.split(':', 1)[1], 'order_status': {'$ne': 'Cancelled'}})
+        for kind, key in keys.items()
+    }
+
+
+def rebuild(db):
+    """Recompute every counter from the orders collection."""
+    stamp = datetime.datetime.utcnow()
+    # Counters that existed before the rebuild; those the aggregation no longer
+    # produces are deleted at the end. Ones checkout creates meanwhile aren't in here.
+    stale = {d['_id'] for d in db.customer_counters.find({}, {'_id': 1})}
+    ops = []
+    for field, prefix in (('user_id', 'user'), ('device_id', 'device')):
+        rows = db.orders.aggregate([
+            {'$match': {'order_status': {'$ne': 'Cancelled'}, field: {'$nin': [None, '', 'guest']}}},
+            {'$group': {'_id': f'${field}', 'n': {'$sum': 1}}}
+        ], allowDiskUse=True)
+        for row in rows:
+            key = f"{prefix}:{row['_id']}"
+            stale.discard(key)
+            ops.append(UpdateOne({'_id': key},
+                                 {'$set': {'orders': row['n'], 'rebuilt_at': stamp}}, upsert=True))
+            if len(ops) >= 1000:
+                db.customer_counters.bulk_write(ops, ordered=False)
+                ops = []
+    if ops:
+        db.customer_counters.bulk_write(ops, ordered=False)
+    # Customers whose orders were all cancelled or deleted, unless an order
+    # event touched them while the rebuild ran
+    stale = list(stale)
+    for i in range(0, len(stale), 1000):
+        db.customer_counters.delete_many({'_id': {'$in': stale[i:i + 1000]},
+                                          'updated_at': {'$not': {'$gte': stamp}}})
+    db.meta.update_one({'_id': 'customer_counters'}, {'$set': {'built_at': stamp}}, upsert=True)
@@ -1,18 +1,27 @@
 from pymongo import MongoClient
+from config import Config
+import metrics
+import slow_queries
 import os
+import threading
 
 _client = None
 _db = None
+_lock = threading.Lock()
 
 def connect_db():
     """Initialize the MongoDB connection once at app startup."""
     global _client, _db
     uri = os.getenv('MONGO_URI', 'mongodb://localhost:27017/gavran_magic')
-    _client = MongoClient(
+    client = MongoClient(
         uri,
-        serverSelectionTimeoutMS=30000,
-        connectTimeoutMS=30000,
-        socketTimeoutMS=30000
+        maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+        minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=Config.MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=Config.MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=Config.MONGO_SOCKET_TIMEOUT_MS,
+        event_listeners=metrics.mongo_listeners() + slow_queries.mongo_listeners()
     )
     # Extract DB name from URI (e.g. /gavran_magic?...) or default
     try:
@@ -20,11 +29,31 @@ def connect_db():
         db_name = path_part if path_part else 'gavran_magic'
     except Exception:
         db_name = 'gavran_magic'
-    _db = _client[db_name]
+    _client = client
+    _db = client[db_name]
     print(f"[DB] Connected to MongoDB database: '{db_name}'")
 
+    if Config.AUTO_CREATE_INDEXES:
+        from indexes import ensure_indexes
+        try:
+            ensure_indexes(_db)
+        except Exception as e:
+            print(f"[DB] Index bootstrap failed: {e}")
+
 def get_db():
     """Return the database instance."""
     if _db is None:
-        connect_db()
+        # Threaded workers: only the first request builds the client
+        with _lock:
+            if _db is None:
+                connect_db()
     return _db
+
+def reset_db():
+    """
+    Forget the client in a freshly forked worker. MongoClient isn't fork-safe,
+    so each gunicorn worker must open its own pool (on the next get_db()).
+    """
+    global _client, _db
+    _client = None
+    _db = None
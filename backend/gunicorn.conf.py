@@ -0,0 +1,35 @@
+"""
+Gunicorn settings for the API (`gunicorn -c gunicorn.conf.py app:app`).
+
+Threaded workers (gthread): a request waiting on Atlas, Shiprocket or
+Razorpay only holds its own thread, not the whole process. pymongo and
+requests are thread-safe, so no monkey patching (gevent) is needed.
+Every setting can be overridden from the environment.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then so slow leaks can't build up
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+
+
+def post_fork(server, worker):
+    # With preload_app the master may already hold a MongoClient; never share it
+    from extensions import reset_db
+    reset_db()
+
+
+def post_worker_init(worker):
+    # Threads don't survive fork: start this worker's job runner and warm-up here
+    import jobs
+    import warmup
+    jobs.ensure_worker()
+    warmup.start()
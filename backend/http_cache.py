@@ -0,0 +1,18 @@
+import hashlib
+import json
+from flask import Response, request
+
+
+def serialize(value):
+    """JSON body for a cached value and its etag."""
+    body = json.dumps(value, default=str, separators=(',', ':')).encode('utf-8')
+    return body, hashlib.sha1(body).hexdigest()
+
+
+def conditional_json(body, etag):
+    """Serve a pre-serialized JSON body, answering 304 when the client already has it."""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Let browsers/CDN keep a copy but revalidate it on every use
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response.make_conditional(request)
@@ -0,0 +1,251 @@
+import datetime
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# Every index the app relies on. ensure_indexes() creates whatever is missing;
+# an index someone made by hand on Atlas with the same keys is kept, but
+# reported when its options differ (a TTL is corrected in place).
+INDEXES = {
+    'orders': [
+        {'keys': [('user_id', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('device_id', ASCENDING)]},
+        {'keys': [('promo_code', ASCENDING), ('order_status', ASCENDING)]},
+        {'keys': [('created_at', DESCENDING), ('_id', DESCENDING)]},
+    ],
+    'otps': [
+        {'keys': [('phone', ASCENDING)], 'unique': True},
+        # Expired OTPs linger an hour so verify_otp can still say "expired"
+        {'keys': [('expiry', ASCENDING)], 'expireAfterSeconds': 3600},
+    ],
+    # No longer written (rate limits moved to rate_limit.py); the TTL drains it
+    'otp_logs': [
+        {'keys': [('created_at', ASCENDING)], 'expireAfterSeconds': 24 * 3600},
+    ],
+    'rate_limits': [
+        {'keys': [('expires_at', ASCENDING)], 'expireAfterSeconds': 0},
+    ],
+    'users': [
+        {'keys': [('phone', ASCENDING)]},
+        {'keys': [('created_at', DESCENDING), ('_id', DESCENDING)]},
+        {'keys': [('total_spent', DESCENDING), ('_id', DESCENDING)]},
+        {'keys': [('order_count', DESCENDING), ('_id', DESCENDING)]},
+    ],
+    'reviews': [
+        {'keys': [('product_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)]},
+    ],
+    'offers': [
+        {'keys': [('code', ASCENDING)]},
+        {'keys': [('created_at', DESCENDING)]},
+    ],
+    'jobs': [
+        {'keys': [('status', ASCENDING), ('lane', ASCENDING), ('run_at', ASCENDING)]},
+        {'keys': [('status', ASCENDING), ('lease_until', ASCENDING)]},
+        # Finished jobs are kept a week for the admin jobs view; dead ones stay
+        {'keys': [('finished_at', ASCENDING)], 'expireAfterSeconds': 7 * 24 * 3600},
+    ],
+}
+
+# The hot query shapes from the routes, checked by index_report()
+QUERY_SHAPES = [
+    {'name': 'orders by user', 'collection': 'orders',
+     'filter': {'user_id': 'x'}, 'sort': {'created_at': -1}},
+    {'name': 'first-order check by user', 'collection': 'orders',
+     'filter': {'user_id': 'x', 'order_status': {'$ne': 'Cancelled'}}},
+    {'name': 'first-order check by device', 'collection': 'orders',
+     'filter': {'device_id': 'x', 'order_status': {'$ne': 'Cancelled'}}},
+    {'name': 'promo usage count', 'collection': 'orders',
+     'filter': {'promo_code': 'X', 'order_status': {'$nin': ['Cancelled', 'Declined']}}},
+    {'name': 'orders by date range', 'collection': 'orders',
+     'filter': {'created_at': {'$gte': {'$date': 0}}}, 'sort': {'created_at': -1}},
+    {'name': 'admin order list', 'collection': 'orders',
+     'filter': {}, 'sort': {'created_at': -1, '_id': -1}},
+    {'name': 'otp by phone', 'collection': 'otps', 'filter': {'phone': 'x'}},
+    {'name': 'user by phone', 'collection': 'users', 'filter': {'phone': 'x'}},
+    {'name': 'admin user list', 'collection': 'users',
+     'filter': {}, 'sort': {'created_at': -1, '_id': -1}},
+    {'name': 'users by spend', 'collection': 'users',
+     'filter': {}, 'sort': {'total_spent': -1, '_id': -1}},
+    {'name': 'reviews by product', 'collection': 'reviews',
+     'filter': {'product_id': 'x'}, 'sort': {'timestamp': -1, '_id': -1}},
+    {'name': 'offer by code', 'collection': 'offers', 'filter': {'code': 'X'}},
+    {'name': 'due jobs', 'collection': 'jobs',
+     'filter': {'status': 'queued', 'lane': 'otp', 'run_at': {'$lte': {'$date': 0}}}, 'sort': {'run_at': 1}},
+]
+
+
+def _key_tuple(keys):
+    # Servers report directions as 1.0/-1.0; text/2dsphere indexes use strings
+    return tuple((field, int(d) if isinstance(d, (int, float)) else d) for field, d in keys)
+
+
+# Options that change what an index does, compared when the keys already exist
+COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+
+def _option_diff(spec, existing):
+    """{option: {'wanted', 'found'}} for each option where the existing index differs from the spec."""
+    diff = {}
+    for option in COMPARED_OPTIONS:
+        wanted, found = spec.get(option), existing.get(option)
+        if option in ('unique', 'sparse'):
+            wanted, found = bool(wanted), bool(found)
+        elif option == 'expireAfterSeconds' and found is not None:
+            found = int(found)
+        elif option == 'partialFilterExpression' and found is not None:
+            found = dict(found)
+        if wanted != found:
+            diff[option] = {'wanted': wanted, 'found': found}
+    return diff
+
+
+def _existing_indexes(coll):
+    return {_key_tuple(ix['key'].items()): ix for ix in coll.list_indexes()}
+
+
+def _set_ttl(db, coll_name, spec):
+    """collMod an existing index to the manifest's TTL (works on non-TTL single-field indexes from 5.1)."""
+    db.command('collMod', coll_name, index={'keyPattern': dict(spec['keys']),
+                                            'expireAfterSeconds': spec['expireAfterSeconds']})
+
+
+def ensure_indexes(db):
+    """
+    Create any manifest index that is missing. Safe to run on every startup.
+    An existing index with the wrong TTL is corrected; other option mismatches
+    (unique, sparse, partial filter) need the index dropped by hand and are
+    only reported.
+    """
+    created = []
+    for coll_name, specs in INDEXES.items():
+        coll = db[coll_name]
+        try:
+            existing = _existing_indexes(coll)
+        except OperationFailure as e:
+            print(f"[DB] Could not list indexes on {coll_name}: {e}")
+            continue
+
+        for spec in specs:
+            found = existing.get(_key_tuple(spec['keys']))
+            if found is not None:
+                diff = _option_diff(spec, found)
+                if set(diff) == {'expireAfterSeconds'} and spec.get('expireAfterSeconds') is not None:
+                    try:
+                        _set_ttl(db, coll_name, spec)
+                        created.append(f"{coll_name}.{found['name']} (TTL {spec['expireAfterSeconds']}s)")
+                        continue
+                    except OperationFailure as e:
+                        print(f"[DB] Could not set the TTL of {coll_name}.{found['name']}: {e}")
+                if diff:
+                    print(f"[DB] Index {coll_name}.{found['name']} differs from the manifest: {diff}")
+                continue
+            options = {k: v for k, v in spec.items() if k != 'keys'}
+            try:
+                created.append(f"{coll_name}.{coll.create_index(spec['keys'], **options)}")
+            except OperationFailure as e:
+                # e.g. duplicate phones blocking a unique index - report, don't crash startup
+                print(f"[DB] Could not create index {spec['keys']} on {coll_name}: {e}")
+    if created:
+        print(f"[DB] Created indexes: {', '.join(created)}")
+    return created
+
+
+def index_mismatches(db):
+    """Existing indexes whose keys match the manifest but whose options don't."""
+    mismatches = []
+    for coll_name, specs in INDEXES.items():
+        try:
+            existing = _existing_indexes(db[coll_name])
+        except OperationFailure:
+            continue
+        for spec in specs:
+            found = existing.get(_key_tuple(spec['keys']))
+            diff = _option_diff(spec, found) if found is not None else None
+            if diff:
+                mismatches.append({'collection': coll_name, 'index': found['name'], 'differences': diff})
+    return mismatches
+
+
+def _plan_stages(plan):
+    """Flatten a (winning) query plan tree into its stage names, outermost first."""
+    stages = []
+    while plan:
+        stages.append(plan.get('stage'))
+        if 'inputStage' in plan:
+            plan = plan['inputStage']
+        elif plan.get('inputStages'):
+            for child in plan['inputStages']:
+                stages.extend(_plan_stages(child))
+            break
+        else:
+            break
+    return stages
+
+
+def _to_query(value):
+    """Turn the {'$date': 0} placeholders in QUERY_SHAPES into real datetimes."""
+    if isinstance(value, dict):
+        if set(value) == {'$date'}:
+            return datetime.datetime.utcfromtimestamp(value['$date'])
+        return {k: _to_query(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_to_query(v) for v in value]
+    return value
+
+
+def explain_shape(db, shape, verbosity='queryPlanner'):
+    cmd = {'find': shape['collection'], 'filter': _to_query(shape['filter'])}
+    if shape.get('sort'):
+        cmd['sort'] = shape['sort']
+    result = db.command('explain', cmd, verbosity=verbosity)
+    summary = {'name': shape['name'], 'collection': shape['collection']}
+    summary.update(summarize_explain(result))
+    return summary
+
+
+def summarize_explain(result):
+    """Winning plan stages, COLLSCAN / in-memory SORT flags and (with executionStats) work done."""
+    # Aggregations report the plan of their first ($cursor) stage
+    if 'queryPlanner' not in result and result.get('stages'):
+        result = result['stages'][0].get('$cursor', {})
+    planner = result.get('queryPlanner', {})
+    winning = planner.get('winningPlan', {})
+    # Newer servers nest the classic plan under queryPlan
+    stages = _plan_stages(winning.get('queryPlan', winning))
+    summary = {
+        'stages': stages,
+        'collscan': 'COLLSCAN' in stages,
+        'in_memory_sort': 'SORT' in stages,
+    }
+    stats = result.get('executionStats')
+    if stats:
+        summary['docs_examined'] = stats.get('totalDocsExamined')
+        summary['keys_examined'] = stats.get('totalKeysExamined')
+        summary['returned'] = stats.get('nReturned')
+    return summary
+
+
+def index_report(db, verbosity='queryPlanner'):
+    """$indexStats for every managed collection plus explain() of the known query shapes."""
+    usage = {}
+    for coll_name in INDEXES:
+        try:
+            usage[coll_name] = [
+                {'name': s['name'], 'ops': s['accesses']['ops'], 'since': s['accesses']['since']}
+                for s in db[coll_name].aggregate([{'$indexStats': {}}])
+            ]
+        except OperationFailure as e:
+            usage[coll_name] = {'error': str(e)}
+
+    queries = []
+    for shape in QUERY_SHAPES:
+        try:
+            queries.append(explain_shape(db, shape, verbosity))
+        except OperationFailure as e:
+            queries.append({'name': shape['name'], 'collection': shape['collection'], 'error': str(e)})
+
+    return {
+        'index_usage': usage,
+        'queries': queries,
+        'collscans': [q['name'] for q in queries if q.get('collscan')],
+        'mismatched_indexes': index_mismatches(db),
+    }
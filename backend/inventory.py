@@ -0,0 +1,162 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from config import Config
+
+
+class _Shortage(Exception):
+    """Raised inside the transaction to abort it when a line can't be reserved."""
+
+
+def parse_quantity(value):
+    """A cart quantity as an int >= 1, or None if it isn't one (negative, zero, fractional, text)."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float):
+        value = int(value) if value.is_integer() else None
+    try:
+        qty = int(value)
+    except (TypeError, ValueError):
+        return None
+    return qty if qty >= 1 else None
+
+
+def merge_lines(items):
+    """
+    Collapse cart lines into {ObjectId: quantity}.
+    Returns (lines, bad_ids, bad_lines): bad_ids are product ids that aren't
+    ObjectIds, bad_lines the lines whose quantity isn't a whole number >= 1.
+    Neither kind is included in `lines`.
+    """
+    lines = {}
+    bad_ids = []
+    bad_lines = []
+    for item in items:
+        if not isinstance(item, dict):
+            bad_lines.append(item)
+            continue
+        qty = parse_quantity(item.get('quantity', 1))
+        if qty is None:
+            bad_lines.append(item)
+            continue
+        p_id = item.get('product_id')
+        try:
+            oid = ObjectId(str(p_id))
+        except InvalidId:
+            bad_ids.append(p_id)
+            continue
+        lines[oid] = lines.get(oid, 0) + qty
+    return lines, bad_ids, bad_lines
+
+
+def invalid_lines(items):
+    """Cart lines that can't be ordered as sent (checked before anything is reserved)."""
+    if not isinstance(items, list) or not items:
+        return ['products must be a non-empty list']
+    return merge_lines(items)[2]
+
+
+_transactions = None
+
+
+def _supports_transactions(db):
+    global _transactions
+    if Config.INVENTORY_TRANSACTIONS != 'auto':
+        return Config.INVENTORY_TRANSACTIONS == 'on'
+    if _transactions is None:
+        if db.client.topology_description.topology_type_name == 'Unknown':
+            db.command('ping')  # wait for server discovery
+        topology = db.client.topology_description.topology_type_name
+        _transactions = topology in ('ReplicaSetWithPrimary', 'Sharded')
+    return _transactions
+
+
+def _decrement_ops(lines):
+    return [
+        UpdateOne({'_id': oid, 'stock': {'$gte': qty}}, {'$inc': {'stock': -qty}})
+        for oid, qty in lines.items()
+    ]
+
+
+def _reserve_in_transaction(db, lines):
+    ops = _decrement_ops(lines)
+
+    def txn(session):
+        result = db.products.bulk_write(ops, ordered=False, session=session)
+        if result.modified_count != len(ops):
+            raise _Shortage()
+
+    with db.client.start_session() as session:
+        try:
+            # with_transaction retries write conflicts with concurrent checkouts
+            session.with_transaction(txn)
+            return True
+        except _Shortage:
+            return False
+
+
+def _reserve_sequentially(db, lines):
+    """Standalone servers have no transactions: reserve line by line, undo on failure."""
+    reserved = {}
+    for oid, qty in lines.items():
+        result = db.products.update_one({'_id': oid, 'stock': {'$gte': qty}}, {'$inc': {'stock': -qty}})
+        if result.modified_count != 1:
+            release_lines(db, reserved)
+            return False
+        reserved[oid] = qty
+    return True
+
+
+def _shortages(db, lines):
+    """Work out which lines could not be reserved, from current stock levels."""
+    found = {p['_id']: p for p in db.products.find({'_id': {'$in': list(lines)}}, {'name': 1, 'stock': 1})}
+    missing, short = [], []
+    for oid, qty in lines.items():
+        product = found.get(oid)
+        if product is None:
+            missing.append(str(oid))
+            continue
+        available = int(product.get('stock', 0))
+        if available < qty:
+            short.append({'product_id': str(oid), 'name': product.get('name'),
+                          'requested': qty, 'available': available})
+    return missing, short
+
+
+def reserve_stock(db, items):
+    """
+    Decrement stock for every cart line, all or nothing.
+    Returns {'ok': True} or {'ok': False, 'missing': [...ids], 'short': [...lines]}.
+    """
+    lines, bad_ids, bad_lines = merge_lines(items)
+    if bad_lines:
+        raise ValueError(f'Invalid cart lines: {bad_lines}')
+    if bad_ids:
+        return {'ok': False, 'missing': [str(i) for i in bad_ids], 'short': []}
+    if not lines:
+        return {'ok': True}
+
+    if _supports_transactions(db):
+        ok = _reserve_in_transaction(db, lines)
+    else:
+        ok = _reserve_sequentially(db, lines)
+    if ok:
+        return {'ok': True}
+
+    missing, short = _shortages(db, lines)
+    return {'ok': False, 'missing': missing, 'short': short}
+
+
+def release_lines(db, lines):
+    if lines:
+        db.products.bulk_write(
+            [UpdateOne({'_id': oid}, {'$inc': {'stock': qty}}) for oid, qty in lines.items()],
+            ordered=False
+        )
+
+
+def release_stock(db, items):
+    """Return the stock of cart lines (failed checkout, cancelled or declined order)."""
+    # Lines with an unusable quantity were never reserved
+    lines, _, _ = merge_lines(items)
+    release_lines(db, lines)
@@ -0,0 +1,245 @@
+"""
+Mongo-backed job queue for work that talks to third parties (SMS, Shiprocket),
+so requests return without waiting on them.
+
+A job document moves queued -> leased -> done, or back to queued with a
+backoff delay when its handler raises, and to dead once it has used up
+max_attempts. A leased job whose worker died is picked up again when its
+lease expires.
+
+Workers: in-process daemon threads in each web process (JOBS_WORKER=thread),
+a separate `python manage.py worker` process (JOBS_WORKER=off in the web
+processes), or JOBS_WORKER=inline to run jobs immediately (local dev).
+
+Each lane has its own worker thread, so a login OTP never waits behind a
+batch of Shiprocket pushes. enqueue() wakes the lane's thread in the same
+process straight away; other processes pick the job up within
+JOBS_POLL_SECONDS.
+"""
+import datetime
+import os
+import socket
+import threading
+from bson import ObjectId
+from pymongo import ReturnDocument
+from config import Config
+from extensions import get_db
+
+HANDLERS = {}
+DEFAULT_LANE = 'default'
+
+_worker_threads = {}  # lane -> thread
+_worker_pid = None
+_worker_lock = threading.Lock()
+_wake = {}  # lane -> Event set by enqueue()
+
+
+def job(name, max_attempts=None, secret_fields=(), lane=DEFAULT_LANE):
+    """
+    Register a handler: `@job('send_sms')`. Handlers take the payload as kwargs.
+    `secret_fields` are payload keys removed once the job finishes and never
+    shown by the admin API. Jobs in different lanes run on different threads.
+    """
+    def decorator(fn):
+        HANDLERS[name] = (fn, max_attempts or Config.JOBS_MAX_ATTEMPTS, tuple(secret_fields), lane)
+        return fn
+    return decorator
+
+
+def _lanes():
+    _load_handlers()
+    return sorted({h[3] for h in HANDLERS.values()} | {DEFAULT_LANE})
+
+
+def _wake_event(lane):
+    return _wake.setdefault(lane, threading.Event())
+
+
+def _secret_fields(name):
+    _load_handlers()
+    return HANDLERS[name][2] if name in HANDLERS else ()
+
+
+def redact(doc):
+    """A job document with its secret payload fields masked (for the admin API)."""
+    payload = doc.get('payload') or {}
+    for field in _secret_fields(doc.get('name')):
+        if field in payload:
+            payload[field] = '[redacted]'
+    return doc
+
+
+def _load_handlers():
+    # Handlers live in tasks.py; importing it registers them
+    import tasks  # noqa: F401
+
+
+def enqueue(name, payload=None, delay=0):
+    """Queue a job and return its id (as a string)."""
+    _load_handlers()
+    if name not in HANDLERS:
+        raise ValueError(f'Unknown job: {name}')
+    now = datetime.datetime.utcnow()
+    doc = {
+        'name': name,
+        'lane': HANDLERS[name][3],
+        'payload': payload or {},
+        'status': 'queued',
+        'attempts': 0,
+        'max_attempts': HANDLERS[name][1],
+        'run_at': now + datetime.timedelta(seconds=delay),
+        'created_at': now,
+        'last_error': None
+    }
+    db = get_db()
+    job_id = db.jobs.insert_one(doc).inserted_id
+
+    if Config.JOBS_WORKER == 'inline':
+        leased = _lease(db, {'_id': job_id}, 'inline')
+        if leased:
+            run_job(db, leased)
+    elif Config.JOBS_WORKER == 'thread':
+        ensure_worker()
+        if not delay:
+            _wake_event(doc['lane']).set()
+    return str(job_id)
+
+
+def _lane_query(lane):
+    # Jobs queued before lanes existed have none and run in the default lane
+    return {'lane': {'$in': [lane, None]}} if lane == DEFAULT_LANE else {'lane': lane}
+
+
+def _lease(db, extra_query, worker_id, lane=None):
+    now = datetime.datetime.utcnow()
+    query = {'$or': [
+        {'status': 'queued', 'run_at': {'$lte': now}},
+        {'status': 'leased', 'lease_until': {'$lt': now}},
+    ]}
+    extra = [q for q in (extra_query, _lane_query(lane) if lane else None) if q]
+    if extra:
+        query = {'$and': [query] + extra}
+    return db.jobs.find_one_and_update(
+        query,
+        {'$set': {
+            'status': 'leased',
+            'lease_until': now + datetime.timedelta(seconds=Config.JOBS_LEASE_SECONDS),
+            'worker': worker_id
+        }, '$inc': {'attempts': 1}},
+        sort=[('run_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _finished_unset(doc):
+    # Done and dead jobs are kept for the admin view; their secrets aren't
+    unset = {'lease_until': ''}
+    for field in _secret_fields(doc['name']):
+        unset[f'payload.{field}'] = ''
+    return unset
+
+
+def run_job(db, doc):
+    """Run one leased job and record the outcome."""
+    handler = HANDLERS.get(doc['name'])
+    now = datetime.datetime.utcnow()
+    try:
+        if handler is None:
+            raise RuntimeError(f"No handler registered for {doc['name']}")
+        handler[0](**doc.get('payload', {}))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if doc['attempts'] >= doc.get('max_attempts', Config.JOBS_MAX_ATTEMPTS):
+            print(f"[Jobs] {doc['name']} {doc['_id']} is dead after {doc['attempts']} attempts: {error}")
+            update = {'status': 'dead', 'dead_at': now, 'last_error': error}
+            unset = _finished_unset(doc)
+        else:
+            backoff = min(Config.JOBS_BACKOFF_SECONDS * 2 ** (doc['attempts'] - 1), 3600)
+            print(f"[Jobs] {doc['name']} {doc['_id']} failed (attempt {doc['attempts']}), retrying in {backoff}s: {error}")
+            update = {'status': 'queued', 'run_at': now + datetime.timedelta(seconds=backoff), 'last_error': error}
+            unset = {'lease_until': ''}
+        db.jobs.update_one({'_id': doc['_id']}, {'$set': update, '$unset': unset})
+        return False
+
+    db.jobs.update_one(
+        {'_id': doc['_id']},
+        {'$set': {'status': 'done', 'finished_at': now}, '$unset': _finished_unset(doc)}
+    )
+    return True
+
+
+def work_once(worker_id='worker', lane=None):
+    """Lease and run the next due job (of `lane`, or any). Returns False when there was nothing to do."""
+    _load_handlers()
+    db = get_db()
+    doc = _lease(db, None, worker_id, lane)
+    if not doc:
+        return False
+    run_job(db, doc)
+    return True
+
+
+def run_worker(stop_event=None, poll_interval=None, lane=DEFAULT_LANE):
+    """Process one lane's jobs until `stop_event` is set, waiting when it is empty."""
+    poll_interval = Config.JOBS_POLL_SECONDS if poll_interval is None else poll_interval
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    wake = _wake_event(lane)
+    print(f"[Jobs] Worker {worker_id} ({lane}) started")
+    while not (stop_event and stop_event.is_set()):
+        # Cleared before looking, so a job queued meanwhile still wakes us
+        wake.clear()
+        try:
+            if work_once(worker_id, lane):
+                continue
+        except Exception as e:
+            print(f"[Jobs] Worker error: {e}")
+        wake.wait(poll_interval)
+
+
+def run_lanes(stop_event=None):
+    """Run every lane: the others on daemon threads, the default one here (manage.py worker)."""
+    for lane in _lanes():
+        if lane != DEFAULT_LANE:
+            threading.Thread(target=run_worker, args=(stop_event,), kwargs={'lane': lane},
+                             name=f'job-worker-{lane}', daemon=True).start()
+    run_worker(stop_event)
+
+
+def ensure_worker():
+    """Start this process's worker threads if they aren't running (threads don't survive fork)."""
+    global _worker_pid
+    if Config.JOBS_WORKER != 'thread':
+        return
+    # Runs before every request: the common case must not take the lock
+    threads = list(_worker_threads.values())
+    if _worker_pid == os.getpid() and threads and all(t.is_alive() for t in threads):
+        return
+    with _worker_lock:
+        if _worker_pid != os.getpid():
+            _worker_pid = os.getpid()
+            _worker_threads.clear()
+        for lane in _lanes():
+            thread = _worker_threads.get(lane)
+            if thread and thread.is_alive():
+                continue
+            thread = threading.Thread(target=run_worker, kwargs={'lane': lane},
+                                      name=f'job-worker-{lane}', daemon=True)
+            _worker_threads[lane] = thread
+            thread.start()
+
+
+def get_job(job_id):
+    try:
+        return get_db().jobs.find_one({'_id': ObjectId(job_id)})
+    except Exception:
+        return None
+
+
+def retry(job_id):
+    """Put a dead (or failed) job back on the queue with a fresh attempt budget."""
+    result = get_db().jobs.update_one(
+        {'_id': ObjectId(job_id), 'status': {'$in': ['dead', 'queued']}},
+        {'$set': {'status': 'queued', 'attempts': 0, 'run_at': datetime.datetime.utcnow()},
+         '$unset': {'dead_at': ''}}
+    )
+    return result.modified_count == 1
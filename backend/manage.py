@@ -0,0 +1,156 @@
+"""
+Maintenance commands for the Gavran Magic API.
+
+Usage (from the backend/ directory):
+    python manage.py <command> [options]
+"""
+import argparse
+from extensions import get_db
+
+COMMANDS = {}
+
+
+def command(name, *arguments):
+    """Register a sub-command; `arguments` are (flags, kwargs) pairs for argparse."""
+    def decorator(fn):
+        COMMANDS[name] = (fn, arguments)
+        return fn
+    return decorator
+
+
+@command('migrate-review-photos')
+def migrate_review_photos(args):
+    """Move inline base64 review photos into the blob store."""
+    import blob_store
+    db = get_db()
+    moved = failed = 0
+    cursor = db.reviews.find({'photo': {'$type': 'string', '$ne': ''}}, {'photo': 1})
+    for review in cursor.batch_size(50):
+        try:
+            refs = blob_store.put_image(blob_store.decode_data_url(review['photo']))
+        except blob_store.BlobError as e:
+            print(f"[Migrate] Review {review['_id']}: {e}")
+            failed += 1
+            continue
+        db.reviews.update_one(
+            {'_id': review['_id']},
+            {'$set': refs, '$unset': {'photo': ''}}
+        )
+        moved += 1
+    print(f"[Migrate] Moved {moved} review photos to the blob store ({failed} failed)")
+
+
+@command('ensure-indexes')
+def ensure_indexes_cmd(args):
+    """Create any missing indexes from the manifest in indexes.py."""
+    from indexes import ensure_indexes
+    created = ensure_indexes(get_db())
+    print(f"[DB] {len(created)} indexes created or updated")
+
+
+@command('index-report',
+         (['--execution-stats'], {'action': 'store_true',
+                                  'help': 'run the queries to report documents examined'}))
+def index_report_cmd(args):
+    """Show index usage and flag known query shapes that scan whole collections."""
+    from indexes import index_report
+    report = index_report(get_db(), 'executionStats' if args.execution_stats else 'queryPlanner')
+
+    for coll_name, stats in report['index_usage'].items():
+        print(f"\n{coll_name}")
+        if isinstance(stats, dict):
+            print(f"  error: {stats['error']}")
+            continue
+        for s in stats:
+            print(f"  {s['name']:<40} {s['ops']:>10} ops")
+
+    print("\nQuery shapes")
+    for q in report['queries']:
+        if 'error' in q:
+            print(f"  [ERROR]    {q['name']}: {q['error']}")
+            continue
+        flag = 'COLLSCAN' if q['collscan'] else ('SORT' if q['in_memory_sort'] else 'ok')
+        examined = f" ({q['docs_examined']} docs examined)" if 'docs_examined' in q else ''
+        print(f"  [{flag:<8}] {q['name']}: {' <- '.join(str(s) for s in q['stages'])}{examined}")
+
+    if report['collscans']:
+        print(f"\n{len(report['collscans'])} query shapes scan whole collections")
+    for m in report['mismatched_indexes']:
+        print(f"\n[MISMATCH] {m['collection']}.{m['index']}: {m['differences']}")
+
+
+@command('rebuild-sales-rollup')
+def rebuild_sales_rollup(args):
+    """Backfill/repair the daily_sales rollup from the orders collection."""
+    import sales_rollup
+    days = sales_rollup.rebuild(get_db())
+    print(f"[Rollup] Rebuilt daily_sales for {days} days")
+
+
+@command('rebuild-user-stats')
+def rebuild_user_stats(args):
+    """Backfill/repair order_count and total_spent on user documents."""
+    import user_stats
+    user_stats.rebuild(get_db())
+    print("[Users] Rebuilt per-user order stats")
+
+
+@command('rebuild-customer-counters')
+def rebuild_customer_counters(args):
+    """Backfill/repair the per-user and per-device order counters."""
+    import customer_counters
+    customer_counters.rebuild(get_db())
+    print("[Customers] Rebuilt customer_counters")
+
+
+@command('reconcile-promo-usage')
+def reconcile_promo_usage(args):
+    """Recompute offers.used_count from the orders collection."""
+    import promo_usage
+    n = promo_usage.reconcile(get_db())
+    print(f"[Offers] Reconciled used_count for {n} offers")
+
+
+@command('refresh-pincodes',
+         (['--range'], {'help': 'also sweep every pincode in START-END, e.g. 400000-445999'}),
+         (['--workers'], {'type': int, 'help': 'concurrent Shiprocket calls'}))
+def refresh_pincodes(args):
+    """Sweep Shiprocket serviceability into the local pincode index."""
+    import pincode_index
+    db = get_db()
+    pins = pincode_index.known_pincodes(db)
+    if args.range:
+        start, end = (int(x) for x in args.range.split('-'))
+        pins.update(range(start, end + 1))
+    print(f"[Pincodes] Checking {len(pins)} pincodes...")
+    indexed, failed = pincode_index.refresh(db, pins, args.workers)
+    print(f"[Pincodes] Index now holds {indexed} pincodes ({failed} checks failed and were skipped)")
+
+
+@command('worker',
+         (['--once'], {'action': 'store_true', 'help': 'run the jobs that are due now, then exit'}))
+def worker(args):
+    """Run the background job worker (use with JOBS_WORKER=off in the web processes)."""
+    import jobs
+    if args.once:
+        n = 0
+        while jobs.work_once('manage'):
+            n += 1
+        print(f"[Jobs] Ran {n} jobs")
+        return
+    jobs.run_lanes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gavran Magic maintenance commands')
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name, (fn, arguments) in COMMANDS.items():
+        cmd_parser = sub.add_parser(name, help=fn.__doc__)
+        for flags, kwargs in arguments:
+            cmd_parser.add_argument(*flags, **kwargs)
+    args = parser.parse_args()
+    COMMANDS[args.command][0](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+In-process metrics, exposed in Prometheus text format at /metrics.
+
+  http_request_duration_seconds   per route (Flask before/after_request hooks)
+  http_requests_total             per route and status
+  mongodb_command_duration_seconds per collection and command (pymongo CommandListener)
+  external_call_duration_seconds  Shiprocket / Razorpay / SMS calls (timed_external)
+
+Each recording is a dict update under a lock. Numbers are per process:
+with several gunicorn workers, each scrape sees the worker that answered
+it, so alert on rates/ratios rather than absolute counts.
+
+/metrics requires METRICS_TOKEN when it is set. Without a token it only
+answers scrapers on loopback or private addresses.
+"""
+import ipaddress
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import Response, g, request
+from pymongo import monitoring
+from config import Config
+
+# Upper bounds in seconds (Prometheus' default buckets plus a 30s one for timeouts)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, labels, seconds):
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += seconds
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {series[-1]}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {cumulative}')
+        return lines
+
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency by route',
+                            ('method', 'route'))
+REQUESTS = Counter('http_requests_total', 'Requests by route and status code',
+                   ('method', 'route', 'status'))
+MONGO_LATENCY = Histogram('mongodb_command_duration_seconds', 'MongoDB command latency',
+                          ('collection', 'command'))
+MONGO_FAILURES = Counter('mongodb_command_failures_total', 'MongoDB commands that failed',
+                         ('collection', 'command'))
+EXTERNAL_LATENCY = Histogram('external_call_duration_seconds', 'Third-party API call latency',
+                             ('service', 'operation'))
+EXTERNAL_FAILURES = Counter('external_call_failures_total', 'Third-party API calls that raised',
+                            ('service', 'operation'))
+
+
+# --- Flask ---
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+
+
+def _after_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        # The route pattern (/api/orders/<order_id>), never the raw path
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe((request.method, route), time.perf_counter() - started)
+        REQUESTS.inc((request.method, route, str(response.status_code)))
+    return response
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _is_private(address):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return ip.is_loopback or ip.is_private
+
+
+def _scrape_allowed():
+    if Config.METRICS_TOKEN:
+        return request.headers.get('Authorization') == f'Bearer {Config.METRICS_TOKEN}'
+    # rate_limit imports extensions, which imports this module
+    from rate_limit import client_ip
+    # Both the peer and the forwarded client must be internal: behind a proxy
+    # the peer is always private, and a direct caller can forge X-Forwarded-For
+    return _is_private(request.remote_addr or '') and _is_private(client_ip())
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        if not _scrape_allowed():
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+# --- MongoDB ---
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every command the driver sends; pass to MongoClient(event_listeners=[...])."""
+
+    def __init__(self):
+        self._collections = {}  # (connection, request_id) -> collection
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ''  # ping, listIndexes on the db, getMore (cursor id), ...
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection', '')
+        self._collections[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), '')
+        return (collection, event.command_name), event.duration_micros / 1e6
+
+    def succeeded(self, event):
+        labels, seconds = self._finish(event)
+        MONGO_LATENCY.observe(labels, seconds)
+
+    def failed(self, event):
+        labels, seconds = self._finish(event)
+        MONGO_LATENCY.observe(labels, seconds)
+        MONGO_FAILURES.inc(labels)
+
+
+def mongo_listeners():
+    return [MongoCommandListener()] if Config.METRICS_ENABLED else []
+
+
+# --- Outbound calls ---
+
+@contextmanager
+def timed_external(service, operation):
+    """`with timed_external('shiprocket', '/courier/serviceability'): ...`"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_FAILURES.inc((service, operation))
+        raise
+    finally:
+        EXTERNAL_LATENCY.observe((service, operation), time.perf_counter() - started)
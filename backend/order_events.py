@@ -0,0 +1,49 @@
+"""
+Keep the collections derived from orders in step with order writes.
+Routes call these after the order itself has been written; a failure here
+is logged and repaired by the matching `manage.py` rebuild command rather
+than failing the customer's request.
+"""
+import customer_counters
+import promo_usage
+import sales_rollup
+import user_stats
+from analytics import EXCLUDED_STATUSES
+
+
+def _counted(status):
+    return status not in EXCLUDED_STATUSES
+
+
+def _safely(label, fn, *args):
+    try:
+        fn(*args)
+    except Exception as e:
+        print(f"[OrderEvents] {label} failed: {e}")
+
+
+def order_created(db, order):
+    if _counted(order.get('order_status')):
+        _safely('sales rollup', sales_rollup.apply_order, db, order, 1)
+    _safely('user stats', user_stats.order_created, db, order)
+    _safely('customer counters', customer_counters.order_created, db, order)
+
+
+def order_status_changed(db, order, old_status, new_status):
+    """`order` is the document as it was before the status change."""
+    was, now = _counted(old_status), _counted(new_status)
+    if was and not now:
+        _safely('sales rollup', sales_rollup.apply_order, db, order, -1)
+    elif now and not was:
+        _safely('sales rollup', sales_rollup.apply_order, db, order, 1)
+    _safely('user stats', user_stats.order_status_changed, db, order, old_status, new_status)
+    _safely('customer counters', customer_counters.order_status_changed, db, order, old_status, new_status)
+    _safely('promo usage', promo_usage.order_status_changed, db, order, old_status, new_status)
+
+
+def order_deleted(db, order):
+    if _counted(order.get('order_status')):
+        _safely('sales rollup', sales_rollup.apply_order, db, order, -1)
+    _safely('user stats', user_stats.order_deleted, db, order)
+    _safely('customer counters', customer_counters.order_deleted, db, order)
+    _safely('promo usage', promo_usage.order_deleted, db, order)
@@ -0,0 +1,143 @@
+import base64
+import datetime
+import json
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import request, jsonify
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {'$dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and '$dt' in value:
+        return datetime.datetime.fromisoformat(value['$dt'])
+    return value
+
+
+def encode_cursor(doc, sort_field):
+    """Opaque cursor pointing just past `doc` in (sort_field, _id) order."""
+    payload = {'v': _encode_value(doc.get(sort_field)) if sort_field != '_id' else None,
+               'id': str(doc['_id'])}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return _decode_value(payload.get('v')), ObjectId(payload['id'])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise PaginationError('Invalid cursor')
+
+
+def parse_page_args(default_fields=None):
+    """
+    Read `limit`, `after` and `fields` from the query string.
+    `limit` is None when the caller did not ask for a page, in which case
+    list endpoints keep returning the whole collection as a plain array.
+    """
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    fields = request.args.get('fields')
+
+    if limit is not None or after:
+        try:
+            limit = int(limit) if limit is not None else DEFAULT_LIMIT
+        except ValueError:
+            raise PaginationError('limit must be an integer')
+        limit = max(1, min(limit, MAX_LIMIT))
+
+    projection = None
+    if fields:
+        projection = {f.strip(): 1 for f in fields.split(',') if f.strip()}
+    elif default_fields:
+        projection = {f: 1 for f in default_fields}
+
+    return {
+        'limit': limit,
+        'after': decode_cursor(after) if after else None,
+        'projection': projection
+    }
+
+
+def keyset_filter(sort_field, after):
+    """Filter for documents strictly after the cursor in descending (sort_field, _id) order."""
+    value, last_id = after
+    if sort_field == '_id':
+        return {'_id': {'$lt': last_id}}
+    if value is None:
+        # Missing/null values sort last when descending
+        return {sort_field: None, '_id': {'$lt': last_id}}
+    return {'$or': [
+        {sort_field: {'$lt': value}},
+        {sort_field: value, '_id': {'$lt': last_id}},
+        {sort_field: None}
+    ]}
+
+
+def fetch_page(collection, query, sort_field, page):
+    """
+    Run `query` against `collection` sorted newest-first on (sort_field, _id).
+    Returns (docs, next_cursor); next_cursor is None on the last page.
+    """
+    if page['after']:
+        query = {'$and': [query, keyset_filter(sort_field, page['after'])]}
+
+    projection = page['projection']
+    if projection and all(projection.values()):
+        # The cursor is built from these, so they are always returned
+        projection = dict(projection, **{sort_field: 1})
+
+    sort = [('_id', -1)] if sort_field == '_id' else [(sort_field, -1), ('_id', -1)]
+    cursor = collection.find(query, projection).sort(sort)
+
+    limit = page['limit']
+    if limit is None:
+        return list(cursor), None
+
+    docs = list(cursor.limit(limit + 1))
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+    return docs, next_cursor
+
+
+def paginate_by_id(items, page):
+    """fetch_page() for an already materialized list (e.g. a cache), newest _id first."""
+    items = sorted(items, key=lambda item: str(item['_id']), reverse=True)
+    if page['after']:
+        # ObjectId hex strings sort the same way as the ids themselves
+        last_id = str(page['after'][1])
+        items = [item for item in items if str(item['_id']) < last_id]
+
+    limit = page['limit']
+    next_cursor = None
+    if limit is not None:
+        if len(items) > limit:
+            next_cursor = encode_cursor(items[limit - 1], '_id')
+        items = items[:limit]
+
+    projection = page['projection']
+    if projection:
+        items = [{k: v for k, v in item.items() if k == '_id' or k in projection} for item in items]
+    return items, next_cursor
+
+
+def page_response(docs, next_cursor, page):
+    """Plain array for unpaginated calls, an envelope with the next cursor otherwise."""
+    if page['limit'] is None:
+        return jsonify(docs), 200
+    return jsonify({'items': docs, 'next_cursor': next_cursor}), 200
@@ -0,0 +1,124 @@
+"""
+Local index of delivery pincodes, swept offline from Shiprocket serviceability
+(`python manage.py refresh-pincodes`), so checkout can reject unserviceable
+pincodes and quote the default 0.5 kg prepaid rate without a remote call.
+
+Stored as one document of parallel arrays sorted by pincode; each worker keeps
+it in memory as an int array and looks pincodes up with bisect.
+"""
+import datetime
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from cache import VersionedCache
+from config import Config
+import shiprocket
+
+# The parcel the sweep asks about; quotes for anything else still go remote
+SWEEP_WEIGHT = 0.5
+SWEEP_COD = 0
+FIELDS = ('couriers', 'courier_name', 'etd', 'rate')
+
+
+def _load(db):
+    doc = db.pincode_index.find_one({'_id': 'current'}) or {}
+    index = {'pins': array('i', doc.get('pins', [])), 'refreshed_at': doc.get('refreshed_at')}
+    for field in FIELDS:
+        index[field] = doc.get(field, [])
+    return index
+
+
+# The index changes once a sweep finishes, so workers don't need to check often
+_index = VersionedCache('pincodes', _load, check_interval=60)
+
+
+def lookup(pincode):
+    """
+    {'serviceable', 'couriers', 'courier_name', 'etd', 'rate'} for a swept
+    pincode, or None when the index knows nothing about it.
+    """
+    try:
+        pin = int(pincode)
+    except (TypeError, ValueError):
+        return None
+    index = _index.get()
+    pins = index['pins']
+    i = bisect_left(pins, pin)
+    if i == len(pins) or pins[i] != pin:
+        return None
+    entry = {field: index[field][i] for field in FIELDS}
+    entry['serviceable'] = entry['couriers'] > 0
+    return entry
+
+
+def rate_quote(entry, weight, cod):
+    """The shipping quote for a swept pincode, if the parcel matches what was swept."""
+    cod = 1 if cod and str(cod) not in ('0', 'false', 'False') else 0
+    if not entry or not entry['serviceable'] or entry['rate'] is None:
+        return None
+    if shiprocket.weight_bucket(weight) != SWEEP_WEIGHT or cod != SWEEP_COD:
+        return None
+    return shiprocket.rate_response(entry['courier_name'], entry['etd'], entry['rate'])
+
+
+def stats():
+    index = _index.get()
+    return {
+        'pincodes': len(index['pins']),
+        'serviceable': sum(1 for c in index['couriers'] if c > 0),
+        'refreshed_at': index['refreshed_at'],
+    }
+
+
+def _sweep_one(api, pin):
+    response = api.fetch_serviceability(Config.PICKUP_PINCODE, str(pin), SWEEP_WEIGHT, SWEEP_COD)
+    if shiprocket._is_quote(response):
+        couriers = response['data']['available_courier_companies']
+        best = shiprocket.best_courier(response)
+        if best:
+            return pin, {'couriers': len(couriers), 'courier_name': best.get('courier_name'),
+                         'etd': best.get('etd'), 'rate': float(best.get('rate', 0))}
+        return pin, {'couriers': 0, 'courier_name': None, 'etd': None, 'rate': None}
+    if isinstance(response, dict) and 404 in (response.get('http_status'), response.get('status')):
+        # Shiprocket's answer (HTTP 404, or 404 in the body) for a pincode no courier delivers to
+        return pin, {'couriers': 0, 'courier_name': None, 'etd': None, 'rate': None}
+    return pin, None  # error; keep whatever the index had
+
+
+def refresh(db, pincodes, workers=None):
+    """
+    Ask Shiprocket about every pincode in `pincodes` and store the new index.
+    Pincodes already in the index but not swept this time are kept.
+    Returns (pincodes indexed, pincodes whose check failed).
+    """
+    current = _load(db)
+    entries = {pin: {field: current[field][i] for field in FIELDS}
+               for i, pin in enumerate(current['pins'])}
+
+    api = shiprocket.get_api()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers or Config.SHIPROCKET_BULK_WORKERS) as pool:
+        for pin, entry in pool.map(lambda p: _sweep_one(api, p), sorted(set(pincodes))):
+            if entry is None:
+                failed += 1
+            else:
+                entries[pin] = entry
+
+    pins = sorted(entries)
+    doc = {'pins': pins, 'refreshed_at': datetime.datetime.utcnow()}
+    for field in FIELDS:
+        doc[field] = [entries[p][field] for p in pins]
+    db.pincode_index.replace_one({'_id': 'current'}, doc, upsert=True)
+    _index.invalidate()
+    return len(pins), failed
+
+
+def known_pincodes(db):
+    """Pincodes customers have ordered to, plus the ones already indexed."""
+    pins = set(_load(db)['pins'])
+    for value in db.orders.distinct('pincode'):
+        try:
+            pins.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return pins
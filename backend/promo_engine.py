@@ -0,0 +1,176 @@
+"""
+Promo codes, compiled once per cache load instead of per request.
+
+Offers are stored as the admin dashboard sends them (date strings, limit as
+string or number); _compile() turns each one into a record with parsed
+datetimes and an int limit, indexed by uppercase code. Both the offers list
+and checkout validate against these records, and the cache is reloaded
+when offers are written. A checkout only updates used_count on this
+worker's copy of its record, so another worker's copy can be behind:
+codes that look used up are re-read before being reported as sold out,
+and checkout leaves the limit to the atomic promo_usage.reserve().
+"""
+from datetime import datetime
+from cache import VersionedCache
+from extensions import get_db
+import promo_usage
+
+
+def parse_date(value, end_of_day=False):
+    """Offer dates are ISO datetimes or plain 'YYYY-MM-DD' (end dates then mean end of that day)."""
+    if not value:
+        return None
+    if 'T' in value:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    date = datetime.strptime(value, '%Y-%m-%d')
+    if end_of_day:
+        date = date.replace(hour=23, minute=59, second=59)
+    return date
+
+
+def _parse_limit(value):
+    try:
+        return int(value) if value is not None and str(value).strip() != '' else None
+    except (ValueError, TypeError):
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _compile(db, offer):
+    record = {
+        '_id': offer['_id'],
+        'code': offer.get('code'),
+        'active': offer.get('status') == 'active',
+        'start': None,
+        'end': None,
+        'usage_limit': _parse_limit(offer.get('usage_limit')),
+        'used_count': promo_usage.used_count(db, offer),
+        'discount_type': offer.get('discount_type', 'percentage'),
+        'discount_value': _float(offer.get('discount_value')),
+        'offer': offer,
+    }
+    try:
+        record['start'] = parse_date(offer.get('start_date'))
+        record['end'] = parse_date(offer.get('end_date'), end_of_day=True)
+    except (ValueError, TypeError, AttributeError) as e:
+        # Same fallback as before: an unreadable date doesn't block the code
+        print(f"[Offers] Bad date on offer {offer.get('code')}: {e}")
+    return record
+
+
+def _load(db):
+    records = [_compile(db, o) for o in db.offers.find().sort('created_at', -1)]
+    by_code = {}
+    for r in records:
+        if r['code']:
+            by_code.setdefault(r['code'].strip().upper(), r)
+    return {'records': records, 'by_code': by_code}
+
+
+_offers = VersionedCache('offers', _load)
+
+
+def invalidate():
+    """Call after writing offers."""
+    _offers.invalidate()
+
+
+def set_used_count(code, used_count):
+    """Update the cached used_count of one code in place (no reload)."""
+    record = find(code)
+    if record is not None:
+        record['used_count'] = used_count
+        record['offer']['used_count'] = used_count
+
+
+def _used_up(record):
+    return record['usage_limit'] is not None and record['used_count'] >= record['usage_limit']
+
+
+def _refresh_used_up(records):
+    """Re-read used_count for records that look used up (a cancel on another worker may have freed a use)."""
+    stale = {r['_id']: r for r in records if _used_up(r)}
+    if not stale:
+        return
+    for doc in get_db().offers.find({'_id': {'$in': list(stale)}}, {'used_count': 1}):
+        record = stale[doc['_id']]
+        record['used_count'] = doc.get('used_count', record['used_count'])
+        record['offer']['used_count'] = record['used_count']
+
+
+def check(record, now=None, usage=True):
+    """
+    (valid, reason, message) for a compiled offer: `reason` is the short text
+    the offers list shows, `message` what checkout tells the customer.
+    usage=False skips the (cached) usage limit, for callers that reserve a use atomically.
+    """
+    now = now or datetime.utcnow()
+    if not record['active']:
+        return False, "Campaign is inactive", 'This promotional campaign is no longer active.'
+    if record['start'] and now < record['start']:
+        start = record['start'].strftime('%d %b %Y')
+        return False, f"Starts on {start}", f'This code will be valid from {start}.'
+    if record['end'] and now > record['end']:
+        return False, "Expired", 'This promotional code has expired.'
+    if usage and _used_up(record):
+        return False, "Usage limit reached (Sold Out)", 'This promotional code is sold out (usage limit reached).'
+    return True, "", ""
+
+
+def discount_for(record, subtotal):
+    """Discount in rupees on `subtotal`, the same way the cart computes it."""
+    subtotal = _float(subtotal)
+    if record['discount_value'] <= 0:
+        return 0.0
+    if record['discount_type'] == 'percentage':
+        return round(subtotal * record['discount_value'] / 100, 2)
+    return round(min(record['discount_value'], subtotal), 2)
+
+
+def find(code):
+    """The compiled offer for a code (any case), or None."""
+    if not code:
+        return None
+    return _offers.get()['by_code'].get(str(code).strip().upper())
+
+
+def validate(code, subtotal=None, now=None):
+    """
+    Check a code without touching Mongo. Returns
+    {'valid', 'code', 'message'} plus the discount when the code is valid.
+    """
+    record = find(code)
+    if record is None:
+        return {'valid': False, 'code': code, 'message': 'Invalid promotional code.'}
+    _refresh_used_up([record])
+    valid, _, message = check(record, now)
+    result = {'valid': valid, 'code': record['code'], 'message': message}
+    if valid:
+        result['discount_type'] = record['discount_type']
+        result['discount_value'] = record['discount_value']
+        if subtotal is not None:
+            discount = discount_for(record, subtotal)
+            result['discount'] = discount
+            result['total'] = round(max(0.0, _float(subtotal) - discount), 2)
+    return result
+
+
+def list_offers(now=None):
+    """Every offer (newest first) with is_currently_valid / validity_reason, for the offers API."""
+    offers = []
+    records = _offers.get()['records']
+    _refresh_used_up(records)
+    for record in records:
+        valid, reason, _ = check(record, now)
+        offer = dict(record['offer'])
+        offer['_id'] = str(offer['_id'])
+        offer['is_currently_valid'] = valid
+        offer['validity_reason'] = reason
+        offers.append(offer)
+    return offers
@@ -0,0 +1,111 @@
+from pymongo import ReturnDocument, UpdateOne
+from analytics import EXCLUDED_STATUSES
+
+# offers.used_count = number of orders using the code that are not Cancelled/Declined.
+# It is initialised from orders the first time an offer is used (or by
+# `manage.py reconcile-promo-usage`) and then kept with $inc.
+
+
+def _changed(offer):
+    # The promo engine caches used_count; imported here to avoid an import cycle.
+    # Only this worker's copy of the one record is updated: reloading every
+    # offer on each checkout would defeat the cache, and reserve() is what
+    # actually enforces the limit.
+    import promo_engine
+    if offer:
+        promo_engine.set_used_count(offer.get('code'), offer.get('used_count', 0))
+
+
+def _inc(db, query, amount):
+    return db.offers.find_one_and_update(
+        query, {'$inc': {'used_count': amount}},
+        projection={'code': 1, 'used_count': 1},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _count_from_orders(db, code):
+    return db.orders.count_documents({
+        'promo_code': code,
+        'order_status': {'$nin': EXCLUDED_STATUSES}
+    })
+
+
+def used_count(db, offer):
+    """Return the offer's used_count, initialising it from orders if it was never set."""
+    if 'used_count' in offer:
+        return offer['used_count']
+    count = _count_from_orders(db, offer.get('code'))
+    result = db.offers.find_one_and_update(
+        {'_id': offer['_id'], 'used_count': {'$exists': False}},
+        {'$set': {'used_count': count}},
+        projection={'used_count': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if result is None:
+        # Someone else initialised it first
+        result = db.offers.find_one({'_id': offer['_id']}, {'used_count': 1}) or {}
+    offer['used_count'] = result.get('used_count', count)
+    return offer['used_count']
+
+
+def reserve(db, offer, usage_limit=None):
+    """
+    Count one more use of `offer`. With a limit, the increment only happens
+    while used_count < limit, so concurrent checkouts can't oversell a code.
+    Returns False when the code is sold out.
+    """
+    used_count(db, offer)
+    query = {'_id': offer['_id']}
+    if usage_limit is not None:
+        query['used_count'] = {'$lt': usage_limit}
+    updated = _inc(db, query, 1)
+    if updated is None:
+        return False
+    _changed(updated)
+    return True
+
+
+def release(db, code):
+    """Give back one use of `code` (order failed, cancelled, declined or deleted)."""
+    if code:
+        _changed(_inc(db, {'code': code, 'used_count': {'$gt': 0}}, -1))
+
+
+def restore(db, code):
+    """A cancelled/declined order was reinstated; count its use again."""
+    if code:
+        _changed(_inc(db, {'code': code, 'used_count': {'$exists': True}}, 1))
+
+
+def order_status_changed(db, order, old_status, new_status):
+    was, now = old_status not in EXCLUDED_STATUSES, new_status not in EXCLUDED_STATUSES
+    if was and not now:
+        release(db, order.get('promo_code'))
+    elif now and not was:
+        restore(db, order.get('promo_code'))
+
+
+def order_deleted(db, order):
+    if order.get('order_status') not in EXCLUDED_STATUSES:
+        release(db, order.get('promo_code'))
+
+
+def reconcile(db):
+    """Recompute used_count for every offer from the orders collection."""
+    counts = {
+        row['_id']: row['n'] for row in db.orders.aggregate([
+            {'$match': {'promo_code': {'$nin': [None, '']}, 'order_status': {'$nin': EXCLUDED_STATUSES}}},
+            {'$group': {'_id': '$promo_code', 'n': {'$sum': 1}}}
+        ])
+    }
+    ops = [
+        UpdateOne({'_id': offer['_id']}, {'$set': {'used_count': counts.get(offer.get('code'), 0)}})
+        for offer in db.offers.find({}, {'code': 1})
+    ]
+    if ops:
+        db.offers.bulk_write(ops, ordered=False)
+        # Every count may have moved, so all workers reload
+        import promo_engine
+        promo_engine.invalidate()
+    return len(ops)
@@ -0,0 +1,132 @@
+"""
+Sliding-window rate limits for the public endpoints that cost us money
+(SMS, Shiprocket, Razorpay) or guard logins.
+
+    @rate_limit('send-otp:phone', 20, 3600, key=phone_key)
+    @rate_limit('send-otp:ip', 60, 3600)
+
+Backends (Config.RATE_LIMIT_BACKEND, or per limit with backend=):
+  memory - exact sliding log per worker process; limits are per process
+  mongo  - shared by every worker: one upsert per hit into `rate_limits`,
+           approximating the sliding window from the current and previous
+           fixed windows
+The OTP limits use Config.RATE_LIMIT_OTP_BACKEND ('mongo' by default), so
+the per-phone limit holds across every gunicorn worker.
+"""
+import datetime
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import wraps
+from flask import request, jsonify
+from pymongo import ReturnDocument
+from config import Config
+from extensions import get_db
+
+
+def client_ip():
+    """
+    The caller's address. Each proxy in front of us appends the address it
+    saw to X-Forwarded-For, so only the last TRUSTED_PROXY_HOPS entries are
+    trustworthy; anything left of them was sent by the client.
+    """
+    forwarded = [p.strip() for p in request.headers.get('X-Forwarded-For', '').split(',') if p.strip()]
+    hops = Config.TRUSTED_PROXY_HOPS
+    if hops and len(forwarded) >= hops:
+        return forwarded[-hops]
+    return request.remote_addr or 'unknown'
+
+
+def phone_key():
+    data = request.get_json(silent=True) or {}
+    phone = str(data.get('phone', '')).strip()
+    return phone or None
+
+
+class MemoryBackend:
+    def __init__(self, maxkeys=100000):
+        self.maxkeys = maxkeys
+        self._hits = OrderedDict()  # key -> deque of hit times
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        """Record a hit; returns 0 if allowed, else seconds until the next one would be."""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque()
+            self._hits.move_to_end(key)
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) >= limit:
+                return hits[0] + window - now
+            hits.append(now)
+            while len(self._hits) > self.maxkeys:
+                self._hits.popitem(last=False)
+            return 0
+
+
+class MongoBackend:
+    def hit(self, key, limit, window):
+        now = time.time()
+        win = int(now // window) * window
+        same = {'$eq': ['$win', win]}
+        # One round trip: roll the window forward if needed and count this hit
+        doc = get_db().rate_limits.find_one_and_update(
+            {'_id': key},
+            [{'$set': {
+                'prev': {'$cond': [same, '$prev',
+                                   {'$cond': [{'$eq': ['$win', win - window]}, '$cur', 0]}]},
+                'cur': {'$cond': [same, {'$add': ['$cur', 1]}, 1]},
+                'win': win,
+                'expires_at': datetime.datetime.utcfromtimestamp(win + 2 * window)
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        elapsed = now - win
+        estimate = doc['prev'] * (1 - elapsed / window) + doc['cur']
+        if estimate <= limit:
+            return 0
+        return window - elapsed
+
+
+_backends = {}
+
+
+def get_backend(kind=None):
+    """The shared backend of a kind ('memory' or 'mongo'; default Config.RATE_LIMIT_BACKEND)."""
+    kind = kind or Config.RATE_LIMIT_BACKEND
+    if kind not in _backends:
+        _backends[kind] = MongoBackend() if kind == 'mongo' else MemoryBackend()
+    return _backends[kind]
+
+
+def rate_limit(name, limit, window, key=client_ip, message='Too many requests. Please wait before trying again.',
+               backend=None):
+    """
+    Allow `limit` calls per `window` seconds for each value of `key()`
+    (the client IP by default); requests where key() is None aren't limited.
+    `backend` overrides Config.RATE_LIMIT_BACKEND for this limit.
+    Over the limit the view isn't called and a 429 with Retry-After is returned.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if Config.RATE_LIMIT_ENABLED:
+                value = key()
+                if value is not None:
+                    try:
+                        retry_after = get_backend(backend).hit(f"{name}:{value}", limit, window)
+                    except Exception as e:
+                        # Never lock customers out because the limiter's store is down
+                        print(f"[RateLimit] {name} check failed: {e}")
+                        retry_after = 0
+                    if retry_after > 0:
+                        response = jsonify({'message': message})
+                        response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+                        return response, 429
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
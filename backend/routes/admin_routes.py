@@ -0,0 +1,93 @@
+from flask import Blueprint, jsonify, request
+from extensions import get_db
+from auth import require_admin
+from pagination import parse_page_args, fetch_page
+import jobs
+from indexes import ensure_indexes, index_report
+from shiprocket import quote_cache
+import pincode_index
+import slow_queries
+
+admin_bp = Blueprint('admin_bp', __name__)
+
+# Everything under /api/admin is admin-only
+admin_bp.before_request(require_admin)
+
+# ADMIN: Index usage and explain() of the hot query shapes
+@admin_bp.route('/indexes', methods=['GET'])
+def get_index_report():
+    verbosity = request.args.get('verbosity', 'queryPlanner')
+    if verbosity not in ('queryPlanner', 'executionStats'):
+        return jsonify({'message': 'verbosity must be queryPlanner or executionStats'}), 400
+    return jsonify(index_report(get_db(), verbosity)), 200
+
+# ADMIN: Create any missing manifest indexes now
+@admin_bp.route('/indexes', methods=['POST'])
+def create_missing_indexes():
+    created = ensure_indexes(get_db())
+    return jsonify({'created': created}), 200
+
+# ADMIN: Hit/miss counters of the in-process caches
+@admin_bp.route('/caches', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        'shiprocket_quotes': quote_cache.stats(),
+        'pincode_index': pincode_index.stats()
+    }), 200
+
+# ADMIN: Operations the slow query log caught (SLOW_QUERY_MS), newest first
+# /api/admin/slow-queries?collection=orders&min_ms=500&limit=50
+@admin_bp.route('/slow-queries', methods=['GET'])
+def get_slow_queries():
+    try:
+        min_ms = float(request.args.get('min_ms', 0))
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError:
+        return jsonify({'message': 'min_ms and limit must be numbers'}), 400
+    return jsonify({
+        'items': slow_queries.read(request.args.get('collection'), min_ms, limit),
+        'stats': slow_queries.stats()
+    }), 200
+
+JOB_STATUSES = ('queued', 'leased', 'done', 'dead')
+
+def _job_json(doc):
+    doc['_id'] = str(doc['_id'])
+    return jobs.redact(doc)
+
+# ADMIN: Background jobs, newest first (?status=dead for the dead-letter list)
+@admin_bp.route('/jobs', methods=['GET'])
+def get_jobs():
+    status = request.args.get('status')
+    if status and status not in JOB_STATUSES:
+        return jsonify({'message': f"status must be one of {', '.join(JOB_STATUSES)}"}), 400
+    page = parse_page_args()
+    page['limit'] = page['limit'] or 100
+    query = {'status': status} if status else {}
+    docs, next_cursor = fetch_page(get_db().jobs, query, 'created_at', page)
+    counts = {row['_id']: row['n'] for row in get_db().jobs.aggregate([
+        {'$group': {'_id': '$status', 'n': {'$sum': 1}}}
+    ])}
+    return jsonify({
+        'items': [_job_json(d) for d in docs],
+        'next_cursor': next_cursor,
+        'counts': counts
+    }), 200
+
+@admin_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    doc = jobs.get_job(job_id)
+    if not doc:
+        return jsonify({'message': 'Job not found'}), 404
+    return jsonify(_job_json(doc)), 200
+
+# ADMIN: Re-queue a dead job with a fresh attempt budget
+@admin_bp.route('/jobs/<job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    doc = jobs.get_job(job_id)
+    if not doc:
+        return jsonify({'message': 'Job not found'}), 404
+    if not jobs.retry(job_id):
+        return jsonify({'message': f"Job is {doc['status']}, only dead or queued jobs can be retried"}), 400
+    jobs.ensure_worker()
+    return jsonify({'message': 'Job re-queued'}), 200
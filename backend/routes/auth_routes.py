@@ -2,109 +2,25 @@ import random
 import datetime
 import requests
 import os
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify
 from extensions import get_db
 from config import Config
+from pagination import parse_page_args, fetch_page, page_response
+import jobs
+from auth import admin_required, admin_tokens_allowed, forget_user, login_required
+from rate_limit import rate_limit, phone_key
+from metrics import timed_external
+import user_stats
 import jwt
 
 auth_bp = Blueprint('auth_bp', __name__)
 
 
-# ============================================================
-# SMS SENDER — Fast2SMS (FREE) or Dev Mode (prints to console)
-# Sign up FREE at: https://www.fast2sms.com/
-# Get your API key from Dashboard → Dev API
-# Paste it in backend/.env as: FAST2SMS_API_KEY=your_key_here
-# ============================================================
-
-def send_otp_sms(phone, otp):
-    """
-    Send OTP SMS via real providers (Fast2SMS or 2Factor.in).
-    """
-    db = get_db()
-    
-    # 1. Try Fast2SMS (High Priority - Dedicated OTP Route)
-    fast2sms_key = os.getenv('FAST2SMS_API_KEY', '')
-    if fast2sms_key and 'your_' not in fast2sms_key:
-        url = "https://www.fast2sms.com/dev/bulkV2"
-        headers = {"authorization": fast2sms_key}
-        payload = {
-            "route": "otp",
-            "variables_values": otp,
-            "numbers": phone,
-        }
-        try:
-            # Fast2SMS OTP route is reliable and doesn't trigger calls
-            resp = requests.post(url, headers=headers, data=payload, timeout=10)
-            result = resp.json()
-            if result.get("return"):
-                print(f"✅ Fast2SMS: OTP SMS sent to +91{phone}")
-                return True
-            else:
-                print(f"❌ Fast2SMS Failure: {result}")
-        except Exception as e:
-            print(f"❌ Fast2SMS Connection Error: {e}")
-
-    # 2. Try 2Factor.in (Fallback)
-    tf_key = os.getenv('TWOFACTOR_API_KEY', '')
-    if tf_key and 'your_' not in tf_key:
-        # Using the standard SMS route
-        url = f"https://2factor.in/API/V1/{tf_key}/SMS/{phone}/AUTOGEN"
-        try:
-            resp = requests.get(url, timeout=10)
-            result = resp.json()
-            if result.get('Status') == 'Success':
-                print(f"✅ 2Factor: OTP sent to +91{phone}")
-                # Store session for verification
-                db.otps.update_one(
-                    {'phone': phone}, 
-                    {'$set': {'twofactor_session': result.get('Details', '')}},
-                    upsert=False
-                )
-                return True
-            else:
-                print(f"❌ 2Factor Failure: {result}")
-        except Exception as e:
-            print(f"❌ 2Factor Connection Error: {e}")
-
-    # 3. Dev Fallback (Only if both fail or keys are missing)
-    print(f"\n{'!'*45}")
-    print(f"  [CRITICAL: SMS NOT SENT - CHECK API BALANCES]")
-    print(f"  Phone : +91 {phone}")
-    print(f"  OTP   : {otp}")
-    print(f"{'!'*45}\n")
-    return True
-
-
-def send_order_confirmation_sms(phone, order_short_id, total_amount):
-    """Send order confirmation SMS to customer."""
-    api_key = os.getenv('FAST2SMS_API_KEY', '')
-
-    if not api_key or 'your_' in api_key:
-        print(f"[DEV MODE] Order Confirmed → +91{phone} | #{order_short_id} | ₹{total_amount}")
-        return True
-
-    url = "https://www.fast2sms.com/dev/bulkV2"
-    headers = {"authorization": api_key}
-    message = f"Gavran Magic: Order #{order_short_id} confirmed! Amount Rs.{total_amount}. We will deliver soon. Thank you!"
-    params = {
-        "route": "q",
-        "message": message,
-        "flash": 0,
-        "numbers": phone,
-    }
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        result = response.json()
-        if result.get("return"):
-            print(f"✅ Order SMS sent to +91{phone}")
-        return True
-    except Exception as e:
-        print(f"Order SMS Error: {e}")
-        return True  # Don't fail the order if SMS fails
-
-
 @auth_bp.route('/send-otp', methods=['POST'])
+@rate_limit('send-otp:phone', 20, 3600, key=phone_key, backend=Config.RATE_LIMIT_OTP_BACKEND,
+            message='Too many OTP requests. Please wait before trying again.')
+@rate_limit('send-otp:ip', 60, 3600, backend=Config.RATE_LIMIT_OTP_BACKEND,
+            message='Too many OTP requests. Please wait before trying again.')
 def send_otp():
     try:
         data = request.json
@@ -116,15 +32,6 @@ def send_otp():
 
         db = get_db()
 
-        # Rate limiting: max 5 OTP requests per hour per phone
-        one_hour_ago = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
-        recent_count = db.otp_logs.count_documents({
-            'phone': phone,
-            'created_at': {'$gte': one_hour_ago}
-        })
-        if recent_count >= 20:
-            return jsonify({'message': 'Too many OTP requests. Please wait before trying again.'}), 429
-
         # Generate 6-digit OTP
         otp = str(random.randint(100000, 999999))
         expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
@@ -136,16 +43,11 @@ def send_otp():
             upsert=True
         )
 
-        # Log request for rate limiting
-        db.otp_logs.insert_one({'phone': phone, 'created_at': datetime.datetime.utcnow()})
-
-        # Send SMS
-        success = send_otp_sms(phone, otp)
+        # Send SMS (delivered by the job worker, so the provider's latency isn't ours)
+        # The job reads the code from `otps`, so it isn't copied into `jobs`
+        jobs.enqueue('send_otp_sms', {'phone': phone})
 
-        if success:
-            return jsonify({'message': 'OTP sent successfully'}), 200
-        else:
-            return jsonify({'message': 'Failed to send OTP. Please try again.'}), 500
+        return jsonify({'message': 'OTP sent successfully'}), 200
 
     except Exception as e:
         print(f"Send OTP Error: {e}")
@@ -153,6 +55,8 @@ def send_otp():
 
 
 @auth_bp.route('/verify-otp', methods=['POST'])
+@rate_limit('verify-otp:phone', 10, 600, key=phone_key, backend=Config.RATE_LIMIT_OTP_BACKEND)
+@rate_limit('verify-otp:ip', 60, 600, backend=Config.RATE_LIMIT_OTP_BACKEND)
 def verify_otp():
     try:
         data = request.json
@@ -184,9 +88,10 @@ def verify_otp():
 
         if twofactor_session and api_key and 'your_' not in api_key:
             # Verify via 2Factor.in API
-            url = f"https://2factor.in/API/V1/{api_key}/SMS/VERIFY/{twofactor_session}/{otp}"
+            url = f"{Config.TWOFACTOR_BASE_URL}/{api_key}/SMS/VERIFY/{twofactor_session}/{otp}"
             try:
-                resp = requests.get(url, timeout=10)
+                with timed_external('2factor', 'verify'):
+                    resp = requests.get(url, timeout=10)
                 result = resp.json()
                 print(f"[2Factor Verify] Response: {result}")
                 if result.get('Status') != 'Success':
@@ -252,6 +157,7 @@ def firebase_login():
     return verify_otp()
 
 @auth_bp.route('/update-profile', methods=['POST'])
+@login_required
 def update_profile():
     data = request.json
     phone = data.get('phone')
@@ -259,6 +165,10 @@ def update_profile():
         return jsonify({'message': 'Phone number is required'}), 400
 
     db = get_db()
+    user = g.get('user')
+    if user and user.get('role') != 'admin':
+        # Customers can only edit their own profile, whatever phone the body names
+        phone = user['phone']
     
     # Fields allowed to be updated
     update_data = {}
@@ -289,6 +199,7 @@ def update_profile():
     # Fetch updated user
     updated_user = db.users.find_one({'phone': phone})
     updated_user['_id'] = str(updated_user['_id'])
+    forget_user(updated_user['_id'])
     
     return jsonify({
         'message': 'Profile updated successfully',
@@ -305,6 +216,10 @@ def admin_login():
     env_username = os.getenv('ADMIN_USERNAME', 'admin')
     env_password = os.getenv('ADMIN_PASSWORD', 'admin123')
 
+    if not admin_tokens_allowed():
+        print("[Auth] Refusing admin login: JWT_SECRET is still the default")
+        return jsonify({'message': 'Admin login is disabled until JWT_SECRET is set'}), 503
+
     if username == env_username and password == env_password:
         # Issue a special admin token
         token = jwt.encode({
@@ -321,29 +236,37 @@ def admin_login():
     return jsonify({'message': 'Invalid admin credentials'}), 401
 
 
+# Sort keys accepted by the users list (?sort=)
+USER_SORTS = {'created_at': 'created_at', 'spend': 'total_spent', 'orders': 'order_count'}
+
 # ADMIN: Get all users with order stats
 @auth_bp.route('/users', methods=['GET'])
+@admin_required
 def get_all_users():
     db = get_db()
-    users_cursor = db.users.find().sort('created_at', -1)
-    users = []
-    
-    for user in users_cursor:
-        user_id_str = str(user['_id'])
-        
-        # Calculate stats for this user
-        orders_cursor = db.orders.find({'user_id': user_id_str})
-        user_orders = list(orders_cursor)
-        
-        total_spent = sum(float(o.get('total_price', 0)) for o in user_orders if o.get('order_status') != 'Cancelled')
-        
-        user['_id'] = user_id_str
-        user['order_count'] = len(user_orders)
-        user['total_spent'] = round(total_spent, 2)
+    page = parse_page_args()
+    sort_field = USER_SORTS.get(request.args.get('sort', 'created_at'))
+    if not sort_field:
+        return jsonify({'message': f"sort must be one of: {', '.join(USER_SORTS)}"}), 400
+
+    # Counters on the user documents are trusted once `manage.py rebuild-user-stats` has run;
+    # until then they are computed for the page with one aggregation
+    stats_built = user_stats.is_built(db)
+    if sort_field != 'created_at' and not stats_built:
+        return jsonify({'message': 'Sorting by spend/orders needs `python manage.py rebuild-user-stats` to run once'}), 400
+    if stats_built and page['projection']:
+        page['projection'].update({'order_count': 1, 'total_spent': 1})
+
+    users, next_cursor = fetch_page(db.users, {}, sort_field, page)
+    page_stats = {} if stats_built else user_stats.stats_for(db, [str(u['_id']) for u in users])
+
+    for user in users:
+        user['_id'] = str(user['_id'])
+        stats = user if stats_built else page_stats.get(user['_id'], {})
+        user['order_count'] = stats.get('order_count', 0)
+        user['total_spent'] = round(stats.get('total_spent', 0), 2)
         
         if 'created_at' in user and isinstance(user['created_at'], datetime.datetime):
             user['created_at'] = user['created_at'].isoformat()
-            
-        users.append(user)
         
-    return jsonify(users), 200
+    return page_response(users, next_cursor, page)
@@ -0,0 +1,108 @@
+import csv
+import datetime
+import io
+import json
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from extensions import get_db
+from config import Config
+from auth import require_admin
+
+export_bp = Blueprint('export_bp', __name__)
+
+# Everything under /api/export is admin-only
+export_bp.before_request(require_admin)
+
+# collection -> (date field for ?from/&to, CSV columns, projection)
+EXPORTS = {
+    'orders': ('created_at', [
+        '_id', 'created_at', 'order_status', 'name', 'phone', 'email', 'address', 'city', 'pincode',
+        'total_price', 'promo_code', 'payment_method', 'payment_status', 'user_id', 'device_id', 'tracking_id',
+        'shipment_id', 'products'
+    ], None),
+    'users': ('created_at', [
+        '_id', 'created_at', 'name', 'phone', 'email', 'address', 'city', 'pincode',
+        'order_count', 'total_spent'
+    ], None),
+    # Review timestamps are ISO strings from the browser, which compare correctly as text
+    'reviews': ('timestamp', [
+        '_id', 'timestamp', 'product_id', 'user_id', 'user_name', 'rating', 'title', 'comment'
+    ], {'photo': 0}),
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _date_filter(field, start, end):
+    """?from=YYYY-MM-DD&to=YYYY-MM-DD (both optional, `to` inclusive)."""
+    bounds = {}
+    for key, value, op in (('from', start, '$gte'), ('to', end, '$lt')):
+        if not value:
+            continue
+        try:
+            day = datetime.datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f'{key} must be in YYYY-MM-DD format')
+        if op == '$lt':
+            day += datetime.timedelta(days=1)
+        bounds[op] = day.strftime('%Y-%m-%d') if field == 'timestamp' else day
+    return {field: bounds} if bounds else {}
+
+
+def _ndjson(cursor):
+    for doc in cursor:
+        yield json.dumps(doc, default=_json_default, ensure_ascii=False) + '\n'
+
+
+def _csv(cursor, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for doc in cursor:
+        row = []
+        for col in columns:
+            value = doc.get(col, '')
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value, default=_json_default, ensure_ascii=False)
+            elif isinstance(value, datetime.datetime):
+                value = value.isoformat()
+            row.append(value)
+        writer.writerow(row)
+        # Flush every row so memory stays flat whatever the export size
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+# ADMIN: Stream a whole collection as NDJSON (default) or CSV
+# /api/export/orders?format=csv&from=2024-01-01&to=2024-03-31&status=Delivered
+@export_bp.route('/<collection>', methods=['GET'])
+def export(collection):
+    if collection not in EXPORTS:
+        return jsonify({'message': f"Can export: {', '.join(EXPORTS)}"}), 404
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'message': 'format must be ndjson or csv'}), 400
+
+    date_field, columns, projection = EXPORTS[collection]
+    try:
+        query = _date_filter(date_field, request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if collection == 'orders' and request.args.get('status'):
+        query['order_status'] = request.args['status']
+
+    cursor = get_db()[collection].find(query, projection).sort('_id', 1).batch_size(Config.EXPORT_BATCH_SIZE)
+    body = _csv(cursor, columns) if fmt == 'csv' else _ndjson(cursor)
+
+    filename = f"{collection}-{datetime.datetime.utcnow():%Y%m%d}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
@@ -2,105 +2,67 @@ from flask import Blueprint, jsonify, request
 from extensions import get_db
 from bson import ObjectId
 from datetime import datetime
+import promo_engine
+from auth import admin_required
 
 offer_bp = Blueprint('offer_bp', __name__)
 
+# Kept by the server: used_count is the live usage counter (promo_usage), and
+# the rest are computed by list_offers. The dashboard echoes them back on edit.
+SERVER_FIELDS = ('_id', 'used_count', 'is_currently_valid', 'validity_reason')
+
+
+def _offer_fields(data):
+    data = {k: v for k, v in data.items() if k not in SERVER_FIELDS}
+    if 'code' in data:
+        data['code'] = data['code'].strip().upper()
+    return data
+
 @offer_bp.route('/', methods=['GET'])
 def get_offers():
-    """Fetch all offers."""
-    db = get_db()
-    offers_coll = db.offers
-    offers = list(offers_coll.find().sort('created_at', -1))
-    
-    current_time = datetime.utcnow()
-    
-    for o in offers:
-        o['_id'] = str(o['_id'])
-        is_active = o.get('status') == 'active'
-        o['is_currently_valid'] = is_active
-        o['validity_reason'] = ""
+    """Fetch all offers (from the promo engine's compiled cache)."""
+    return jsonify(promo_engine.list_offers()), 200
 
-        if not is_active:
-            o['is_currently_valid'] = False
-            o['validity_reason'] = "Campaign is inactive"
-            continue
+# Dry-run a code for the cart page: {"code": "...", "subtotal": 1200}
+# or {"code": "...", "cart": [{"price": 600, "quantity": 2}, ...]}
+@offer_bp.route('/validate', methods=['POST'])
+def validate_offer():
+    data = request.get_json(silent=True) or {}
+    code = str(data.get('code', '')).strip()
+    if not code:
+        return jsonify({'message': 'code is required'}), 400
 
+    subtotal = data.get('subtotal')
+    if subtotal is None and isinstance(data.get('cart'), list):
         try:
-            # Handle start_date
-            s_val = o.get('start_date')
-            start_date = None
-            if s_val:
-                if 'T' in s_val:
-                    start_date = datetime.fromisoformat(s_val.replace('Z', '+00:00')).replace(tzinfo=None)
-                else:
-                    start_date = datetime.strptime(s_val, '%Y-%m-%d')
-            
-            # Handle end_date
-            e_val = o.get('end_date')
-            end_date = None
-            if e_val:
-                if 'T' in e_val:
-                    end_date = datetime.fromisoformat(e_val.replace('Z', '+00:00')).replace(tzinfo=None)
-                else:
-                    end_date = datetime.strptime(e_val, '%Y-%m-%d')
-                    # If it's just a date, set it to the end of that day (23:59:59)
-                    end_date = end_date.replace(hour=23, minute=59, second=59)
-
-            if start_date and current_time < start_date:
-                o['is_currently_valid'] = False
-                o['validity_reason'] = f"Starts on {start_date.strftime('%d %b %Y')}"
-            
-            if end_date and current_time > end_date:
-                o['is_currently_valid'] = False
-                o['validity_reason'] = "Expired"
-                
-            # Handle Usage Limit (Stock)
-            usage_limit = o.get('usage_limit')
-            if usage_limit is not None:
-                try:
-                    usage_limit = int(usage_limit)
-                    # Count successful orders using this code
-                    used_count = db.orders.count_documents({
-                        'promo_code': o.get('code'),
-                        'order_status': {'$nin': ['Cancelled', 'Declined']}
-                    })
-                    o['used_count'] = used_count
-                    if used_count >= usage_limit:
-                        o['is_currently_valid'] = False
-                        o['validity_reason'] = "Usage limit reached (Sold Out)"
-                except (ValueError, TypeError):
-                    pass
-
-        except Exception as e:
-            # If parsing fails, we fallback to just status check but keep it valid
-            print(f"Date parsing error: {e}")
-            pass
-            
-    return jsonify(offers), 200
+            subtotal = sum(float(i.get('price', 0)) * int(i.get('quantity', 1)) for i in data['cart'])
+        except (ValueError, TypeError, AttributeError):
+            return jsonify({'message': 'cart lines need a numeric price and quantity'}), 400
+    return jsonify(promo_engine.validate(code, subtotal)), 200
 
 @offer_bp.route('/', methods=['POST'])
+@admin_required
 def add_offer():
     db = get_db()
-    data = request.json
-    if 'code' in data:
-        data['code'] = data['code'].strip().upper()
+    data = _offer_fields(request.json)
     data['created_at'] = datetime.utcnow().isoformat()
     db.offers.insert_one(data)
+    promo_engine.invalidate()
     return jsonify({'message': 'Offer created successfully'}), 201
 
 @offer_bp.route('/<id>', methods=['PUT'])
+@admin_required
 def update_offer(id):
     db = get_db()
-    data = request.json
-    if '_id' in data:
-        del data['_id']
-    if 'code' in data:
-        data['code'] = data['code'].strip().upper()
+    data = _offer_fields(request.json)
     db.offers.update_one({'_id': ObjectId(id)}, {'$set': data})
+    promo_engine.invalidate()
     return jsonify({'message': 'Offer updated successfully'}), 200
 
 @offer_bp.route('/<id>', methods=['DELETE'])
+@admin_required
 def delete_offer(id):
     db = get_db()
     db.offers.delete_one({'_id': ObjectId(id)})
+    promo_engine.invalidate()
     return jsonify({'message': 'Offer deleted successfully'}), 200
@@ -1,30 +1,44 @@
 from flask import Blueprint, request, jsonify
 from extensions import get_db
-from shiprocket import ShiprocketAPI
+from shiprocket import get_api, build_order_payload, package_options, shipped_fields
 from bson import ObjectId
+from bson.errors import InvalidId
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import UpdateOne
+from config import Config
+import analytics
+import customer_counters
+import inventory
+import jobs
+import order_events
+import pincode_index
+import promo_engine
+import promo_usage
+import sales_rollup
+import store_settings
+from pagination import parse_page_args, fetch_page, page_response
+from rate_limit import rate_limit
+from auth import admin_required, can_access, login_required
+from metrics import timed_external
 import datetime
-import razorpay
 import os
 
 order_bp = Blueprint('order_bp', __name__)
-shiprocket = ShiprocketAPI()
-
-# Initialize Razorpay
-client = None
-if os.getenv('RAZORPAY_KEY_ID') and os.getenv('RAZORPAY_KEY_SECRET'):
-    client = razorpay.Client(auth=(os.getenv('RAZORPAY_KEY_ID'), os.getenv('RAZORPAY_KEY_SECRET')))
-
-def send_sms(phone, message):
-    """Order confirmation SMS — uses MSG91 if configured, else prints to console."""
-    import os
-    if not os.getenv('MSG91_AUTH_KEY') or 'your_' in os.getenv('MSG91_AUTH_KEY', ''):
-        print(f"\n[DEV MODE] Order SMS → +91{phone}: {message}")
-        return True
-    
-    # In production, integrate MSG91 or fast2sms logic here
-    return True
+shiprocket = get_api()
+
+# Razorpay client, created on first use (the SDK is slow to import)
+_razorpay_client = None
+
+def razorpay_client():
+    global _razorpay_client
+    if _razorpay_client is None and os.getenv('RAZORPAY_KEY_ID') and os.getenv('RAZORPAY_KEY_SECRET'):
+        import razorpay
+        options = {'base_url': Config.RAZORPAY_BASE_URL} if Config.RAZORPAY_BASE_URL else {}
+        _razorpay_client = razorpay.Client(auth=(os.getenv('RAZORPAY_KEY_ID'), os.getenv('RAZORPAY_KEY_SECRET')), **options)
+    return _razorpay_client
 
 @order_bp.route('/shipping-cost', methods=['POST'])
+@rate_limit('shipping-cost:ip', 120, 60)
 def get_shipping_cost():
     data = request.json
     pincode = data.get('pincode')
@@ -39,35 +53,19 @@ def get_shipping_cost():
     if not is_maharashtra_pincode(pincode):
          return jsonify({'message': 'Delivery available only in Maharashtra'}), 400
 
-    # Check if this is the user's first order
-    is_first_order = False
-    db = get_db()
-    
-    # Check by user_id
-    if user_id and user_id != 'guest':
-        order_count = db.orders.count_documents({
-            'user_id': str(user_id),
-            'order_status': {'$ne': 'Cancelled'}
-        })
-        if order_count < 1:
-            is_first_order = True
-    
-    # Check by device_id (Anti-fraud)
-    if not is_first_order and device_id:
-        device_order_count = db.orders.count_documents({
-            'device_id': str(device_id),
-            'order_status': {'$ne': 'Cancelled'}
-        })
-        if device_order_count < 1:
-            is_first_order = True
-    elif is_first_order and device_id:
-        # even if user is new, if device has an order, block free delivery
-        device_order_count = db.orders.count_documents({
-            'device_id': str(device_id),
-            'order_status': {'$ne': 'Cancelled'}
-        })
-        if device_order_count >= 1:
-            is_first_order = False
+    # Swept pincodes are answered from the local index, without asking Shiprocket
+    pin_entry = pincode_index.lookup(pincode)
+    if pin_entry and not pin_entry['serviceable']:
+        return jsonify({'message': 'Delivery is not available at this pincode yet'}), 400
+
+    # Check if this is the user's first order.
+    # The device decides when we have one (anti-fraud: a new account on a
+    # device that already ordered doesn't count); otherwise the user does.
+    counts = customer_counters.order_counts(get_db(), user_id, device_id)
+    if 'device' in counts:
+        is_first_order = counts['device'] < 1
+    else:
+        is_first_order = counts.get('user', 1) < 1
 
     order_total = data.get('order_total', 0)
     
@@ -78,10 +76,8 @@ def get_shipping_cost():
             'message': 'Congratulations! Free Shipping applied for your first order over ₹1000.'
         }), 200
 
-    # Pickup location: Shrigonda (413701)
-    pickup_pincode = "413701" 
-    
-    shipping_details = shiprocket.get_shipping_rate(pickup_pincode, pincode, weight, cod=cod)
+    shipping_details = pincode_index.rate_quote(pin_entry, weight, cod) \
+        or shiprocket.get_shipping_rate(Config.PICKUP_PINCODE, pincode, weight, cod=cod)
     return jsonify(shipping_details), 200
 
 # Maharashtra Pincode Validation
@@ -93,34 +89,44 @@ def is_maharashtra_pincode(pincode):
     except:
         return False
 
+# Serviceability of a pincode from the local index (for the checkout form)
+@order_bp.route('/pincode/<pincode>', methods=['GET'])
+def get_pincode(pincode):
+    if not is_maharashtra_pincode(pincode):
+        return jsonify({'pincode': pincode, 'serviceable': False, 'known': True,
+                        'message': 'Delivery available only in Maharashtra'}), 200
+    entry = pincode_index.lookup(pincode)
+    if entry is None:
+        # Not swept yet: the real check happens at shipping-cost/checkout
+        return jsonify({'pincode': pincode, 'serviceable': True, 'known': False}), 200
+    return jsonify({
+        'pincode': pincode,
+        'serviceable': entry['serviceable'],
+        'known': True,
+        'couriers': entry['couriers'],
+        'etd': entry['etd']
+    }), 200
+
 @order_bp.route('/eligibility', methods=['POST'])
 def check_eligibility():
     data = request.json
     user_id = data.get('user_id')
     device_id = data.get('device_id')
     
-    db = get_db()
-    
     # Strict check: Must be eligible on BOTH user and device
-    user_eligible = True
-    if user_id and user_id != 'guest':
-        count = db.orders.count_documents({'user_id': str(user_id), 'order_status': {'$ne': 'Cancelled'}})
-        if count >= 1:
-            user_eligible = False
-            
-    device_eligible = True
-    if device_id:
-        count = db.orders.count_documents({'device_id': str(device_id), 'order_status': {'$ne': 'Cancelled'}})
-        if count >= 1:
-            device_eligible = False
+    counts = customer_counters.order_counts(get_db(), user_id, device_id)
+    user_eligible = counts.get('user', 0) < 1
+    device_eligible = counts.get('device', 0) < 1
             
     return jsonify({
         'eligible_for_free_delivery': user_eligible and device_eligible
     }), 200
 
 @order_bp.route('/razorpay/create', methods=['POST'])
+@rate_limit('razorpay-create:ip', 20, 60)
 def create_razorpay_order():
     """Step 1: Create a formal Razorpay Order for the payment modal."""
+    client = razorpay_client()
     if not client:
         return jsonify({'message': 'Razorpay not configured on server'}), 500
         
@@ -131,11 +137,12 @@ def create_razorpay_order():
             return jsonify({'message': 'Invalid amount'}), 400
             
         # Razorpay expects amount in paise (1 INR = 100 Paise)
-        razorpay_order = client.order.create({
-            "amount": int(amount * 100),
-            "currency": "INR",
-            "payment_capture": "1" # Auto-capture
-        })
+        with timed_external('razorpay', 'order.create'):
+            razorpay_order = client.order.create({
+                "amount": int(amount * 100),
+                "currency": "INR",
+                "payment_capture": "1" # Auto-capture
+            })
         
         return jsonify(razorpay_order), 200
     except Exception as e:
@@ -150,107 +157,80 @@ def create_order():
         if field not in data:
             return jsonify({'message': f'Missing field: {field}'}), 400
 
+    # Quantities must be whole numbers >= 1 (a negative one would add stock)
+    bad_lines = inventory.invalid_lines(data['products'])
+    if bad_lines:
+        return jsonify({'message': 'Every item needs a quantity of at least 1.',
+                        'invalid_items': bad_lines}), 400
+
     pincode = data['pincode']
     if not is_maharashtra_pincode(pincode):
          return jsonify({'message': 'Delivery available only in Maharashtra (Pincode 400xxx-44xxxx)'}), 400
 
-    # Check Shiprocket Serviceability
-    # Factory location: Shrigonda (413701)
-    pickup_pincode = "413701" 
-    serviceability = shiprocket.check_serviceability(pickup_pincode, pincode)
+    # Check Shiprocket Serviceability (swept pincodes are answered locally)
+    pin_entry = pincode_index.lookup(pincode)
+    if pin_entry and not pin_entry['serviceable']:
+        return jsonify({'message': 'Delivery is not available at this pincode yet'}), 400
+    if pin_entry is None:
+        serviceability = shiprocket.check_serviceability(Config.PICKUP_PINCODE, pincode)
     
-    # Analyze serviceability response (mock logic if API fails or returns specific structure)
-    # Real Shiprocket response has 'data' -> 'available_courier_companies'
-    is_serviceable = False
-    if serviceability and 'data' in serviceability and 'available_courier_companies' in serviceability['data']:
-         if len(serviceability['data']['available_courier_companies']) > 0:
-             is_serviceable = True
+        # Analyze serviceability response (mock logic if API fails or returns specific structure)
+        # Real Shiprocket response has 'data' -> 'available_courier_companies'
+        is_serviceable = False
+        if serviceability and 'data' in serviceability and 'available_courier_companies' in serviceability['data']:
+             if len(serviceability['data']['available_courier_companies']) > 0:
+                 is_serviceable = True
     
-    # If API fails (e.g. invalid credentials), we might want to fallback or block.
-    # For this project, if serviceability check fails but pincode is MH, we might warn or block.
-    # I'll log it but maybe proceed for demo if strict check is not critical, 
-    # BUT user insisted on "Validate pincode -> Call Shiprocket API -> Show error if delivery not available".
-    # So I must enforce it.
+        # If API fails (e.g. invalid credentials), we might want to fallback or block.
+        # For this project, if serviceability check fails but pincode is MH, we might warn or block.
+        # I'll log it but maybe proceed for demo if strict check is not critical, 
+        # BUT user insisted on "Validate pincode -> Call Shiprocket API -> Show error if delivery not available".
+        # So I must enforce it.
     
-    # For demo purposes, if Shiprocket credentials are not set or auth fails,
-    # we allow the order to proceed as long as the pincode is valid Maharashtra.
-    if not is_serviceable:
-        if serviceability and serviceability.get('message') == 'Authentication failed':
-            print("Shiprocket Auth Failed - Allowing order as pincode is MH (demo mode)")
-            # Allow through for demo
-        else:
-            print(f"Serviceability check result: {serviceability}")
-            # Allow through for demo - in production, uncomment the line below:
-            # return jsonify({'message': 'Service not available for this pincode'}), 400
+        # For demo purposes, if Shiprocket credentials are not set or auth fails,
+        # we allow the order to proceed as long as the pincode is valid Maharashtra.
+        if not is_serviceable:
+            if serviceability and serviceability.get('message') == 'Authentication failed':
+                print("Shiprocket Auth Failed - Allowing order as pincode is MH (demo mode)")
+                # Allow through for demo
+            else:
+                print(f"Serviceability check result: {serviceability}")
+                # Allow through for demo - in production, uncomment the line below:
+                # return jsonify({'message': 'Service not available for this pincode'}), 400
 
     # Promo Code Validation
     db = get_db()
     promo_code = data.get('promo_code')
     if promo_code:
-        offer = db.offers.find_one({'code': promo_code.strip().upper()})
+        offer = promo_engine.find(promo_code)
         if not offer:
             return jsonify({'message': 'Invalid promotional code.'}), 400
-        
-        # Check Status
-        if offer.get('status') != 'active':
-             return jsonify({'message': 'This promotional campaign is no longer active.'}), 400
-        
-        # Check Dates
-        current_time = datetime.datetime.utcnow()
-        try:
-            s_val = offer.get('start_date')
-            if s_val:
-                start_date = datetime.datetime.fromisoformat(s_val.replace('Z', '+00:00')).replace(tzinfo=None) if 'T' in s_val else datetime.datetime.strptime(s_val, '%Y-%m-%d')
-                if current_time < start_date:
-                    return jsonify({'message': f'This code will be valid from {start_date.strftime("%d %b %Y")}.'}), 400
-            
-            e_val = offer.get('end_date')
-            if e_val:
-                end_date = datetime.datetime.fromisoformat(e_val.replace('Z', '+00:00')).replace(tzinfo=None) if 'T' in e_val else datetime.datetime.strptime(e_val, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
-                if current_time > end_date:
-                    return jsonify({'message': 'This promotional code has expired.'}), 400
-        except:
-            pass # Fallback to status check if date parsing fails
-
-        # Check Usage Limit
-        usage_limit = offer.get('usage_limit')
-        if usage_limit is not None and str(usage_limit).strip() != '':
-            try:
-                usage_limit = int(usage_limit)
-                used_count = db.orders.count_documents({
-                    'promo_code': offer.get('code'),
-                    'order_status': {'$nin': ['Cancelled', 'Declined']}
-                })
-                if used_count >= usage_limit:
-                    return jsonify({'message': 'This promotional code is sold out (usage limit reached).'}), 400
-            except:
-                pass
-
-    # Stock Check & Update
-    db = get_db()
-    products_to_update = []
-    
-    for item in data['products']:
-        p_id = item.get('product_id')
-        qty = item.get('quantity', 1)
-        
-        product = db.products.find_one({'_id': ObjectId(p_id)})
-        if not product:
-            return jsonify({'message': f'Product {p_id} not found'}), 404
-            
-        current_stock = int(product.get('stock', 0))
-        if current_stock < qty:
-            return jsonify({'message': f'Insufficient stock for {product.get("name")}. Only {current_stock} available.'}), 400
-            
-        products_to_update.append((p_id, qty))
-
-    # All products have enough stock, now decrement
-    for p_id, qty in products_to_update:
-        dec_qty = int(qty) * -1
-        db.products.update_one(
-            {'_id': ObjectId(p_id)},
-            {'$inc': {'stock': dec_qty}}
-        )
+
+        # Status and dates, checked in memory; the usage limit is left to
+        # reserve() below, since this worker's cached count may be behind
+        valid, _, message = promo_engine.check(offer, usage=False)
+        if not valid:
+            return jsonify({'message': message}), 400
+
+        # Atomically count this use against offers.used_count
+        if not promo_usage.reserve(db, offer, offer['usage_limit']):
+            return jsonify({'message': 'This promotional code is sold out (usage limit reached).'}), 400
+        promo_code = offer['code']
+
+    # Reserve stock for every line in one step (no overselling under concurrent checkouts)
+    reservation = inventory.reserve_stock(db, data['products'])
+    if not reservation['ok']:
+        promo_usage.release(db, promo_code)
+        if reservation['missing']:
+            return jsonify({'message': f"Product {reservation['missing'][0]} not found",
+                            'missing_items': reservation['missing']}), 404
+        short = reservation['short']
+        if short:
+            message = f"Insufficient stock for {short[0]['name']}. Only {short[0]['available']} available."
+        else:
+            message = 'Some items just went out of stock. Please review your cart.'
+        return jsonify({'message': message, 'short_items': short}), 400
+    # The storefront picks up the new stock levels within CATALOG_STOCK_TTL
 
     # Create Order in MongoDB
     order = {
@@ -270,11 +250,18 @@ def create_order():
         "razorpay_order_id": data.get('razorpay_order_id', ''),
         "razorpay_signature": data.get('razorpay_signature', ''),
         "created_at": datetime.datetime.utcnow(),
-        "promo_code": data.get('promo_code', ''),
+        "promo_code": promo_code or '',
         "tracking_id": "PENDING"
     }
     
-    order_id = db.orders.insert_one(order).inserted_id
+    try:
+        order_id = db.orders.insert_one(order).inserted_id
+    except Exception as e:
+        print(f"Order insert failed, releasing reservation: {e}")
+        inventory.release_stock(db, data['products'])
+        promo_usage.release(db, promo_code)
+        return jsonify({'message': 'Failed to place order. Please try again.'}), 500
+    order_events.order_created(db, order)
 
     # For now, we set tracking_id to PENDING as admin will push to Shiprocket manually
     tracking_id = "PENDING"
@@ -291,7 +278,7 @@ def create_order():
             f"Status: Placed\n"
             f"Thank you for ordering! Track your order at our website."
         )
-        send_sms(data['phone'], sms_message)
+        jobs.enqueue('send_order_sms', {'phone': data['phone'], 'message': sms_message})
     except Exception as sms_err:
         print(f"SMS Error: {sms_err}")
 
@@ -323,9 +310,7 @@ def cancel_order(order_id):
              return jsonify({'message': f'Order cannot be cancelled. Current status: {order["order_status"]}'}), 400
              
         # Check grace period from settings
-        db = get_db()
-        settings = db.settings.find_one({"type": "global"})
-        grace_hours = settings.get('refund_hour_grace_period', 24) if settings else 24
+        grace_hours = store_settings.grace_hours()
         
         created_at = order.get('created_at')
         if created_at:
@@ -359,16 +344,20 @@ def cancel_order(order_id):
         return jsonify({'message': 'Failed to cancel order'}), 500
 
 @order_bp.route('/user/<user_id>', methods=['GET'])
+@login_required
 def get_user_orders(user_id):
-    orders_cursor = get_db().orders.find({'user_id': user_id}).sort('created_at', -1)
-    orders = []
-    for order in orders_cursor:
+    if not can_access(user_id):
+        return jsonify({'message': 'Not allowed'}), 403
+    page = parse_page_args()
+    orders, next_cursor = fetch_page(get_db().orders, {'user_id': user_id}, 'created_at', page)
+    for order in orders:
         order['_id'] = str(order['_id'])
-        orders.append(order)
-    return jsonify(orders), 200
+    return page_response(orders, next_cursor, page)
 
 # ADMIN: Push order to Shiprocket
+# Queued by default (202 + job_id); ?sync=1 pushes inline and returns Shiprocket's result.
 @order_bp.route('/<order_id>/ship', methods=['POST'])
+@admin_required
 def ship_order(order_id):
     try:
         db = get_db()
@@ -377,63 +366,26 @@ def ship_order(order_id):
             return jsonify({'message': 'Order not found'}), 404
             
         data = request.json if request.is_json else {}
-        pickup_location = data.get('pickup_location', 'warehouse')
-        weight = float(data.get('weight', 0.5))
-        length = float(data.get('length', 10))
-        breadth = float(data.get('breadth', 10))
-        height = float(data.get('height', 10))
-
-        # Prepare Shiprocket Order Payload
-        sr_order_items = []
-        for item in order['products']:
-            sr_order_items.append({
-                "name": item.get('name', 'GAVRAN Product'),
-                "sku": str(item.get('product_id', 'sku')),
-                "units": item.get('quantity', 1),
-                "selling_price": item.get('price', 0),
-                "discount": "",
-                "tax": "",
-                "hsn": ""
-            })
-            
-        sr_order_payload = {
-            "order_id": str(order['_id']),
-            "order_date": order['created_at'].strftime("%Y-%m-%d %H:%M"),
-            "pickup_location": pickup_location,
-            "billing_customer_name": order['name'],
-            "billing_last_name": "",
-            "billing_address": order['address'],
-            "billing_city": order['city'],
-            "billing_pincode": order['pincode'],
-            "billing_state": "Maharashtra",
-            "billing_country": "India",
-            "billing_email": order.get("email", "customer@example.com"),
-            "billing_phone": order['phone'],
-            "shipping_is_billing": True,
-            "order_items": sr_order_items,
-            "payment_method": "COD", # Map this based on actual payment if needed
-            "sub_total": order['total_price'],
-            "length": length, "breadth": breadth, "height": height, "weight": weight 
-        }
-
-        sr_response = shiprocket.create_order(sr_order_payload)
-        
-        if sr_response and 'status_code' in sr_response and sr_response['status_code'] == 1:
-            tracking_id = sr_response.get('order_id', order_id)
-            shipment_id = sr_response.get('shipment_id', '')
-            
+        options = package_options(data)
+
+        if request.args.get('sync') != '1':
+            job_id = jobs.enqueue('ship_order', {'order_id': order_id, 'options': options})
             db.orders.update_one(
-                {'_id': ObjectId(order_id)}, 
-                {'$set': {
-                    'order_status': 'Shipped',
-                    'tracking_id': str(tracking_id),
-                    'shipment_id': str(shipment_id)
-                }}
+                {'_id': order['_id']},
+                {'$set': {'shipping_status': 'Queued', 'shipping_job_id': job_id}, '$unset': {'shipping_error': ''}}
             )
+            return jsonify({'message': 'Queued for Shiprocket', 'job_id': job_id}), 202
+
+        sr_response = shiprocket.create_order(build_order_payload(order, options))
+        fields = shipped_fields(sr_response, order_id)
+
+        if fields:
+            fields['shipping_status'] = 'Pushed'
+            db.orders.update_one({'_id': ObjectId(order_id)}, {'$set': fields})
             return jsonify({
                 'message': 'Successfully pushed to Shiprocket',
-                'shiprocket_order_id': tracking_id,
-                'shiprocket_shipment_id': shipment_id
+                'shiprocket_order_id': fields['tracking_id'],
+                'shiprocket_shipment_id': fields['shipment_id']
             }), 200
         else:
             error_msg = sr_response.get('message', 'Failed to create order in Shiprocket')
@@ -443,19 +395,97 @@ def ship_order(order_id):
         print(f"Shiprocket Error: {e}")
         return jsonify({'message': str(e)}), 500
 
+def _push_to_shiprocket(order, options):
+    """One bulk-ship push; returns (order, fields to $set or None, error message)."""
+    try:
+        sr_response = shiprocket.create_order(build_order_payload(order, options))
+    except Exception as e:
+        return order, None, str(e)
+    fields = shipped_fields(sr_response, str(order['_id']))
+    if fields is None:
+        return order, None, (sr_response or {}).get('message', 'Failed to create order in Shiprocket')
+    return order, fields, None
+
+# ADMIN: Push many orders to Shiprocket at once
+# Body: {"order_ids": [...]} or {"status": "Processing"}, plus the same package fields as /ship
+@order_bp.route('/ship-bulk', methods=['POST'])
+@admin_required
+def ship_orders_bulk():
+    data = request.json if request.is_json else {}
+    options = package_options(data)
+    db = get_db()
+
+    # Orders that already have a shipment are never pushed twice
+    query = {'shipment_id': {'$in': [None, '']}}
+    report = []
+    if data.get('order_ids'):
+        if len(data['order_ids']) > Config.SHIPROCKET_BULK_MAX:
+            return jsonify({'message': f'At most {Config.SHIPROCKET_BULK_MAX} orders per call'}), 400
+        oids = []
+        for order_id in data['order_ids']:
+            try:
+                oids.append(ObjectId(str(order_id)))
+            except InvalidId:
+                report.append({'order_id': str(order_id), 'ok': False, 'message': 'Invalid order id'})
+        query['_id'] = {'$in': oids}
+    elif data.get('status'):
+        query['order_status'] = data['status']
+    else:
+        return jsonify({'message': 'order_ids or status is required'}), 400
+
+    orders = list(db.orders.find(query).sort('created_at', 1).limit(Config.SHIPROCKET_BULK_MAX))
+    # By status, a call ships the oldest SHIPROCKET_BULK_MAX; the rest wait for the next call
+    remaining = 0
+    if not data.get('order_ids') and len(orders) == Config.SHIPROCKET_BULK_MAX:
+        remaining = db.orders.count_documents(query) - len(orders)
+    if data.get('order_ids'):
+        found = {str(o['_id']) for o in orders}
+        for oid in query['_id']['$in']:
+            if str(oid) not in found:
+                report.append({'order_id': str(oid), 'ok': False, 'message': 'Not found or already shipped'})
+
+    # Bounded pool: the pushes share the pooled Shiprocket session and one login token
+    with ThreadPoolExecutor(max_workers=max(1, Config.SHIPROCKET_BULK_WORKERS)) as pool:
+        results = list(pool.map(lambda o: _push_to_shiprocket(o, options), orders))
+
+    ops = []
+    for order, fields, error in results:
+        if fields:
+            fields['shipping_status'] = 'Pushed'
+            ops.append(UpdateOne({'_id': order['_id']}, {'$set': fields, '$unset': {'shipping_error': ''}}))
+            report.append({'order_id': str(order['_id']), 'ok': True,
+                           'tracking_id': fields['tracking_id'], 'shipment_id': fields['shipment_id']})
+        else:
+            ops.append(UpdateOne({'_id': order['_id']}, {'$set': {'shipping_error': str(error)}}))
+            report.append({'order_id': str(order['_id']), 'ok': False, 'message': error})
+    if ops:
+        db.orders.bulk_write(ops, ordered=False)
+
+    shipped = sum(1 for r in report if r['ok'])
+    return jsonify({
+        'shipped': shipped,
+        'failed': len(report) - shipped,
+        'remaining': remaining,
+        'results': report
+    }), 200
+
 # ADMIN: Get all orders
 @order_bp.route('/', methods=['GET'])
+@admin_required
 def get_all_orders():
     # In production, check for admin token
-    orders_cursor = get_db().orders.find().sort('created_at', -1)
-    orders = []
-    for order in orders_cursor:
+    page = parse_page_args()
+    query = {}
+    if request.args.get('status'):
+        query['order_status'] = request.args['status']
+    orders, next_cursor = fetch_page(get_db().orders, query, 'created_at', page)
+    for order in orders:
         order['_id'] = str(order['_id'])
-        orders.append(order)
-    return jsonify(orders), 200
+    return page_response(orders, next_cursor, page)
 
 # ADMIN: Update order status & metadata
 @order_bp.route('/<order_id>/status', methods=['PUT'])
+@admin_required
 def update_order_status(order_id):
     try:
         data = request.json
@@ -471,30 +501,24 @@ def update_order_status(order_id):
             update_data['cancellation_reason'] = reason
         if admin_note:
             update_data['admin_note'] = admin_note
-        # If status is changing to Cancelled or Declined, return stock!
         if new_status in ['Cancelled', 'Declined']:
             update_data['cancelled_at'] = datetime.datetime.utcnow()
-            
-            # Fetch order to get products
-            order = get_db().orders.find_one({'_id': ObjectId(order_id)})
-            if order and order.get('order_status') not in ['Cancelled', 'Declined']:
-                # Return items to stock
-                for item in order.get('products', []):
-                    p_id = item.get('product_id')
-                    qty = item.get('quantity', 0)
-                    if p_id and qty > 0:
-                        get_db().products.update_one(
-                            {'_id': ObjectId(p_id)},
-                            {'$inc': {'stock': int(qty)}}
-                        )
-
-        result = get_db().orders.update_one(
+
+        # Returns the order as it was, so the transition is judged atomically
+        db = get_db()
+        order = db.orders.find_one_and_update(
             {'_id': ObjectId(order_id)},
             {'$set': update_data}
         )
-        
-        if result.matched_count == 0:
+        if not order:
             return jsonify({'message': 'Order not found'}), 404
+
+        old_status = order.get('order_status')
+        # If status is changing to Cancelled or Declined, return stock!
+        if new_status in ['Cancelled', 'Declined'] and old_status not in ['Cancelled', 'Declined']:
+            inventory.release_stock(db, [i for i in order.get('products', []) if i.get('product_id')])
+
+        order_events.order_status_changed(db, order, old_status, new_status)
             
         return jsonify({'message': 'Order status updated successfully'}), 200
     except Exception as e:
@@ -502,13 +526,15 @@ def update_order_status(order_id):
 
 # ADMIN: Delete an order
 @order_bp.route('/<order_id>', methods=['DELETE'])
+@admin_required
 def delete_order(order_id):
     try:
         db = get_db()
-        result = db.orders.delete_one({'_id': ObjectId(order_id)})
+        order = db.orders.find_one_and_delete({'_id': ObjectId(order_id)})
         
-        if result.deleted_count == 0:
+        if not order:
             return jsonify({'message': 'Order not found'}), 404
+        order_events.order_deleted(db, order)
             
         return jsonify({'message': 'Order deleted successfully'}), 200
     except Exception as e:
@@ -516,72 +542,20 @@ def delete_order(order_id):
 
 # ADMIN: Get business analytics
 @order_bp.route('/analytics/report', methods=['GET'])
+@admin_required
 def get_analytics():
     try:
-        db = get_db()
-        # 1. Daily Sales for last 7 days
-        today = datetime.datetime.utcnow().replace(hour=23, minute=59, second=59)
-        last_7_days = []
-        for i in range(6, -1, -1):
-            day = today - datetime.timedelta(days=i)
-            day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-            day_end = day.replace(hour=23, minute=59, second=59, microsecond=999)
-            
-            orders = list(db.orders.find({
-                'created_at': {'$gte': day_start, '$lte': day_end},
-                'order_status': {'$nin': ['Cancelled', 'Declined']}
-            }))
-            
-            revenue = sum(float(o.get('total_price', 0)) for o in orders)
-            last_7_days.append({
-                'name': day.strftime('%a'),
-                'revenue': round(float(revenue), 2),
-                'orders': len(orders)
-            })
-
-        # 2. Sales by Category (All time)
-        category_stats = {}
-        all_orders = list(db.orders.find({'order_status': {'$nin': ['Cancelled', 'Declined']}}))
-        
-        for order in all_orders:
-            for item in order.get('products', []):
-                # Try to get category from orders product ref or fetch from products coll
-                # For efficiency we use a small cache or just use the category field if it was stored in the order
-                cat = item.get('category', 'Others')
-                val = float(item.get('price', 0)) * float(item.get('quantity', 1))
-                if cat in category_stats:
-                    category_stats[cat] += val
-                else:
-                    category_stats[cat] = val
-        
-        category_data = [
-            {'name': k, 'value': int(round(v))} for k, v in category_stats.items()
-        ]
-        
-        # 3. Overall Metrics
-        total_revenue = sum(float(o.get('total_price', 0)) for o in all_orders)
-        avg_order_value = total_revenue / len(all_orders) if all_orders else 0
-        
-        # Calculate Repeat Customer Rate
-        user_order_counts = {}
-        for o in all_orders:
-            uid = str(o.get('user_id'))
-            user_order_counts[uid] = user_order_counts.get(uid, 0) + 1
-            
-        repeat_customers = [uid for uid, count in user_order_counts.items() if count > 1]
-        repeat_rate = (len(repeat_customers) / len(user_order_counts) * 100) if user_order_counts else 0
+        start, end = analytics.parse_range(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
-        return jsonify({
-            'dailyData': last_7_days,
-            'categoryData': category_data,
-            'metrics': {
-                'totalRevenue': round(total_revenue, 2),
-                'avgOrderValue': round(avg_order_value, 2),
-                'orderCount': len(all_orders),
-                'repeatRate': round(repeat_rate, 1)
-            }
-        }), 200
-        
+    try:
+        db = get_db()
+        # The daily_sales rollup answers in O(days); ?source=orders forces the
+        # live aggregation (also used until the rollup has been built)
+        if request.args.get('source') != 'orders' and sales_rollup.is_built(db):
+            return jsonify(sales_rollup.rollup_report(db, start, end)), 200
+        return jsonify(analytics.sales_report(db, start, end)), 200
     except Exception as e:
         print(f"Analytics Error: {e}")
         return jsonify({'message': str(e)}), 400
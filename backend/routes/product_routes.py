@@ -1,5 +1,11 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, url_for
 from extensions import get_db
+from config import Config
+from auth import admin_required
+import blob_store
+import catalog
+from http_cache import conditional_json
+from pagination import parse_page_args, fetch_page, paginate_by_id, page_response
 from bson import ObjectId
 
 product_bp = Blueprint('product_bp', __name__)
@@ -9,59 +15,86 @@ IMAGE_BASE = "https://gavran-magic.netlify.app/images"
 
 # Removed DEFAULTS array as requested by user - all products will only be added through admin dashboard.
 
+
 @product_bp.route('/', methods=['GET'])
 def get_products():
-    """Fetch all products."""
-    db = get_db()
-    products_coll = db.products
-    
-    # Fetch all products (admin vs public filtering shifted to frontend display logic)
-    products = list(products_coll.find())
-
-    for p in products:
-        p['_id'] = str(p['_id'])
-        # Fallbacks for existing products
-        if 'images' not in p:
-            p['images'] = [p.get('image')] if p.get('image') else []
-        if 'stock' not in p:
-            p['stock'] = 100
-        if 'discount' not in p:
-            p['discount'] = 0
-        if 'status' not in p:
-            p['status'] = 'active'
-            
-    return jsonify(products), 200
+    """Fetch all products (served from the catalog cache)."""
+    cat = catalog.get_catalog()
+    if not request.args:
+        return conditional_json(cat['body'], cat['etag'])
+
+    page = parse_page_args()
+    products, next_cursor = paginate_by_id(cat['products'], page)
+    return page_response(products, next_cursor, page)
 
 
 @product_bp.route('/<id>', methods=['GET'])
 def get_product(id):
-    db = get_db()
-    product = db.products.find_one({'_id': ObjectId(id)})
-    if product:
-        product['_id'] = str(product['_id'])
-        if 'images' not in product:
-            product['images'] = [product.get('image')] if product.get('image') else []
-        if 'stock' not in product:
-            product['stock'] = 100
-        if 'discount' not in product:
-            product['discount'] = 0
-        return jsonify(product), 200
+    entry = catalog.get_product_entry(id)
+    if entry:
+        body, etag = entry
+        return conditional_json(body, etag)
     return jsonify({'message': 'Product not found'}), 404
 
 # --- Review Routes ---
 
+def _photo_url(blob_id):
+    if Config.PUBLIC_API_URL:
+        return f"{Config.PUBLIC_API_URL}{url_for('product_bp.get_photo', blob_id=blob_id)}"
+    return url_for('product_bp.get_photo', blob_id=blob_id, _external=True)
+
 @product_bp.route('/<id>/reviews', methods=['GET'])
 def get_reviews(id):
     db = get_db()
-    reviews = list(db.reviews.find({'product_id': id}).sort('timestamp', -1))
+    page = parse_page_args()
+    # Never ship photo bytes in the list; legacy inline photos are moved out by
+    # `python manage.py migrate-review-photos`
+    if page['projection'] is None:
+        page['projection'] = {'photo': 0}
+    else:
+        page['projection'].pop('photo', None)
+    reviews, next_cursor = fetch_page(db.reviews, {'product_id': id}, 'timestamp', page)
     for r in reviews:
         r['_id'] = str(r['_id'])
-    return jsonify(reviews), 200
+        if r.get('photo_id'):
+            r['photo'] = _photo_url(r['photo_id'])
+            r['thumb_url'] = _photo_url(r.get('thumb_id') or r['photo_id'])
+    return page_response(reviews, next_cursor, page)
+
+@product_bp.route('/photos/<blob_id>', methods=['GET'])
+def get_photo(blob_id):
+    """Stream a review photo; blob ids are content hashes so they can be cached forever."""
+    blob = blob_store.open_blob(blob_id)
+    if not blob:
+        return jsonify({'message': 'Photo not found'}), 404
+    fileobj, content_type, length = blob
+    if request.if_none_match.contains(blob_id):
+        fileobj.close()
+        response = Response(status=304)
+    else:
+        response = Response(blob_store.iter_blob(fileobj), mimetype=content_type, direct_passthrough=True)
+        response.content_length = length
+    response.set_etag(blob_id)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 @product_bp.route('/<id>/reviews', methods=['POST'])
 def add_review(id):
+    # Refuse oversized uploads before reading (and decoding) the body
+    if request.content_length and request.content_length > Config.REVIEW_UPLOAD_MAX_BYTES:
+        return jsonify({'message': f'Photo must be under {Config.REVIEW_PHOTO_MAX_BYTES // (1024 * 1024)} MB'}), 413
     db = get_db()
-    data = request.json
+    # JSON with a base64 data URL (current frontend) or multipart with a file
+    data = request.form if request.files else request.json
+    photo_refs = {}
+    try:
+        if request.files.get('photo'):
+            photo_refs = blob_store.put_image(request.files['photo'].read())
+        elif data.get('photo'):
+            photo_refs = blob_store.put_image(blob_store.decode_data_url(data['photo']))
+    except blob_store.BlobError as e:
+        return jsonify({'message': str(e)}), 400
+
     review = {
         "product_id": id,
         "user_name": data.get("user_name", "Anonymous"),
@@ -69,7 +102,8 @@ def add_review(id):
         "rating": int(data.get("rating", 5)),
         "title": data.get("title", ""),
         "comment": data.get("comment", ""),
-        "photo": data.get("photo"), # base64 string
+        "photo_id": photo_refs.get("photo_id"),
+        "thumb_id": photo_refs.get("thumb_id"),
         "timestamp": data.get("timestamp") or ""
     }
     db.reviews.insert_one(review)
@@ -78,24 +112,30 @@ def add_review(id):
 
 # Admin Routes
 @product_bp.route('/', methods=['POST'])
+@admin_required
 def add_product():
     db = get_db()
     data = request.json
     db.products.insert_one(data)
+    catalog.invalidate()
     return jsonify({'message': 'Product added'}), 201
 
 
 @product_bp.route('/<id>', methods=['PUT'])
+@admin_required
 def update_product(id):
     db = get_db()
     data = request.json
     # MongoDB update requires $set if we only want to update specific fields
     db.products.update_one({'_id': ObjectId(id)}, {'$set': data})
+    catalog.invalidate()
     return jsonify({'message': 'Product updated'}), 200
 
 
 @product_bp.route('/<id>', methods=['DELETE'])
+@admin_required
 def delete_product(id):
     db = get_db()
     db.products.delete_one({'_id': ObjectId(id)})
+    catalog.invalidate()
     return jsonify({'message': 'Product deleted'}), 200
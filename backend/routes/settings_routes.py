@@ -2,36 +2,24 @@ from flask import Blueprint, request, jsonify
 from extensions import get_db
 from bson import ObjectId
 import os
+from auth import admin_required
+from http_cache import conditional_json
+import store_settings
 
 settings_bp = Blueprint('settings', __name__)
 
 @settings_bp.route('/', methods=['GET'])
 def get_settings():
-    db = get_db()
-    # We only have one settings document
-    settings = db.settings.find_one({"type": "global"})
-    if settings:
-        settings['_id'] = str(settings['_id'])
-        return jsonify(settings), 200
-    
-    # Default settings if none exist
-    default_settings = {
-        "type": "global",
-        "refund_hour_grace_period": 24,
-        "refund_policy_text": "You can request a refund within the grace period after placing your order.",
-        "return_policy_text": "Products can be returned if they are damaged or incorrect upon delivery.",
-        "store_name": "Gavran Magic",
-        "store_email": "contact@gavranmagic.com",
-        "store_phone": "+91 9876543210",
-        "store_address": "Pune, Maharashtra, India"
-    }
-    return jsonify(default_settings), 200
+    """Served from the settings cache; clients revalidate with If-None-Match."""
+    body, etag = store_settings.get_entry()
+    return conditional_json(body, etag)
 
 @settings_bp.route('/keys/razorpay', methods=['GET'])
 def get_razorpay_key():
     return jsonify({'key': os.getenv('RAZORPAY_KEY_ID')}), 200
 
 @settings_bp.route('/', methods=['POST'])
+@admin_required
 def update_settings():
     db = get_db()
     data = request.json
@@ -51,5 +39,6 @@ def update_settings():
         {"$set": update_data},
         upsert=True
     )
+    store_settings.invalidate()
     
     return jsonify({"message": "Settings updated successfully"}), 200
@@ -0,0 +1,126 @@
+import datetime
+from pymongo import ReplaceOne
+from analytics import EXCLUDED_STATUSES, num_expr, chart_window, daily_points
+
+# One document per UTC day:
+# {_id: 'YYYY-MM-DD', revenue, orders, categories: {name: revenue}, customers: {user_id: orders}}
+
+
+def _field(name, default='Others'):
+    """Make a value safe to use as a sub-document key."""
+    name = str(name if name is not None else default).replace('.', '_').lstrip('$')
+    return name or default
+
+
+def _day_key(created_at):
+    if isinstance(created_at, str):
+        created_at = datetime.datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+    return (created_at or datetime.datetime.utcnow()).strftime('%Y-%m-%d')
+
+
+def _float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def apply_order(db, order, sign):
+    """Add (sign=1) or subtract (sign=-1) one order's contribution to its day."""
+    inc = {
+        'revenue': sign * _float(order.get('total_price', 0)),
+        'orders': sign,
+        f"customers.{_field(order.get('user_id'), 'None')}": sign,
+    }
+    for item in order.get('products', []):
+        key = f"categories.{_field(item.get('category'))}"
+        value = _float(item.get('price', 0)) * _float(item.get('quantity', 1), 1.0)
+        inc[key] = inc.get(key, 0) + sign * value
+
+    db.daily_sales.update_one({'_id': _day_key(order.get('created_at'))}, {'$inc': inc}, upsert=True)
+
+
+def is_built(db):
+    return db.meta.find_one({'_id': 'daily_sales'}) is not None
+
+
+def rebuild(db):
+    """
+    Recompute daily_sales from orders. Run it once to backfill, or to repair
+    drift; orders placed while it runs may be missed until the next rebuild.
+    Days are replaced one by one (never emptied first), so the report stays
+    complete while this runs and a concurrent apply_order can't collide with it.
+    """
+    match = {'$match': {'order_status': {'$nin': EXCLUDED_STATUSES}, 'created_at': {'$type': 'date'}}}
+    day = {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}}
+    days = {}
+
+    def doc(day_key):
+        return days.setdefault(day_key, {'_id': day_key, 'revenue': 0.0, 'orders': 0,
+                                         'categories': {}, 'customers': {}})
+
+    for row in db.orders.aggregate([
+        match,
+        {'$group': {'_id': {'day': day, 'user': {'$toString': '$user_id'}},
+                    'revenue': {'$sum': num_expr('$total_price')}, 'orders': {'$sum': 1}}}
+    ], allowDiskUse=True):
+        d = doc(row['_id']['day'])
+        d['revenue'] += row['revenue']
+        d['orders'] += row['orders']
+        user = _field(row['_id'].get('user'), 'None')
+        d['customers'][user] = d['customers'].get(user, 0) + row['orders']
+
+    for row in db.orders.aggregate([
+        match,
+        {'$unwind': '$products'},
+        {'$group': {'_id': {'day': day, 'cat': {'$ifNull': ['$products.category', 'Others']}},
+                    'value': {'$sum': {'$multiply': [num_expr('$products.price'), num_expr('$products.quantity', 1)]}}}}
+    ], allowDiskUse=True):
+        d = doc(row['_id']['day'])
+        cat = _field(row['_id']['cat'])
+        d['categories'][cat] = d['categories'].get(cat, 0) + row['value']
+
+    ops = [ReplaceOne({'_id': key}, d, upsert=True) for key, d in days.items()]
+    for i in range(0, len(ops), 1000):
+        db.daily_sales.bulk_write(ops[i:i + 1000], ordered=False)
+    # Days that no longer have any counted order
+    db.daily_sales.delete_many({'_id': {'$nin': list(days)}})
+    db.meta.update_one({'_id': 'daily_sales'},
+                       {'$set': {'built_at': datetime.datetime.utcnow()}}, upsert=True)
+    return len(days)
+
+
+def rollup_report(db, start=None, end=None):
+    """Same output as analytics.sales_report(), read from daily_sales in O(days)."""
+    chart_start, chart_end = chart_window(start, end)
+    query = {}
+    if start is not None:
+        query = {'_id': {'$gte': start.strftime('%Y-%m-%d'), '$lt': end.strftime('%Y-%m-%d')}}
+
+    by_day = {}
+    categories = {}
+    customers = {}
+    total_revenue = 0.0
+    order_count = 0
+    for d in db.daily_sales.find(query):
+        by_day[d['_id']] = d
+        total_revenue += d.get('revenue', 0)
+        order_count += d.get('orders', 0)
+        for name, value in d.get('categories', {}).items():
+            categories[name] = categories.get(name, 0) + value
+        for user, n in d.get('customers', {}).items():
+            customers[user] = customers.get(user, 0) + n
+
+    active = [n for n in customers.values() if n > 0]
+    repeat_rate = (sum(1 for n in active if n > 1) / len(active) * 100) if active else 0
+
+    return {
+        'dailyData': daily_points(chart_start, chart_end, by_day),
+        'categoryData': [{'name': k, 'value': int(round(v))} for k, v in categories.items() if round(v)],
+        'metrics': {
+            'totalRevenue': round(total_revenue, 2),
+            'avgOrderValue': round(total_revenue / order_count, 2) if order_count else 0,
+            'orderCount': order_count,
+            'repeatRate': round(repeat_rate, 1)
+        }
+    }
@@ -1,6 +1,160 @@
-
+import datetime
+import math
+import threading
+import time
+import jwt
 import requests
+from requests.adapters import HTTPAdapter
 from config import Config
+from metrics import timed_external
+from ttl_cache import TTLCache
+
+# Shiprocket tokens are valid for 10 days; assume a bit less if the token
+# doesn't carry an `exp` claim, and refresh an hour before it runs out.
+DEFAULT_TOKEN_TTL = 9 * 24 * 3600
+TOKEN_REFRESH_MARGIN = 3600
+
+# Serviceability/rate answers keyed by (pickup, delivery pincode, weight bucket, cod),
+# shared by every ShiprocketAPI in the process
+quote_cache = TTLCache(
+    maxsize=Config.SHIPROCKET_QUOTE_CACHE_SIZE,
+    ttl=Config.SHIPROCKET_QUOTE_TTL,
+    stale_ttl=Config.SHIPROCKET_QUOTE_STALE_TTL
+)
+
+
+def weight_bucket(weight):
+    """Round a weight (kg) up to Shiprocket's 0.5 kg rate slab."""
+    try:
+        weight = float(weight)
+    except (TypeError, ValueError):
+        weight = 0.5
+    return max(0.5, math.ceil(weight * 2) / 2)
+
+
+def _is_quote(response):
+    """Only real serviceability answers are cached, never errors."""
+    return isinstance(response, dict) and isinstance(response.get('data'), dict) \
+        and 'available_courier_companies' in response['data']
+
+
+def best_courier(serviceability):
+    """The courier we quote the customer from a serviceability answer, or None."""
+    if 'data' in serviceability and 'available_courier_companies' in serviceability['data']:
+        couriers = serviceability['data']['available_courier_companies']
+        if len(couriers) > 0:
+            # Filter out terrible couriers (under 3 stars) so we charge the customer based on reliable ones
+            reliable_couriers = [c for c in couriers if float(c.get('rating', 0)) >= 3.0]
+
+            # If ALL couriers are bad that day, fallback to the full list just so checkout doesn't break
+            if not reliable_couriers:
+                reliable_couriers = couriers
+
+            # Find the cheapest RELIABLE courier to show the customer realistically
+            return min(reliable_couriers, key=lambda x: float(x.get('rate', 9999)))
+    return None
+
+
+def rate_response(courier_name, etd, net_rate):
+    # Shiprocket rates usually include base freight.
+    # We apply 18% GST as per Indian laws for shipping if not already included.
+    tax = round(net_rate * 0.18, 2)
+    total = round(net_rate + tax, 2)
+    return {
+        "status": "success",
+        "courier_name": courier_name,
+        "etd": etd,
+        "freight_charge": net_rate,
+        "tax": tax,
+        "total_shipping": total
+    }
+
+
+def _json_or_error(response):
+    """
+    The JSON body of a 200 answer, else a {"status": "error"} dict (never
+    raises). Errors from an HTTP answer carry its code as `http_status`.
+    """
+    if isinstance(response, dict):
+        return response
+    if response.status_code == 200:
+        try:
+            return response.json()
+        except ValueError:
+            # e.g. an HTML error page from a proxy in front of Shiprocket
+            return {"status": "error", "http_status": 200,
+                    "message": f"Invalid JSON from Shiprocket: {response.text[:200]}"}
+    return {"status": "error", "http_status": response.status_code, "message": response.text}
+
+
+FALLBACK_RATE = {
+    "status": "success",
+    "courier_name": "Standard Courier (Manual)",
+    "etd": "3-5 Days",
+    "freight_charge": 60.0,
+    "tax": 10.8,
+    "total_shipping": 70.8
+}
+
+
+def package_options(data):
+    """Pickup location and parcel size for a push, with the admin dashboard defaults."""
+    data = data or {}
+    return {
+        'pickup_location': data.get('pickup_location', 'warehouse'),
+        'weight': float(data.get('weight', 0.5)),
+        'length': float(data.get('length', 10)),
+        'breadth': float(data.get('breadth', 10)),
+        'height': float(data.get('height', 10)),
+    }
+
+
+def build_order_payload(order, options):
+    """Shiprocket adhoc order payload for one of our order documents."""
+    sr_order_items = []
+    for item in order['products']:
+        sr_order_items.append({
+            "name": item.get('name', 'GAVRAN Product'),
+            "sku": str(item.get('product_id', 'sku')),
+            "units": item.get('quantity', 1),
+            "selling_price": item.get('price', 0),
+            "discount": "",
+            "tax": "",
+            "hsn": ""
+        })
+
+    return {
+        "order_id": str(order['_id']),
+        "order_date": order['created_at'].strftime("%Y-%m-%d %H:%M"),
+        "pickup_location": options['pickup_location'],
+        "billing_customer_name": order['name'],
+        "billing_last_name": "",
+        "billing_address": order['address'],
+        "billing_city": order['city'],
+        "billing_pincode": order['pincode'],
+        "billing_state": "Maharashtra",
+        "billing_country": "India",
+        "billing_email": order.get("email", "customer@example.com"),
+        "billing_phone": order['phone'],
+        "shipping_is_billing": True,
+        "order_items": sr_order_items,
+        "payment_method": "COD", # Map this based on actual payment if needed
+        "sub_total": order['total_price'],
+        "length": options['length'], "breadth": options['breadth'],
+        "height": options['height'], "weight": options['weight']
+    }
+
+
+def shipped_fields(sr_response, order_id):
+    """The order fields to $set after a successful push, or None if Shiprocket refused it."""
+    if sr_response and 'status_code' in sr_response and sr_response['status_code'] == 1:
+        return {
+            'order_status': 'Shipped',
+            'tracking_id': str(sr_response.get('order_id', order_id)),
+            'shipment_id': str(sr_response.get('shipment_id', ''))
+        }
+    return None
+
 
 class ShiprocketAPI:
     def __init__(self):
@@ -8,6 +162,59 @@ class ShiprocketAPI:
         self.email = Config.SHIPROCKET_EMAIL
         self.password = Config.SHIPROCKET_PASSWORD
         self.token = None
+        self.token_expires_at = 0.0
+        self.timeout = (Config.SHIPROCKET_CONNECT_TIMEOUT, Config.SHIPROCKET_READ_TIMEOUT)
+        self._lock = threading.Lock()
+
+        # One pooled session: keeps TCP/TLS connections to Shiprocket alive between calls
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.SHIPROCKET_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    # --- Token handling ---
+
+    def _token_fresh(self):
+        return self.token is not None and time.time() < self.token_expires_at - TOKEN_REFRESH_MARGIN
+
+    @staticmethod
+    def _token_expiry(token):
+        try:
+            claims = jwt.decode(token, options={'verify_signature': False})
+            return float(claims['exp'])
+        except Exception:
+            return time.time() + DEFAULT_TOKEN_TTL
+
+    def _load_shared_token(self):
+        """Token cached in Mongo by any worker, so each process doesn't log in separately."""
+        if Config.SHIPROCKET_TOKEN_CACHE != 'mongo':
+            return
+        try:
+            from extensions import get_db
+            doc = get_db().service_tokens.find_one({'_id': 'shiprocket'})
+        except Exception as e:
+            print(f"Shiprocket token cache read failed: {e}")
+            return
+        if doc and doc.get('token') and doc['token'] != self.token:
+            self.token = doc['token']
+            self.token_expires_at = doc.get('expires_at', 0)
+
+    def _store_shared_token(self):
+        if Config.SHIPROCKET_TOKEN_CACHE != 'mongo':
+            return
+        try:
+            from extensions import get_db
+            get_db().service_tokens.update_one(
+                {'_id': 'shiprocket'},
+                {'$set': {
+                    'token': self.token,
+                    'expires_at': self.token_expires_at,
+                    'updated_at': datetime.datetime.utcnow()
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"Shiprocket token cache write failed: {e}")
 
     def authenticate(self):
         url = f"{self.base_url}/auth/login"
@@ -16,9 +223,12 @@ class ShiprocketAPI:
             "password": self.password
         }
         try:
-            response = requests.post(url, json=payload)
+            with timed_external('shiprocket', '/auth/login'):
+                response = self.session.post(url, json=payload, timeout=self.timeout)
             if response.status_code == 200:
                 self.token = response.json().get('token')
+                self.token_expires_at = self._token_expiry(self.token)
+                self._store_shared_token()
                 return True
             else:
                 print(f"Shiprocket Authentication Failed: {response.text}")
@@ -26,94 +236,111 @@ class ShiprocketAPI:
         except Exception as e:
             print(f"Error authenticating to Shiprocket: {e}")
             return False
-            
-    def _get_headers(self):
-        if not self.token:
-            if not self.authenticate():
-                return None
+
+    def warm_up(self):
+        """Get a token ahead of the first real call (no-op without credentials)."""
+        if self.email and self.password:
+            return self._ensure_token() is not None
+        return False
+
+    def _ensure_token(self, rejected_token=None):
+        """
+        Return a usable token. `rejected_token` is one Shiprocket just answered
+        401 to; it is replaced even if it looked fresh.
+        """
+        with self._lock:
+            if self._token_fresh() and self.token != rejected_token:
+                return self.token
+            self._load_shared_token()
+            if self._token_fresh() and self.token != rejected_token:
+                return self.token
+            if self.authenticate():
+                return self.token
+            return None
+
+    def _get_headers(self, rejected_token=None):
+        token = self._ensure_token(rejected_token)
+        if not token:
+            return None
         return {
             'Content-Type': 'application/json',
-            'Authorization': f'Bearer {self.token}'
+            'Authorization': f'Bearer {token}'
         }
 
+    def _request(self, method, path, **kwargs):
+        """
+        Authenticated call; retries once with a new token on 401.
+        Returns the response, or a {"status": "error"} dict if no call could be made.
+        """
+        headers = self._get_headers()
+        if not headers:
+            return {"status": "error", "message": "Authentication failed"}
+
+        url = f"{self.base_url}{path}"
+        try:
+            with timed_external('shiprocket', path):
+                response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            if response.status_code == 401:
+                rejected = headers['Authorization'].split(' ', 1)[1]
+                headers = self._get_headers(rejected_token=rejected)
+                if not headers:
+                    return {"status": "error", "message": "Authentication failed"}
+                with timed_external('shiprocket', path):
+                    response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            return response
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    # --- API calls ---
+
     def check_serviceability(self, pickup_pincode, delivery_pincode, weight=0.5, cod=0):
-        url = f"{self.base_url}/courier/serviceability"
+        """Serviceability for a lane, served from quote_cache when possible."""
+        weight = weight_bucket(weight)
+        cod = 1 if cod and str(cod) not in ('0', 'false', 'False') else 0
+        key = (str(pickup_pincode), str(delivery_pincode), weight, cod)
+        return quote_cache.get_or_load(
+            key,
+            lambda: self.fetch_serviceability(pickup_pincode, delivery_pincode, weight, cod),
+            cacheable=_is_quote
+        )
+
+    def fetch_serviceability(self, pickup_pincode, delivery_pincode, weight, cod):
+        """Uncached serviceability call (the pincode sweep wants fresh answers)."""
         params = {
             "pickup_postcode": pickup_pincode,
             "delivery_postcode": delivery_pincode,
             "cod": cod,
             "weight": weight
         }
-        headers = self._get_headers()
-        if not headers:
-             return {"status": "error", "message": "Authentication failed"}
-
-        try:
-            response = requests.get(url, headers=headers, params=params)
-            if response.status_code == 200:
-                 return response.json()
-            return {"status": "error", "message": response.text}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+        response = self._request('GET', '/courier/serviceability', params=params)
+        return _json_or_error(response)
 
     def get_shipping_rate(self, pickup_pincode, delivery_pincode, weight=0.5, cod=0):
         """Returns the best rate and tax breakdown based on serviceability"""
         serviceability = self.check_serviceability(pickup_pincode, delivery_pincode, weight, cod)
-        
-        if 'data' in serviceability and 'available_courier_companies' in serviceability['data']:
-            couriers = serviceability['data']['available_courier_companies']
-            if len(couriers) > 0:
-                # Filter out terrible couriers (under 3 stars) so we charge the customer based on reliable ones
-                reliable_couriers = [c for c in couriers if float(c.get('rating', 0)) >= 3.0]
-                
-                # If ALL couriers are bad that day, fallback to the full list just so checkout doesn't break
-                if not reliable_couriers:
-                    reliable_couriers = couriers
-
-                # Find the cheapest RELIABLE courier to show the customer realistically
-                best_courier = min(reliable_couriers, key=lambda x: float(x.get('rate', 9999)))
-                
-                net_rate = float(best_courier.get('rate', 0))
-                # Shiprocket rates usually include base freight. 
-                # We apply 18% GST as per Indian laws for shipping if not already included.
-                tax = round(net_rate * 0.18, 2)
-                total = round(net_rate + tax, 2)
-                
-                return {
-                    "status": "success",
-                    "courier_name": best_courier.get('courier_name'),
-                    "etd": best_courier.get('etd'),
-                    "freight_charge": net_rate,
-                    "tax": tax,
-                    "total_shipping": total
-                }
-        
+        best = best_courier(serviceability)
+        if best:
+            return rate_response(best.get('courier_name'), best.get('etd'), float(best.get('rate', 0)))
+
         # Fallback for demo or when API fails (e.g. Pune to Shrigonda logic)
         # Assuming typical regional rate if auth fails but pincodes are valid MH
-        return {
-            "status": "success",
-            "courier_name": "Standard Courier (Manual)",
-            "etd": "3-5 Days",
-            "freight_charge": 60.0,
-            "tax": 10.8,
-            "total_shipping": 70.8
-        }
+        return FALLBACK_RATE.copy()
 
     def create_order(self, order_data):
-        url = f"{self.base_url}/orders/create/adhoc"
-        headers = self._get_headers()
-        if not headers:
-             return {"status": "error", "message": "Authentication failed"}
-
-        try:
-            response = requests.post(url, headers=headers, json=order_data)
-            if response.status_code == 200:
-                return response.json()
-            return {"status": "error", "message": response.text}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+        response = self._request('POST', '/orders/create/adhoc', json=order_data)
+        return _json_or_error(response)
 
     def get_tracking(self, shipment_id): # Or AWB
          # Tracking typically by AWB or Order ID
-         pass 
+         pass
+
+
+_api = None
+
 
+def get_api():
+    """The process-wide client, so the pooled session and token are shared."""
+    global _api
+    if _api is None:
+        _api = ShiprocketAPI()
+    return _api
@@ -0,0 +1,251 @@
+"""
+Opt-in slow query log (SLOW_QUERY_MS > 0).
+
+A pymongo CommandListener notes every command that takes longer than the
+threshold, along with its filter shape (values replaced by '?') and the
+route or background thread that sent it. A daemon thread then runs
+explain() on the same command and appends one JSON line per slow
+operation to a rotating file under logs/. Running explain off the request
+thread keeps the extra round trip out of the slow request. Each shape is
+explained at most once every SLOW_QUERY_EXPLAIN_SECONDS.
+
+explain() only plans the query by default. SLOW_QUERY_EXECUTION_STATS=true
+re-runs slow reads under executionStats to report documents examined, at
+the cost of executing each slow query a second time.
+
+GET /api/admin/slow-queries reads the file back, newest first.
+
+All workers append to the same file. Short lines are written atomically,
+but two workers may roll the file over at the same moment and lose a few
+lines. That is acceptable for a diagnostics log.
+"""
+import datetime
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from flask import has_request_context, request
+from pymongo import monitoring
+from config import Config
+
+# Commands explain() accepts, and the field that holds the filter
+FILTER_FIELDS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'aggregate': 'pipeline',
+    'update': 'updates',
+    'delete': 'deletes',
+}
+READS = ('find', 'count', 'distinct', 'aggregate')
+
+# Session and routing fields the driver adds, which explain rejects
+SESSION_FIELDS = ('lsid', '$db', '$clusterTime', 'txnNumber', 'startTransaction', 'autocommit',
+                  '$readPreference', 'readConcern', 'writeConcern', 'apiVersion', 'apiStrict',
+                  'apiDeprecationErrors')
+
+_queue = queue.Queue(maxsize=1000)
+_explained = {}  # shape key -> (explained at, summary)
+_thread = None
+_thread_pid = None
+_lock = threading.Lock()
+_logger = None
+_dropped = 0
+
+
+def shape_of(value):
+    """A filter with its values replaced by '?' (operators and field names kept)."""
+    if isinstance(value, dict):
+        return {k: shape_of(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, dict) for v in value):
+            return [shape_of(v) for v in value]
+        return ['?']
+    return '?'
+
+
+def _filter_of(command_name, command):
+    value = command.get(FILTER_FIELDS.get(command_name, ''))
+    if command_name in ('update', 'delete'):
+        # First statement of a write batch
+        value = value[0].get('q') if value else None
+    elif command_name == 'aggregate':
+        value = [stage for stage in value or [] if '$match' in stage][:1]
+        value = value[0]['$match'] if value else None
+    return shape_of(value) if value else {}
+
+
+def _stages_of(command_name, command):
+    """Stage names of an aggregate pipeline ('$match', '$group', ...)."""
+    if command_name != 'aggregate':
+        return []
+    return [next(iter(stage), '') for stage in command.get('pipeline') or [] if isinstance(stage, dict)]
+
+
+def _caller():
+    if has_request_context():
+        rule = request.url_rule.rule if request.url_rule else request.path
+        return f'{request.method} {rule}'
+    return f'thread:{threading.current_thread().name}'
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Queues commands slower than SLOW_QUERY_MS; pass to MongoClient(event_listeners=[...])."""
+
+    def __init__(self, threshold_ms):
+        self.threshold_micros = threshold_ms * 1000
+        self._started = {}  # (connection, request_id) -> (database, command)
+
+    def started(self, event):
+        if event.command_name == 'explain':
+            return
+        # A reference only: commands are never modified after they are sent
+        self._started[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def _finish(self, event, error=None):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is None or event.duration_micros < self.threshold_micros:
+            return
+        database, command = started
+        name = event.command_name
+        collection = command.get(name)
+        if name == 'getMore':
+            collection = command.get('collection')
+        item = {
+            'ts': datetime.datetime.utcnow().isoformat(),
+            'ms': round(event.duration_micros / 1000, 1),
+            'database': database,
+            'collection': collection if isinstance(collection, str) else '',
+            'command': name,
+            'shape': _filter_of(name, command),
+            'caller': _caller(),
+        }
+        stages = _stages_of(name, command)
+        if stages:
+            # Pipelines sharing a first $match can still do very different work
+            item['stages'] = stages
+        if error:
+            item['error'] = error
+        _submit(item, command)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, error=str(event.failure.get('errmsg', 'failed')))
+
+
+def mongo_listeners():
+    return [SlowQueryListener(Config.SLOW_QUERY_MS)] if Config.SLOW_QUERY_MS > 0 else []
+
+
+def _submit(item, command):
+    global _dropped
+    _ensure_thread()
+    try:
+        _queue.put_nowait((item, command))
+    except queue.Full:
+        _dropped += 1
+
+
+# --- Background explain + log writer ---
+
+def summarize(db, item, command):
+    """Winning-plan summary for a logged command, or None when it can't be explained."""
+    name = item['command']
+    if name not in FILTER_FIELDS:
+        return None
+    key = json.dumps([item['collection'], name, item['shape'], item.get('stages', [])],
+                     sort_keys=True, default=str)
+    now = time.monotonic()
+    cached = _explained.get(key)
+    if cached and now - cached[0] < Config.SLOW_QUERY_EXPLAIN_SECONDS:
+        return cached[1]
+
+    from indexes import summarize_explain
+    cmd = {k: v for k, v in command.items() if k not in SESSION_FIELDS}
+    # executionStats runs the query again, so it is opt-in and never used for writes
+    writes = name not in READS or any('$out' in s or '$merge' in s for s in cmd.get('pipeline', []))
+    verbosity = 'executionStats' if Config.SLOW_QUERY_EXECUTION_STATS and not writes else 'queryPlanner'
+    try:
+        result = db.client[item['database']].command('explain', cmd, verbosity=verbosity)
+        summary = summarize_explain(result)
+    except Exception as e:
+        summary = {'explain_error': str(e)}
+    _explained[key] = (now, summary)
+    return summary
+
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        os.makedirs(os.path.dirname(Config.SLOW_QUERY_LOG), exist_ok=True)
+        handler = RotatingFileHandler(Config.SLOW_QUERY_LOG, maxBytes=Config.SLOW_QUERY_LOG_BYTES,
+                                      backupCount=Config.SLOW_QUERY_LOG_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger('gavran.slow_queries')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.handlers = [handler]
+        _logger = logger
+    return _logger
+
+
+def _run():
+    from extensions import get_db
+    while True:
+        item, command = _queue.get()
+        try:
+            item['plan'] = summarize(get_db(), item, command)
+            _get_logger().info(json.dumps(item, default=str))
+        except Exception as e:
+            print(f"[SlowQueries] Could not log {item.get('collection')}.{item.get('command')}: {e}")
+
+
+def _ensure_thread():
+    """Start (or, after a fork, restart) the explain/writer thread."""
+    global _thread, _thread_pid
+    if _thread and _thread.is_alive() and _thread_pid == os.getpid():
+        return
+    with _lock:
+        if _thread and _thread.is_alive() and _thread_pid == os.getpid():
+            return
+        _thread_pid = os.getpid()
+        _thread = threading.Thread(target=_run, name='slow-queries', daemon=True)
+        _thread.start()
+
+
+# --- Reading the log back ---
+
+def read(collection=None, min_ms=0, limit=100):
+    """Logged slow operations across the current and rotated files, newest first."""
+    entries = []
+    for path in glob.glob(Config.SLOW_QUERY_LOG + '*'):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if collection and entry.get('collection') != collection:
+                    continue
+                if entry.get('ms', 0) < min_ms:
+                    continue
+                entries.append(entry)
+    entries.sort(key=lambda e: e.get('ts', ''), reverse=True)
+    return entries[:limit]
+
+
+def stats():
+    return {
+        'enabled': Config.SLOW_QUERY_MS > 0,
+        'threshold_ms': Config.SLOW_QUERY_MS,
+        'pending': _queue.qsize(),
+        'dropped': _dropped,
+        'log': Config.SLOW_QUERY_LOG,
+    }
@@ -0,0 +1,116 @@
+import os
+import requests
+from config import Config
+from extensions import get_db
+from metrics import timed_external
+
+
+# ============================================================
+# SMS SENDER — Fast2SMS (FREE) or Dev Mode (prints to console)
+# Sign up FREE at: https://www.fast2sms.com/
+# Get your API key from Dashboard → Dev API
+# Paste it in backend/.env as: FAST2SMS_API_KEY=your_key_here
+# ============================================================
+
+def _configured(name):
+    key = os.getenv(name, '')
+    return bool(key) and 'your_' not in key
+
+
+def send_otp_sms(phone, otp):
+    """
+    Send OTP SMS via real providers (Fast2SMS or 2Factor.in).
+    Returns False when a provider is configured but none accepted the message
+    (so the job is retried); without any provider (dev) the OTP is printed.
+    """
+    db = get_db()
+    
+    # 1. Try Fast2SMS (High Priority - Dedicated OTP Route)
+    fast2sms_key = os.getenv('FAST2SMS_API_KEY', '')
+    if _configured('FAST2SMS_API_KEY'):
+        url = Config.FAST2SMS_URL
+        headers = {"authorization": fast2sms_key}
+        payload = {
+            "route": "otp",
+            "variables_values": otp,
+            "numbers": phone,
+        }
+        try:
+            # Fast2SMS OTP route is reliable and doesn't trigger calls
+            with timed_external('fast2sms', 'otp'):
+                resp = requests.post(url, headers=headers, data=payload, timeout=10)
+            result = resp.json()
+            if result.get("return"):
+                print(f"✅ Fast2SMS: OTP SMS sent to +91{phone}")
+                return True
+            else:
+                print(f"❌ Fast2SMS Failure: {result}")
+        except Exception as e:
+            print(f"❌ Fast2SMS Connection Error: {e}")
+
+    # 2. Try 2Factor.in (Fallback)
+    tf_key = os.getenv('TWOFACTOR_API_KEY', '')
+    if _configured('TWOFACTOR_API_KEY'):
+        # Using the standard SMS route
+        url = f"{Config.TWOFACTOR_BASE_URL}/{tf_key}/SMS/{phone}/AUTOGEN"
+        try:
+            with timed_external('2factor', 'send'):
+                resp = requests.get(url, timeout=10)
+            result = resp.json()
+            if result.get('Status') == 'Success':
+                print(f"✅ 2Factor: OTP sent to +91{phone}")
+                # Store session for verification
+                db.otps.update_one(
+                    {'phone': phone}, 
+                    {'$set': {'twofactor_session': result.get('Details', '')}},
+                    upsert=False
+                )
+                return True
+            else:
+                print(f"❌ 2Factor Failure: {result}")
+        except Exception as e:
+            print(f"❌ 2Factor Connection Error: {e}")
+
+    # 3. A configured provider failed: report it so the job is retried
+    if _configured('FAST2SMS_API_KEY') or _configured('TWOFACTOR_API_KEY'):
+        print(f"\n{'!'*45}")
+        print(f"  [CRITICAL: SMS NOT SENT - CHECK API BALANCES]")
+        print(f"  Phone : +91 {phone}")
+        print(f"{'!'*45}\n")
+        return False
+
+    # 4. Dev Fallback (no provider keys)
+    print(f"\n[DEV MODE] OTP for +91 {phone}: {otp}\n")
+    return True
+
+
+def send_order_confirmation_sms(phone, order_short_id, total_amount):
+    """Send order confirmation SMS to customer."""
+    message = f"Gavran Magic: Order #{order_short_id} confirmed! Amount Rs.{total_amount}. We will deliver soon. Thank you!"
+    return send_sms(phone, message)
+
+
+def send_sms(phone, message):
+    """
+    Order SMS via Fast2SMS's quick route (paid per message) when
+    ORDER_SMS_ENABLED is on, else printed to the console.
+    Returns False when Fast2SMS didn't accept it (so the job is retried).
+    """
+    if not Config.ORDER_SMS_ENABLED or not _configured('FAST2SMS_API_KEY'):
+        print(f"\n[DEV MODE] Order SMS → +91{phone}: {message}")
+        return True
+
+    headers = {"authorization": os.getenv('FAST2SMS_API_KEY')}
+    params = {"route": "q", "message": message, "flash": 0, "numbers": phone}
+    try:
+        with timed_external('fast2sms', 'order'):
+            response = requests.get(Config.FAST2SMS_URL, headers=headers, params=params, timeout=10)
+        result = response.json()
+    except Exception as e:
+        print(f"Order SMS Error: {e}")
+        return False
+    if not result.get("return"):
+        print(f"❌ Fast2SMS Failure: {result}")
+        return False
+    print(f"✅ Order SMS sent to +91{phone}")
+    return True
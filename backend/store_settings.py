@@ -0,0 +1,48 @@
+from cache import VersionedCache
+from http_cache import serialize
+
+# What the storefront shows before an admin has saved settings
+DEFAULTS = {
+    "type": "global",
+    "refund_hour_grace_period": 24,
+    "refund_policy_text": "You can request a refund within the grace period after placing your order.",
+    "return_policy_text": "Products can be returned if they are damaged or incorrect upon delivery.",
+    "store_name": "Gavran Magic",
+    "store_email": "contact@gavranmagic.com",
+    "store_phone": "+91 9876543210",
+    "store_address": "Pune, Maharashtra, India"
+}
+
+
+def _load(db):
+    # We only have one settings document
+    settings = db.settings.find_one({"type": "global"})
+    if settings:
+        settings['_id'] = str(settings['_id'])
+    else:
+        settings = dict(DEFAULTS)
+    body, etag = serialize(settings)
+    return {'settings': settings, 'body': body, 'etag': etag}
+
+
+_settings = VersionedCache('settings', _load)
+
+
+def get_settings():
+    """The global settings document (shared; don't modify it)."""
+    return _settings.get()['settings']
+
+
+def get_entry():
+    """(body, etag) of the serialized settings for the public GET."""
+    entry = _settings.get()
+    return entry['body'], entry['etag']
+
+
+def grace_hours():
+    return get_settings().get('refund_hour_grace_period', 24)
+
+
+def invalidate():
+    """Call after writing the settings document."""
+    _settings.invalidate()
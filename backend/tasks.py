@@ -0,0 +1,51 @@
+import datetime
+from bson import ObjectId
+from extensions import get_db
+from jobs import job
+import shiprocket
+import sms
+
+# Job handlers. Payloads are plain JSON-able dicts passed as keyword arguments.
+
+
+# An OTP is only valid for 5 minutes, so there's no point retrying for long.
+# The code is read from `otps` rather than the payload, so it never sits in `jobs`
+# (`otp` is only present in jobs queued before that, and is removed when they finish).
+# Its own lane: someone is waiting on the login screen for it.
+@job('send_otp_sms', max_attempts=2, secret_fields=('otp',), lane='otp')
+def send_otp_sms(phone, otp=None):
+    record = get_db().otps.find_one({'phone': phone}, {'otp': 1, 'expiry': 1})
+    if not record or record['expiry'] < datetime.datetime.utcnow():
+        print(f"[Jobs] send_otp_sms: no live OTP for {phone[-4:].rjust(10, '*')}, nothing to send")
+        return
+    if not sms.send_otp_sms(phone, record['otp']):
+        raise RuntimeError('No SMS provider accepted the OTP')
+
+
+@job('send_order_sms')
+def send_order_sms(phone, message):
+    if not sms.send_sms(phone, message):
+        raise RuntimeError('No SMS provider accepted the order confirmation')
+
+
+@job('ship_order')
+def ship_order(order_id, options=None):
+    """Push an order to Shiprocket. Raises on failure so the queue retries it."""
+    db = get_db()
+    order = db.orders.find_one({'_id': ObjectId(order_id)})
+    if not order:
+        print(f"[Jobs] ship_order: order {order_id} no longer exists")
+        return
+    if order.get('shipment_id'):
+        return  # already pushed (e.g. a retried job whose first run succeeded)
+
+    payload = shiprocket.build_order_payload(order, shiprocket.package_options(options))
+    sr_response = shiprocket.get_api().create_order(payload)
+    fields = shiprocket.shipped_fields(sr_response, order_id)
+    if fields is None:
+        error = (sr_response or {}).get('message', 'Failed to create order in Shiprocket')
+        db.orders.update_one({'_id': order['_id']}, {'$set': {'shipping_error': str(error)}})
+        raise RuntimeError(error)
+
+    fields['shipping_status'] = 'Pushed'
+    db.orders.update_one({'_id': order['_id']}, {'$set': fields, '$unset': {'shipping_error': ''}})
@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with per-entry expiry and LRU eviction.
+
+    With `stale_ttl`, an expired entry is still served for that many extra
+    seconds while a background thread reloads it (stale-while-revalidate).
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, stale_ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def get(self, key, default=None):
+        """Return a fresh value or `default`; stale entries count as missing."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and now < entry[1]:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader, cacheable=None):
+        """
+        Return the cached value for `key`, calling `loader()` on a miss.
+        Results for which `cacheable(value)` is false (e.g. errors) are not stored.
+        """
+        now = time.monotonic()
+        refresh = False
+        with self._lock:
+            entry = self._data.get(key)
+            if entry:
+                value, expires_at = entry
+                if now < expires_at:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if now < expires_at + self.stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        refresh = True
+                else:
+                    del self._data[key]
+                    entry = None
+            if entry is None:
+                self.misses += 1
+
+        if entry is not None:
+            if refresh:
+                threading.Thread(target=self._refresh, args=(key, loader, cacheable), daemon=True).start()
+            return value
+
+        value = loader()
+        if cacheable is None or cacheable(value):
+            self.set(key, value)
+        return value
+
+    def _refresh(self, key, loader, cacheable):
+        try:
+            value = loader()
+            if cacheable is None or cacheable(value):
+                self.set(key, value)
+                with self._lock:
+                    self.refreshes += 1
+        except Exception as e:
+            print(f"[Cache] Background refresh of {key!r} failed: {e}")
+            with self._lock:
+                self.refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale_hits
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'refresh_errors': self.refresh_errors,
+                'hit_rate': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            }
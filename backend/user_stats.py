@@ -0,0 +1,112 @@
+import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from analytics import num_expr
+
+# Per-user counters kept on the user document:
+#   order_count - every order the user placed
+#   total_spent - sum of total_price over orders that are not 'Cancelled'
+# (the same definitions the admin users list has always used)
+
+
+def _stats_pipeline(match):
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': '$user_id',
+            'order_count': {'$sum': 1},
+            'total_spent': {'$sum': {'$cond': [
+                {'$ne': ['$order_status', 'Cancelled']}, num_expr('$total_price'), 0
+            ]}}
+        }}
+    ]
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def stats_for(db, user_ids):
+    """{user_id: {order_count, total_spent}} for the given ids, in one aggregation."""
+    rows = db.orders.aggregate(_stats_pipeline({'user_id': {'$in': list(user_ids)}}))
+    return {r['_id']: {'order_count': r['order_count'], 'total_spent': r['total_spent']} for r in rows}
+
+
+def apply(db, user_id, orders=0, spent=0.0):
+    """$inc a user's counters; guest and non-ObjectId user ids are ignored."""
+    try:
+        oid = ObjectId(str(user_id))
+    except InvalidId:
+        return
+    inc = {}
+    if orders:
+        inc['order_count'] = orders
+    if spent:
+        inc['total_spent'] = spent
+    if inc:
+        # stats_updated_at tells a running rebuild() not to zero this user
+        db.users.update_one({'_id': oid}, {'$inc': inc,
+                                           '$set': {'stats_updated_at': datetime.datetime.utcnow()}})
+
+
+def order_created(db, order):
+    spent = _float(order.get('total_price', 0)) if order.get('order_status') != 'Cancelled' else 0.0
+    apply(db, order.get('user_id'), 1, spent)
+
+
+def order_status_changed(db, order, old_status, new_status):
+    price = _float(order.get('total_price', 0))
+    if old_status != 'Cancelled' and new_status == 'Cancelled':
+        apply(db, order.get('user_id'), spent=-price)
+    elif old_status == 'Cancelled' and new_status != 'Cancelled':
+        apply(db, order.get('user_id'), spent=price)
+
+
+def order_deleted(db, order):
+    spent = _float(order.get('total_price', 0)) if order.get('order_status') != 'Cancelled' else 0.0
+    apply(db, order.get('user_id'), -1, -spent)
+
+
+def is_built(db):
+    return db.meta.find_one({'_id': 'user_stats'}) is not None
+
+
+def rebuild(db):
+    """
+    Recompute order_count/total_spent on every user document from orders.
+    Each user is set to absolute values (never zeroed first), so the users
+    list stays right while this runs.
+    """
+    stamp = datetime.datetime.utcnow()
+    # Users the aggregation doesn't produce have no orders left; zeroed at the end
+    stale = {u['_id'] for u in db.users.find({}, {'_id': 1})}
+    ops = []
+    for row in db.orders.aggregate(_stats_pipeline({}), allowDiskUse=True):
+        try:
+            oid = ObjectId(str(row['_id']))
+        except InvalidId:
+            continue
+        stale.discard(oid)
+        ops.append(UpdateOne({'_id': oid}, {'$set': {
+            'order_count': row['order_count'], 'total_spent': row['total_spent']
+        }}))
+        if len(ops) >= 1000:
+            db.users.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        db.users.bulk_write(ops, ordered=False)
+    # Unless an order event counted them while the rebuild ran
+    stale = list(stale)
+    for i in range(0, len(stale), 1000):
+        db.users.update_many(
+            {'_id': {'$in': stale[i:i + 1000]},
+             '$or': [{'order_count': {'$ne': 0}}, {'total_spent': {'$ne': 0}}],
+             'stats_updated_at': {'$not': {'$gte': stamp}}},
+            {'$set': {'order_count': 0, 'total_spent': 0.0}}
+        )
+    db.meta.update_one({'_id': 'user_stats'},
+                       {'$set': {'built_at': datetime.datetime.utcnow()}}, upsert=True)
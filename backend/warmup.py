@@ -0,0 +1,113 @@
+"""
+Background warm-up after a (cold) start: open the Mongo pool and fill the
+in-process caches before the first customer request has to.
+
+/readyz reports 503 until the database is reachable and every other step
+has been tried, so a load balancer health check on it only routes traffic
+to a hot process. With WARMUP=false nothing is primed, but /readyz still
+pings the database on every call.
+"""
+import os
+import threading
+import time
+from config import Config
+
+_state = {'pid': None, 'ready': False, 'started_at': None, 'finished_at': None, 'steps': {}}
+_lock = threading.Lock()
+
+
+def _ping_db():
+    from extensions import get_db
+    get_db().command('ping')
+
+
+def _catalog():
+    import catalog
+    catalog.get_catalog()
+
+
+def _settings():
+    import store_settings
+    store_settings.get_settings()
+
+
+def _offers():
+    import promo_engine
+    promo_engine.list_offers()
+
+
+def _pincodes():
+    import pincode_index
+    pincode_index.stats()
+
+
+def _shiprocket():
+    from shiprocket import get_api
+    get_api().warm_up()
+
+
+def _razorpay():
+    from routes.order_routes import razorpay_client
+    razorpay_client()
+
+
+# The database has to come up first; everything after it is best effort
+STEPS = [
+    ('mongo', _ping_db),
+    ('catalog', _catalog),
+    ('settings', _settings),
+    ('offers', _offers),
+    ('pincodes', _pincodes),
+    ('shiprocket', _shiprocket),
+    ('razorpay', _razorpay),
+]
+
+
+def _run_step(name, fn):
+    started = time.monotonic()
+    try:
+        fn()
+        result = {'ok': True}
+    except Exception as e:
+        result = {'ok': False, 'error': str(e)}
+    result['ms'] = round((time.monotonic() - started) * 1000, 1)
+    _state['steps'][name] = result
+    return result['ok']
+
+
+def _run():
+    _state['started_at'] = time.time()
+    # Keep trying the database: the process isn't useful without it
+    while not _run_step(*STEPS[0]):
+        print(f"[Warmup] MongoDB not reachable yet: {_state['steps']['mongo']['error']}")
+        time.sleep(5)
+    for name, fn in STEPS[1:]:
+        if not _run_step(name, fn):
+            print(f"[Warmup] {name} failed: {_state['steps'][name]['error']}")
+    _state['finished_at'] = time.time()
+    _state['ready'] = True
+    print(f"[Warmup] Done in {_state['finished_at'] - _state['started_at']:.1f}s")
+
+
+def start():
+    """Start warming this process up (once per process; threads don't survive fork)."""
+    with _lock:
+        if _state['pid'] == os.getpid():
+            return
+        _state.update({'pid': os.getpid(), 'ready': not Config.WARMUP, 'steps': {},
+                       'started_at': None, 'finished_at': None})
+        if Config.WARMUP:
+            threading.Thread(target=_run, name='warmup', daemon=True).start()
+
+
+def status():
+    ready = _state['ready']
+    if not Config.WARMUP:
+        # Nothing was warmed, so readiness is just "MongoDB answers"
+        ready = _run_step(*STEPS[0])
+    return {
+        'ready': ready,
+        'warming': _state['started_at'] is not None and _state['finished_at'] is None,
+        # A copy: the warm-up thread keeps adding steps while this is serialized
+        'steps': dict(_state['steps']),
+    }
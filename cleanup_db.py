@@ -30,6 +30,8 @@ def cleanup_duplicates():
     if duplicates:
         print(f"Found {len(duplicates)} duplicates. Deleting...")
         db.products.delete_many({'_id': {'$in': duplicates}})
+        # Tell running API workers to reload their catalog cache
+        db.meta.update_one({'_id': 'catalog'}, {'$inc': {'version': 1}}, upsert=True)
         print("Deleted.")
     else:
         print("No duplicates found.")
@@ -527,7 +527,7 @@ const ProductDetail = () => {
                                     </div>
                                     <h5>{r.title}</h5>
                                     <p>{r.comment}</p>
-                                    {r.photo && <div className="r-photo"><img src={r.photo} alt="review" /></div>}
+                                    {r.photo && <div className="r-photo"><a href={r.photo} target="_blank" rel="noreferrer"><img src={r.thumb_url || r.photo} alt="review" loading="lazy" /></a></div>}
                                 </div>
                             ))
                         )}
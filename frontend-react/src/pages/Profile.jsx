@@ -41,7 +41,9 @@ export default function Profile() {
     const fetchOrders = async () => {
         setOrdersLoading(true);
         try {
-            const response = await axios.get(`${API_BASE_URL}/api/orders/user/${user.id || user._id}`);
+            const response = await axios.get(`${API_BASE_URL}/api/orders/user/${user.id || user._id}`, {
+                headers: { Authorization: `Bearer ${localStorage.getItem('gavran_token')}` }
+            });
             setOrders(response.data);
         } catch (err) {
             console.error("Orders fetch error:", err);
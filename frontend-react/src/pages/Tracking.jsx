@@ -100,7 +100,9 @@ export default function Tracking() {
             const fetchRecentOrders = async () => {
                 try {
                     const userId = user.id || user._id; // Handle both id and _id
-                    const response = await axios.get(`${API_BASE_URL}/api/orders/user/${userId}`);
+                    const response = await axios.get(`${API_BASE_URL}/api/orders/user/${userId}`, {
+                        headers: { Authorization: `Bearer ${localStorage.getItem('gavran_token')}` }
+                    });
                     if (Array.isArray(response.data)) {
                         setRecentOrders(response.data);
                     }